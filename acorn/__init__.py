@@ -1,10 +1,15 @@
 from acorn.logging.database import set_task, set_writeable
+from acorn.logging.decoration import pause, resume, paused
 
 #Add an exit handler so that in-memory collections are cleaned up correctly and
 #saved to disk if the kernel is told to shut down.
 import atexit
 from acorn.logging.database import cleanup
 atexit.register(cleanup)
+#The decoration plans recorded while the packages were (lazily) decorated are
+#cached for the next session.
+from acorn.logging.decoration import save_plans
+atexit.register(save_plans)
 
 import acorn.subclass
 import acorn.importer
@@ -16,7 +16,43 @@ def examples():
                  "This creates a `~/.acorn` directory with copies of all the "
                  "default package configuration and descriptor files. You can "
                  "edit the configurations by opening the files from that "
-                 "folder.")]
+                 "folder."),
+                (("Convert the existing JSON databases in the configured "
+                  "database folder to SQLite."),
+                 "acrn.py convert sqlite",
+                 "A `project.task.sqlite` file is created next to each "
+                 "`project.task.json` file. An optional third argument "
+                 "specifies a different database folder. To use the new "
+                 "files, set `backend = sqlite` in the `[database]` section "
+                 "of `acorn.cfg`. Use `blocks` instead of `sqlite` to convert "
+                 "to compressed `project.task.jsonz` files."),
+                (("Compact all the task databases in the configured database "
+                  "folder."),
+                 "acrn.py compact -processes 4",
+                 "Merges the journals of processes that are no longer running, "
+                 "drops uuid descriptions that no entry refers to, adds "
+                 "keyframes to the diff chains of cell re-definitions and "
+                 "rebuilds the indexes. The task files are compacted in "
+                 "parallel by a pool of processes. An optional second argument "
+                 "specifies a different database folder, a single database "
+                 "file or a `project.task` name."),
+                (("Find out where the time goes when `numpy` is imported and "
+                  "decorated."),
+                 "acrn.py profile-import numpy -top 15",
+                 "Decorates the package eagerly while timing each phase of the "
+                 "decoration and each submodule, and lists the slowest objects. "
+                 "The report ends with the entries that would save the most "
+                 "time if they were added to `ignore=` in the `[tracking]` "
+                 "section of the package's configuration file."),
+                (("Recommend tracking filters for the packages used by a "
+                  "representative script."),
+                 "acrn.py tune analysis.py",
+                 "Runs the script while counting the calls to each decorated "
+                 "function, the decorated calls nested beneath them and the "
+                 "time acorn spends logging them. A `<package>.tuned.cfg` file "
+                 "with the recommended `ignore`, `[streamline]` and "
+                 "`[logging.depth]` settings is written to `~/.acorn` (or the "
+                 "folder in the optional third argument) for review.")]
     required = ("")
     output = ("")
     details = ("")
@@ -27,6 +63,12 @@ def examples():
 script_options = {
     "commands": {"nargs": "+",
                  "help": "List of commands and sub-commands to run."},
+    "-processes": {"type": int, "default": None,
+                   "help": ("Number of processes to compact databases with; "
+                            "defaults to the number of CPUs.")},
+    "-top": {"type": int, "default": 10,
+             "help": ("Number of modules, objects and suggestions listed by "
+                      "`profile-import` and of functions listed by `tune`.")},
     }
 """dict: default command-line arguments and their
     :meth:`argparse.ArgumentParser.add_argument` keyword arguments.
@@ -96,6 +138,129 @@ def _run_configure(subcmd, args):
     else:
         msg.warn("'configure' sub-command {} is not supported.".format(subcmd))
 
+def _run_convert(backend, args):
+    """Converts all the JSON databases in the database directory to the
+    specified storage backend.
+    """
+    from acorn.logging.database import _dbdir
+    from acorn.logging.storage import convert
+    from glob import glob
+    from os import path
+    if len(args["commands"]) > 2:
+        target = path.abspath(path.expanduser(args["commands"][2]))
+    else:# pragma: no cover
+        target = _dbdir()
+
+    for dbpath in sorted(glob(path.join(target, "*.*.json"))):
+        try:
+            count = convert(dbpath, backend)
+            msg.okay("Converted {0:d} entries in {1}.".format(count, dbpath))
+        except ValueError as err:
+            msg.warn("Skipped {}: {}".format(dbpath, err))
+
+def _compact_file(dbpath):
+    """Compacts a single task database; runs in the worker processes of
+    :func:`_run_compact`.
+
+    Returns:
+        tuple: `(dbpath, stats, error)` where `stats` is the dictionary returned
+        by :func:`acorn.logging.storage.compact_db`.
+    """
+    from acorn.logging.storage import compact_db
+    try:
+        return (dbpath, compact_db(dbpath), None)
+    except Exception as err: # pragma: no cover
+        return (dbpath, None, "{}: {}".format(type(err).__name__, err))
+
+def _compact_targets(target):
+    """Returns the list of task database files to compact for the specified
+    target folder, file or `project.task` name.
+    """
+    from acorn.logging.database import _dbdir
+    from glob import glob
+    from os import path
+    if target is None:# pragma: no cover
+        target = _dbdir()
+    if path.isfile(target):
+        return [target]
+    if not path.isdir(target):
+        #This must be a `project.task` name in the configured folder.
+        prefix = path.join(_dbdir(), target)
+        target = path.dirname(prefix)
+        pattern = path.basename(prefix)
+    else:
+        pattern = "*.*"
+
+    result = set()
+    for ext in (".json", ".sqlite", ".jsonz"):
+        result.update(glob(path.join(target, pattern + ext)))
+    #A task may only have journals if no process has compacted it yet.
+    for jpath in glob(path.join(target, pattern + ".*.jsonl")):
+        project, task = path.basename(jpath).split('.')[0:2]
+        result.add(path.join(target, "{}.{}.json".format(project, task)))
+    return sorted(result)
+
+def _run_compact(args):
+    """Compacts the task databases in the database directory (or the
+    specified folder, file or task) using a pool of processes.
+    """
+    from os import path
+    if len(args["commands"]) > 1:
+        target = args["commands"][1]
+        if path.exists(path.expanduser(target)):
+            target = path.abspath(path.expanduser(target))
+    else:# pragma: no cover
+        target = None
+
+    dbpaths = _compact_targets(target)
+    processes = args.get("processes")
+    if len(dbpaths) > 1 and processes != 1:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        try:
+            results = list(pool.imap_unordered(_compact_file, dbpaths))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_compact_file(dbpath) for dbpath in dbpaths]
+
+    for dbpath, stats, error in sorted(results, key=lambda r: r[0]):
+        if error is not None: # pragma: no cover
+            msg.err("Compacting {} failed: {}".format(dbpath, error))
+            continue
+        msg.okay("Compacted {} entries in {}; merged {} journals ({} still in "
+                 "use) and dropped {} unused uuids.".format(
+                     stats["entries"], dbpath, stats["merged"],
+                     stats["skipped"], stats["orphans"]))
+    return results
+
+def _run_profile(args):
+    """Imports and decorates the package in the second argument while profiling
+    the decoration, then prints the report.
+    """
+    from acorn.logging.importprofile import profile_import
+    profile = profile_import(args["commands"][1])
+    if profile is not None:
+        profile.report(args.get("top") or 10)
+    return profile
+
+def _run_tune(args):
+    """Runs the script in the second argument while profiling the decorated
+    calls, then prints and writes the recommended configurations.
+    """
+    from os import path
+    from acorn.logging.tuning import profile_calls
+    profile = profile_calls(args["commands"][1])
+    profile.report(args.get("top") or 10)
+    if len(args["commands"]) > 2:
+        folder = path.abspath(path.expanduser(args["commands"][2]))
+    else:# pragma: no cover
+        folder = None
+    for target in profile.write_configs(folder):
+        msg.okay("Wrote the recommended configuration to {}.".format(target))
+    return profile
+
 def run(args):
     """Runs the acorn setup/configuration commands.
     """
@@ -111,6 +276,29 @@ def run(args):
 
         subcmd = args["commands"][1]
         _run_configure(subcmd, args)
+    elif cmd == "convert":
+        if len(args["commands"]) < 2:# pragma: no cover
+            msg.err("'convert' command requires the name of the backend to "
+                    "convert to. E.g., `acrn.py convert sqlite`.")
+            exit(0)
+
+        _run_convert(args["commands"][1], args)
+    elif cmd == "compact":
+        _run_compact(args)
+    elif cmd == "profile-import":
+        if len(args["commands"]) < 2:# pragma: no cover
+            msg.err("'profile-import' command requires the name of the "
+                    "package to profile. E.g., `acrn.py profile-import numpy`.")
+            exit(0)
+
+        _run_profile(args)
+    elif cmd == "tune":
+        if len(args["commands"]) < 2:# pragma: no cover
+            msg.err("'tune' command requires the path to the script to "
+                    "profile. E.g., `acrn.py tune analysis.py`.")
+            exit(0)
+
+        _run_tune(args)
 
 if __name__ == '__main__': # pragma: no cover
     run(_parser_options())
@@ -58,10 +58,12 @@ def settings(package, reload_=False):
 
     Args:
         package (str): name of the python package to get settings for.
+        reload_ (bool): when True, the config files are read again.
     """
     global packages
     if package not in packages or reload_:
         from os import path
+        reloading = package in packages
         result = CaseConfigParser()
         if package != "acorn":
             confpath = _package_path(package)
@@ -69,6 +71,14 @@ def settings(package, reload_=False):
         _read_single(result, _package_path("acorn"))
         packages[package] = result
 
+        if reloading:
+            #The decorated functions cache their settings, so they need to
+            #know when the configuration changes.
+            import sys
+            decoration = sys.modules.get("acorn.logging.decoration")
+            if decoration is not None:
+                decoration.reload_settings(package)
+
     return packages[package]
 
 def _descriptor_path(package):
@@ -75,11 +75,11 @@ def load_decorate(package):
     """
     # We import the decoration logic from acorn and then overwrite the sys.module
     # for this package with the decorated, original pandas package.
-    from acorn.logging.decoration import set_decorating, decorating
+    from acorn.logging.decoration import set_decorating, is_decorating
     
     #Before we do any imports, we need to set that we are decorating so that
     #everything works as if `acorn` wasn't even here.
-    origdecor = decorating
+    origdecor = is_decorating()
     set_decorating(True)
 
     #If we try and import the module directly, we will get stuck in a loop; at
@@ -110,9 +110,9 @@ class AcornStandardLoader(object): # pragma: no cover
         self.package = package
         
     def load_module(self, fullname):
-        from acorn.logging.decoration import set_decorating, decorating
+        from acorn.logging.decoration import set_decorating, is_decorating
         global hooks
-        odecor = decorating
+        odecor = is_decorating()
         set_decorating(True)
 
         from importlib import import_module
@@ -369,13 +369,12 @@ class InteractiveDecorator(object):
 
         #Finally, check whether any new variables have shown up, or have had
         #their values changed.
-        from acorn.logging.database import tracker, active_db, Instance
+        from acorn.logging.database import tracker, log_uuid, Instance
         varchange = self._var_changes()
-        taskdb = active_db()
         for n, o in varchange:
             otrack = tracker(o)
             if isinstance(otrack, Instance):
-                taskdb.log_uuid(otrack.uuid)
+                log_uuid(otrack.uuid)
 
         global thumb_uuid
         if thumb_uuid is not None:
@@ -498,18 +497,24 @@ def record_markdown(text, cellid):
     
     global _cellid_map
     if cellid not in _cellid_map:
-        from acorn.logging.database import active_db
+        from acorn.logging.database import active_db, sync
         from difflib import SequenceMatcher
         from acorn.logging.diff import cascade
+        #The background writer (if any) needs to have recorded all the previous
+        #markdown entries before we can look for similar ones.
+        sync()
         taskdb = active_db()
         
-        if ekey not in taskdb.entities:
+        #Some of the entries may have been spilled to disk, so we use the
+        #database's keys and history instead of its resident entities.
+        keys = taskdb.keys()
+        if ekey not in keys:
             #Compute a new ekey if possible with the most similar markdown cell
             #in the database.
-            possible = [k for k in taskdb.entities if k[0:3] == "nb-"]
+            possible = [k for k in keys if k[0:3] == "nb-"]
             maxkey, maxvalue = None, 0.
             for pkey in possible:
-                sequence = [e["c"] for e in taskdb.entities[pkey]]
+                sequence = [e["c"] for e in taskdb.history(pkey)]
                 state = ''.join(cascade(sequence))
                 matcher = SequenceMatcher(a=state, b=text)
                 ratio = matcher.quick_ratio()
@@ -517,9 +522,10 @@ def record_markdown(text, cellid):
                     maxkey, maxvalue = pkey, ratio
 
             #We expect the similarity to be at least 0.5; otherwise we decide
-            #that it is a new cell.
+            #that it is a new cell. The best match is `maxkey`, not the last
+            #candidate that was compared.
             if maxkey is not None:
-                ekey = pkey
+                ekey = maxkey
                             
         _cellid_map[cellid] = ekey
         
@@ -29,6 +29,24 @@ def _load_methods(package):
                 caller = _obj_getattr(root, target)
                 _methods[package][fqdn] = caller
 
+def get_analyzer(fqdn):
+    """Returns the method that analyzes the result of calling the method with
+    the specified FQDN.
+
+    Args:
+        fqdn (str): full-qualified name of the method that was called.
+
+    Returns:
+        function: with signature `(fqdn, result, *argl, **argd)`; None if no
+        analysis is configured for `fqdn`.
+    """
+    package = fqdn.split('.')[0]
+    if package not in _methods:
+        _load_methods(package)
+        
+    if _methods[package] is not None:
+        return _methods[package].get(fqdn)
+
 def analyze(fqdn, result, argl, argd):
     """Analyzes the result from calling the method with the specified FQDN.
 
@@ -38,9 +56,6 @@ def analyze(fqdn, result, argl, argd):
         argl (tuple): positional arguments passed to the method call.
         argd (dict): keyword arguments passed to the method call.
     """
-    package = fqdn.split('.')[0]
-    if package not in _methods:
-        _load_methods(package)
-        
-    if _methods[package] is not None and fqdn in _methods[package]:
-        return _methods[package][fqdn](fqdn, result, *argl, **argd)
+    method = get_analyzer(fqdn)
+    if method is not None:
+        return method(fqdn, result, *argl, **argd)
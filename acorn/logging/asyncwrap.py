@@ -0,0 +1,123 @@
+"""Calling wrappers for coroutine functions and asynchronous generator
+functions. They follow :class:`~acorn.logging.decoration.CallingDecorator`, but
+the entry is only started once the coroutine (or asynchronous generator) starts
+running and it is recorded once it finishes. That way, the elapsed time covers
+the `await`-ed execution instead of the creation of the coroutine object.
+
+.. note:: this module uses the `async` syntax of python 3.6+; it is only
+  imported by :class:`~acorn.logging.decoration.CallingDecorator` when it has to
+  wrap a function of this kind.
+"""
+import sys
+from acorn import msg
+from acorn.logging import decoration
+from acorn.logging.decoration import (_decorating, _streamlining,
+                                      _cstack_call, _atdepth_call, _pre, _post,
+                                      _failed, _context, _switch)
+
+def coroutine_wrapper(func, policy, parent, stackdepth):
+    """Constructs the calling wrapper for a coroutine function. Because each
+    asyncio task has its own copy of the logging state, the call stack can stay
+    pushed while the coroutine is suspended.
+
+    Args:
+        func (function): coroutine function to wrap.
+        policy (CallPolicy): settings for logging calls to `func`.
+        parent: class to which `func` belongs if it exists.
+        stackdepth (int): maximum stack depth before entries are ignored.
+    """
+    async def corowrapper(*argl, **argd):
+        origstream = None
+        decor = _decorating.get()
+        if policy.stale and not decor:
+            policy.refresh()
+        quiet = decor or decoration._paused or _streamlining.get()
+        if not quiet:
+            calls = _cstack_call.get()
+            entry, bound, ekey = _pre(policy, parent, stackdepth, argl, argd)
+            if policy.streamline:
+                msg.std("Streamlining {}.".format(policy.fqdn), 2)
+                origstream = False
+                _streamlining.set(True)
+
+        try:
+            result = await func(*argl, **argd)
+        except:
+            if origstream is not None:
+                _streamlining.set(origstream)
+            if not quiet:
+                _cstack_call.set(calls)
+                if calls is None:
+                    _atdepth_call.set(False)
+                _failed(entry)
+            raise
+
+        if not decor:
+            if policy.callwrap is not None:
+                result = policy.callwrap(result)
+        if origstream is not None:
+            _streamlining.set(origstream)
+        if not quiet:
+            _post(policy, result, entry, bound, ekey, argl, argd)
+        return result
+
+    return corowrapper
+
+def asyncgen_wrapper(func, policy, parent, stackdepth):
+    """Constructs the calling wrapper for an asynchronous generator function.
+    Like :func:`~acorn.logging.decoration._generator_wrapper`, the entry covers
+    the whole iteration and the caller's call stack is swapped back in between
+    items.
+
+    Args:
+        func (function): asynchronous generator function to wrap.
+        policy (CallPolicy): settings for logging calls to `func`.
+        parent: class to which `func` belongs if it exists.
+        stackdepth (int): maximum stack depth before entries are ignored.
+    """
+    async def agenwrapper(*argl, **argd):
+        agen = func(*argl, **argd)
+        decor = _decorating.get()
+        if policy.stale and not decor:
+            policy.refresh()
+        quiet = decor or decoration._paused or _streamlining.get()
+        outer = _context()
+        if not quiet:
+            entry, bound, ekey = _pre(policy, parent, stackdepth, argl, argd)
+            if policy.streamline:
+                msg.std("Streamlining {}.".format(policy.fqdn), 2)
+                _streamlining.set(True)
+
+        value, error, closing = None, None, False
+        while True:
+            try:
+                if closing:
+                    await agen.aclose()
+                    break
+                elif error is None:
+                    item = await agen.asend(value)
+                else:
+                    item = await agen.athrow(error)
+            except StopAsyncIteration:
+                break
+            except:
+                _switch(outer)
+                if not quiet:
+                    _failed(entry)
+                raise
+
+            inner = _switch(outer)
+            try:
+                value, error = (yield item), None
+            except GeneratorExit:
+                closing = True
+            except:
+                value, error = None, sys.exc_info()[1]
+            outer = _switch(inner)
+
+        if not quiet:
+            _streamlining.set(outer[2])
+            _post(policy, None, entry, bound, ekey, argl, argd)
+        _switch(outer)
+
+    return agenwrapper
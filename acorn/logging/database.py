@@ -2,16 +2,35 @@
 calls to methods with various objects passed as arguments.
 """
 from uuid import uuid4
+from itertools import islice
+import threading
 from acorn import msg
 
 oids = {}
 """dict: keys are python :meth:`id` values, values are the :class:`Instance`
-class instances from which JSON database can be constructed.
+class instances from which JSON database can be constructed. Objects are only
+referenced weakly (when possible), and are removed from this registry when they
+are garbage collected.
 """
 uuids = {}
 """dict: keys are the :class:`UUID` string values; values are :class:`Instance`
 class instances (i.e., same values as :data:`oids`, but keyed by `uuid`.
 """
+_fingerprints = {}
+"""dict: keys are content fingerprints (see
+:func:`acorn.logging.fingerprint.fingerprint`); values are the uuids of the
+objects that had them in this session.
+"""
+_fingerprinting = None
+"""int: number of elements sampled for content fingerprints; 0 when they are
+disabled. None until the configuration has been checked; see
+:func:`_fingerprint_samples`.
+"""
+_registry = {"retired": 0, "strong": 0}
+"""dict: counters for the :class:`Instance` registry; `retired` is the number of
+tracked objects that have been garbage collected; `strong` is the number of
+objects that don't support weak references and are kept alive by the registry.
+"""
 dbs = {}
 """dict: keys are tuple (project, task), values are the :class:`TaskDB`
 instances for the specified project and task.
@@ -34,6 +53,15 @@ dbdir = None
 is overwritten programatically, then the global settings for `acorn` will *not*
 be checked.
 """
+writer = None
+"""acorn.logging.writer.FlushThread: background thread that records entries and
+saves the databases when `background = 1` is configured in the `[database]`
+section; `None` when records are saved on the calling thread.
+"""
+_background = None
+"""bool: whether the background writer should be used; `None` until the
+configuration has been checked.
+"""
 def set_dbdir(dbdir_):
     """Sets the path to the directory where the JSON files should be
     stored. Calling this method side-steps the configuration settings in the
@@ -65,11 +93,12 @@ def list_tasks(target=None):
         
     chdir(target)
     result = {}
-    for filename in glob("*.*.json"):
+    for filename in glob("*.*.json") + glob("*.*.sqlite") + glob("*.*.jsonz"):
         project, task = filename.split('.')[0:2]
         if project not in result:
             result[project] = []
-        result[project].append(task)
+        if task not in result[project]:
+            result[project].append(task)
 
     #Set the working directory back to what it was.
     chdir(original)
@@ -103,16 +132,76 @@ def set_writeable(writeable_):
     global writeable
     writeable = writeable_
 
+def set_background(background_):
+    """Sets whether entries are recorded and saved by a background writer
+    thread instead of the thread calling the decorated methods. This overrides
+    the `background` option in the `[database]` section of `acorn.cfg`.
+
+    Args:
+        background_ (bool): when True, :func:`record` only queues the entries
+          for the writer thread.
+    """
+    global _background
+    _background = background_
+    if not background_:
+        stop_writer()
+
+def _get_writer():
+    """Returns the background writer thread, starting it if necessary; `None`
+    if the background writer is disabled.
+    """
+    global writer, _background
+    if writer is not None:
+        return writer
+    
+    if _background is None:
+        _background = TaskDB.get_option("background", "0") == "1"
+    if _background:
+        from acorn.logging.writer import FlushThread
+        writer = FlushThread()
+        writer.start()
+        msg.okay("Started background database writer.", 2)
+    return writer
+
+def stop_writer():
+    """Stops the background writer thread (if it is running) after it has
+    processed all its queued entries and saved the databases.
+    """
+    global writer
+    if writer is not None:
+        writer.stop()
+        writer = None
+
+def sync():
+    """Blocks until the background writer (if any) has processed all the
+    entries queued so far, so that :attr:`TaskDB.entities` is up to date.
+    """
+    if writer is not None:
+        writer.sync()
+
+def writer_stats():
+    """Returns the queue-depth and flush-latency counters of the background
+    writer; see :meth:`acorn.logging.writer.FlushThread.stats`. Returns `None`
+    if the background writer isn't running.
+    """
+    if writer is not None:
+        return writer.stats()
+
 def cleanup():
     """Saves all the open databases to JSON so that the kernel can be shut down
-    without losing in-memory collections.
+    without losing in-memory collections. Databases using the journal backend
+    are also compacted into the standard JSON layout.
     """
+    #The background writer owns the final flush; stopping it processes the
+    #rest of its queue and then saves all the databases.
+    stop_writer()
     failed = {}
     success = []
     for dbname, db in dbs.items():
         try:
             #Force the database save, even if the time hasn't elapsed yet.
             db.save(True)
+            db.compact()
             success.append(dbname)
         except: # pragma: no cover
             import sys, traceback
@@ -126,12 +215,125 @@ def cleanup():
         msg.err("Project {1}.{2} save failed:\n{0}".format(tb, *fdb),
                 prefix=False)
     
-def tracker(obj):
+_def_limits = (20, 1000, 5)
+"""tuple: default `(samples, minmax, items)` limits for the summaries of
+containers; see :func:`summary_limits`.
+"""
+_limits = {}
+"""dict: keys are package names; values are the `(samples, minmax, items)`
+limits returned by :func:`summary_limits`.
+"""
+def summary_limits(package):
+    """Returns the limits on the work that :func:`tracker` does to summarize the
+    containers passed to (or returned by) the functions of a package. They are
+    configured by the `samples`, `minmax` and `items` options of the `[summary]`
+    section of the package configuration (or `[acorn.summary]` for all the
+    packages).
+
+    Args:
+        package (str): name of the package that the function belongs to.
+
+    Returns:
+        tuple: `(samples, minmax, items)` where `samples` is the number of
+        elements whose types are checked, `minmax` is the maximum length of a
+        container for its minimum and maximum to be computed and `items` is the
+        number of elements that are tracked in containers of other objects.
+    """
+    try:
+        return _limits[package]
+    except KeyError:
+        pass
+
+    from acorn.config import settings
+    spack = settings(package)
+    result = []
+    for option, default in zip(("samples", "minmax", "items"), _def_limits):
+        value = default
+        for section in ("summary", "acorn.summary"):
+            if spack.has_section(section) and spack.has_option(section, option):
+                value = spack.getint(section, option)
+                break
+        result.append(value)
+
+    _limits[package] = tuple(result)
+    return _limits[package]
+
+def _sample(obj, n, samples):
+    """Returns at most `samples` elements of the container `obj` with length
+    `n`. Sequences are sampled at evenly spaced indices; for sets and dicts, the
+    first elements are used.
+    """
+    if n <= samples:
+        return obj
+    k = samples
+    if isinstance(obj, (list, tuple)):
+        return [obj[(i*n)//k] for i in range(k)]
+    else:
+        return list(islice(obj, k))
+
+def _summarize(obj, limits, untracked):
+    """Returns the summary of a list, dict, set, tuple or range for the
+    argument lists of the database entries. The cost is bounded by `limits`
+    (see :func:`summary_limits`) instead of the length of the container.
+
+    Args:
+        obj: container to summarize.
+        limits (tuple): `(samples, minmax, items)` limits of the summary.
+        untracked (tuple): types that are summarized instead of tracked.
+    """
+    samples, minmax, items = limits
+    n = len(obj)
+    semiform = "{0} len={1:d}"
+    if n == 0:
+        return semiform.format(type(obj), n)
+    if isinstance(obj, range):
+        first, last = obj[0], obj[-1]
+        return "{0} len={1:d} min={2} max={3}".format(type(obj), n,
+                                                     min(first, last),
+                                                     max(first, last))
+
+    sample = _sample(obj, n, samples)
+    if all(isinstance(t, untracked) for t in sample):
+        if n <= minmax:
+            #Unsampled elements may still be of other types, so we only trust
+            #the comparisons if they succeed.
+            try:
+                return "{0} len={1:d} min={2} max={3}".format(type(obj), n,
+                                                             min(obj), max(obj))
+            except (TypeError, ValueError):
+                pass
+        return semiform.format(type(obj), n)
+
+    #We have to run the tracker on each of the elements in the list, set,
+    #dict or tuple; this is necessary so that we can keep track of
+    #subsequent calls made with unpacked parts of the tuple.
+    result = []
+
+    #If we get a list of 10K tuples (like plot points in matplotlib), then
+    #this pollutes the database. So, we restrict the maximum size of complex
+    #lists; we track the first few objects and then store a summary of the
+    #remaining information.
+    for o in islice(obj, items):
+        track = tracker(o, limits)
+        if isinstance(track, Instance):
+            result.append(track.uuid)
+        else:
+            result.append(track)
+
+    if n > items:
+        result.append("... ({0:d} items)".format(n))
+
+    return tuple(result)
+
+def tracker(obj, limits=None):
     """Returns the :class:`Instance` of the specified object if it is one that
     we track by default.
 
     Args:
         obj (object): any python object passed as an argument to a method.
+        limits (tuple): `(samples, minmax, items)` limits on summarizing
+          containers; see :func:`summary_limits`. Defaults to
+          :data:`_def_limits`.
 
     Returns:
         Instance: if the object is trackable, the Instance instance of
@@ -146,37 +348,16 @@ def tracker(obj):
 
     semitrack = (list, dict, set, tuple)
     if six.PY3: # pragma: no cover
-        semitrack = semitrack + (range, filter, map)
-        
-    if (isinstance(obj, semitrack) and
-        all([isinstance(t, untracked) for t in obj])):
-        if len(obj) > 0:
-            semiform = "{0} len={1:d} min={2} max={3}"
-            return semiform.format(type(obj), len(obj), min(obj), max(obj))
-        else:
-            semiform = "{0} len={1:d}"
-            return semiform.format(type(obj), len(obj))
-    elif isinstance(obj, semitrack):
-        #We have to run the tracker on each of the elements in the list, set,
-        #dict or tuple; this is necessary so that we can keep track of
-        #subsequent calls made with unpacked parts of the tuple.
-        result = []
+        semitrack = semitrack + (range,)
+        oneshot = (filter, map)
+    else: # pragma: no cover
+        oneshot = ()
 
-        #If we get a list of 10K tuples (like plot points in matplotlib), then
-        #this pollutes the database. So, we restrict the maximum size of complex
-        #lists to be 5; we track the first 5 objects and then store a summary of
-        #the remaining information.
-        for o in obj[0:min((len(obj), 5))]:
-            track = tracker(o)
-            if isinstance(track, Instance):
-                result.append(track.uuid)
-            else:
-                result.append(track)
-
-        if len(obj) > 5:
-            result.append("... ({0:d} items)".format(len(obj)))
-            
-        return tuple(result)
+    if isinstance(obj, semitrack):
+        return _summarize(obj, limits or _def_limits, untracked)
+    elif isinstance(obj, oneshot):
+        #Iterating over these would consume them before the function can.
+        return "{0}".format(type(obj))
     elif isinstance(obj, slice):
         return "slice({}, {}, {})".format(obj.start, obj.stop, obj.step)
     elif type(obj) is type:
@@ -199,16 +380,127 @@ def tracker(obj):
         #arrays. In that case, we should maintain the tuple structure for
         #descriptive purposes, but still return a tracker.
         oid = id(obj)
-        if oid in oids:
-            result = oids[oid]
-        else:
-            result = Instance(oid, obj)
+        result = oids.get(oid)
+        #The identity check protects against an `id` that was recycled before
+        #the previous object's finalizer removed it from the registry.
+        if result is None or result.obj is not obj:
+            result = _new_instance(oid, obj)
             oids[oid] = result
-            uuids[result.uuid] = result
+            #Objects with the same fingerprint share a uuid; the first one
+            #stays registered for :meth:`TaskDB.log_uuid` to describe.
+            if uuids.get(result.uuid) is None:
+                uuids[result.uuid] = result
         return result
     else:
         return None
 
+def _fingerprint_samples():
+    """Returns the number of elements sampled for the content fingerprints of
+    arrays and data frames, configured by the `fingerprint_samples` option of
+    the `[database]` section. Returns 0 unless `fingerprint = 1` is set in the
+    same section.
+    """
+    global _fingerprinting
+    if _fingerprinting is None:
+        if TaskDB.get_option("fingerprint", "0") == "1":
+            _fingerprinting = TaskDB.get_option("fingerprint_samples", 4096,
+                                                int)
+        else:
+            _fingerprinting = 0
+    return _fingerprinting
+
+def _new_instance(oid, obj):
+    """Returns a new :class:`Instance` for `obj`. If fingerprinting is enabled
+    and an object with the same content was already tracked (in this session or
+    in the active task database), the instance re-uses its uuid and
+    description.
+    """
+    samples = _fingerprint_samples()
+    if samples == 0:
+        return Instance(oid, obj)
+
+    from acorn.logging.fingerprint import fingerprint
+    fprint = fingerprint(obj, samples)
+    if fprint is None:
+        return Instance(oid, obj)
+
+    uuid, description, pin = _fingerprints.get(fprint), None, True
+    if uuid is not None and uuid in uuids:
+        description = uuids[uuid].description
+        #The object that registered the uuid stays pinned until it is
+        #described, so this copy never has to be.
+        pin = False
+    if description is None:
+        db = active_db()
+        if uuid is None:
+            uuid = db.fingerprint_uuid(fprint)
+        if uuid is not None:
+            description = db.uuids.get(uuid)
+
+    result = Instance(oid, obj, uuid, description, fprint, pin)
+    _fingerprints[fprint] = result.uuid
+    return result
+
+def _retire(pid, uuid):
+    """Removes the :class:`Instance` with the specified `id` and `uuid` from the
+    registry once its object has been garbage collected. Objects with the same
+    content fingerprint share a uuid, so the instance of a live object with the
+    same uuid stays registered.
+    """
+    retired = False
+    instance = oids.get(pid)
+    if instance is not None and instance.uuid == uuid:
+        del oids[pid]
+        retired = True
+    instance = uuids.get(uuid)
+    if instance is not None and instance.pid == pid:
+        del uuids[uuid]
+        retired = True
+    if retired:
+        _registry["retired"] += 1
+
+def tracker_stats():
+    """Returns statistics about the objects tracked by :func:`tracker`.
+
+    Returns:
+        dict: with keys `live` (number of tracked objects that are still
+        alive), `retired` (number of tracked objects that have been garbage
+        collected) and `strong` (number of live objects that can't be weakly
+        referenced, and so are kept alive by the registry).
+    """
+    return {"live": len(oids),
+            "retired": _registry["retired"],
+            "strong": _registry["strong"]}
+
+def _reset_after_fork():
+    """Forgets the databases, tracked objects and writer thread inherited from
+    the parent process when the process forks (e.g. for :mod:`multiprocessing`
+    workers). The child then opens its own task databases (with its own journal)
+    on the next call that is logged.
+    """
+    global writer
+    dbs.clear()
+    oids.clear()
+    uuids.clear()
+    _fingerprints.clear()
+    #Threads don't survive a fork; the child starts its own writer if needed.
+    writer = None
+
+    import sys
+    if "multiprocessing" in sys.modules:
+        #Processes started by multiprocessing exit without running the atexit
+        #handlers, so the child's databases are saved by its finalizers.
+        from multiprocessing.util import Finalize
+        Finalize(None, cleanup, exitpriority=0)
+
+try:
+    from os import register_at_fork
+except ImportError: # pragma: no cover
+    #Older python versions can't run handlers on fork.
+    pass
+else:
+    register_at_fork(after_in_child=_reset_after_fork)
+
 def _dbdir():
     """Returns the path to the directory where acorn DBs are stored.
     """
@@ -263,7 +555,8 @@ def _json_clean(d):
     return (result, compkeys)
 
 def save_image(byteio, imgfmt):
-    """Saves the specified image to disk.
+    """Saves the specified image to disk (or to the database itself, depending
+    on the storage backend of the active task database).
 
     Args:
         byteio (bytes): image bytes to save to disk.
@@ -272,19 +565,8 @@ def save_image(byteio, imgfmt):
     Returns:
         str: a uuid for the saved image that can be added to the database entry.
     """
-    from os import path, mkdir
-    ptdir = "{}.{}".format(project, task)
     uuid = str(uuid4())
-
-    #Save the image within the project/task specific folder.
-    idir = path.join(dbdir, ptdir)
-    if not path.isdir(idir):
-        mkdir(idir)
-        
-    ipath = path.join(idir, "{}.{}".format(uuid, imgfmt))
-    with open(ipath, 'wb') as f:
-        f.write(byteio)
-
+    active_db().store.save_image(uuid, byteio, imgfmt)
     return uuid
 
 def active_db():
@@ -297,8 +579,9 @@ def active_db():
     if dbkey in dbs:
         taskdb = dbs[dbkey]
     else:
-        taskdb = TaskDB()
-        dbs[dbkey] = taskdb
+        #Another thread may be opening the same database; only one of them
+        #gets to keep it.
+        taskdb = dbs.setdefault(dbkey, TaskDB())
         msg.okay("Initialized JSON database for {}.{}".format(*dbkey), 2)
 
     return taskdb
@@ -315,26 +598,201 @@ def record(ekey, entry, diff=False):
           (attribute "m") matches.
     """
     taskdb = active_db()
+    bgwriter = writer or _get_writer()
+    if bgwriter is not None:
+        #The writer thread will also save the database when it is due.
+        bgwriter.put(taskdb.record, ekey, entry, diff)
+        return
+    
     taskdb.record(ekey, entry, diff)
     # The task database save method makes sure that we only save as often as
     # specified in the configuration file.
     taskdb.save()
 
+def log_uuid(uuid):
+    """Logs the description of the object with the specified `uuid` to the
+    active task database; see :meth:`TaskDB.log_uuid`.
+    """
+    taskdb = active_db()
+    bgwriter = writer or _get_writer()
+    if bgwriter is not None:
+        bgwriter.put(taskdb.log_uuid, uuid)
+    else:
+        taskdb.log_uuid(uuid)
+
+class Entry(object):
+    """Compact, dict-like record of a single logged call or instance creation.
+    Entries are created for every decorated call, so they use `__slots__`
+    instead of a `dict`; they are only converted to the JSON schema of the
+    database when they are serialized (see :meth:`to_dict`).
+
+    The keys are the same as the database schema: `m` (method FQDN), `a`
+    (argument summaries), `s` (start time), `r` (return value uuid), `c`
+    (calling code), `e` (elapsed time), `p` (CPU time), `o` (time spent by acorn
+    logging the call), `mem` (memory allocated by the call), `z` (analysis of
+    the result), `h` (the result was returned from the memoization cache),
+    `stack` (reduced stack depth) and `!` (exception raised by the call). Keys
+    that were never set are not part of the entry.
+
+    Args:
+        m (str): FQDN of the method that was called.
+        a (dict): summaries of the positional (`_`) and keyword arguments.
+        s (float): time stamp of when the call started.
+        r (str): uuid of the object that the call returned.
+        others (dict): values for any of the other keys in the schema.
+
+    Attributes:
+        t0: high-resolution counter value when the call started; used to compute
+          `e` and never serialized.
+        c0: CPU-time counter value when the call started; used to compute `p`
+          and never serialized.
+        m0: traced memory when the call started; used to compute `mem` and
+          never serialized.
+    """
+    __slots__ = ("m", "a", "s", "r", "c", "e", "p", "o", "mem", "z", "h",
+                 "stack", "error", "t0", "c0", "m0")
+    _keys = ("m", "a", "s", "r", "c", "e", "p", "o", "mem", "z", "h", "stack",
+             "!")
+    """tuple: keys of the schema, in the order they are serialized.
+    """
+    _slots = {"!": "error"}
+    """dict: keys in the schema that aren't valid attribute names; values are
+    the names of the slots that they are stored in.
+    """
+    def __init__(self, m, a, s, r=None, **others):
+        self.m = m
+        self.a = a
+        self.s = s
+        self.r = r
+        for key, value in others.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key not in Entry._keys:
+            raise KeyError(key)
+        try:
+            return getattr(self, Entry._slots.get(key, key))
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in Entry._keys:
+            raise KeyError(key)
+        setattr(self, Entry._slots.get(key, key), value)
+
+    def __contains__(self, key):
+        return (key in Entry._keys and
+                hasattr(self, Entry._slots.get(key, key)))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (Entry, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def get(self, key, default=None):
+        """Returns the value of `key` if it has been set, else `default`.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """Returns the list of keys that have values in this entry.
+        """
+        return [k for k in Entry._keys if k in self]
+
+    def items(self):
+        """Returns a list of `(key, value)` tuples for this entry.
+        """
+        return [(k, self[k]) for k in self.keys()]
+
+    def to_dict(self):
+        """Returns the entry as a `dict` with the JSON schema of the database.
+        """
+        return dict(self.items())
+
+def _uuids_in(value):
+    """Generator over the uuids in an argument or return value summary,
+    including the ones nested in the summaries of tuples, lists and dicts.
+    """
+    from uuid import UUID
+    if isinstance(value, str):
+        #We use the constructor to determine if the format of the string is a
+        #valid UUID; if it isn't, it is a user-readable string instead.
+        if len(value) == 36:
+            try:
+                yield str(UUID(value))
+            except ValueError:
+                pass
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            for uid in _uuids_in(item):
+                yield uid
+    elif isinstance(value, dict):
+        for item in value.values():
+            for uid in _uuids_in(item):
+                yield uid
+
 class TaskDB(object):
     """Represents the database for a single task.
 
     Attributes:
         entities (dict): keys are entity ids (fqdn or uuid); values are a list of
-          entries generated for that entity during this task.
+          entries generated for that entity during this task. When
+          :attr:`maxresident` is set, only the most recent entries are kept
+          here. Entries that were already in an indexed database file when it
+          was opened stay on disk (see :attr:`base`); use :meth:`keys` and
+          :meth:`history` to include those and the ones spilled to disk.
         uuids (dict): keys are `uuid` values for class instances; values are
           dicts with attributes describing the class instance's origin.
         dbpath (str): full path to the database JSON file for this task
           database.
         lastsave (float): timestamp since the last time the DB was saved.
+        savefreq (int): minutes between saves of the database; from the
+          `savefreq` option in the `[database]` section.
+        store: storage engine from :mod:`acorn.logging.storage` that
+          serializes the database to disk.
+        maxresident (int): maximum number of entries to keep in memory; from
+          the `max_resident_entries` option in the `[database]` section. Zero
+          means that there is no limit.
+        strings (dict): interning table for the FQDNs, entity keys and argument
+          summaries that repeat across entries; keys and values are the same
+          strings, so that every entry references a single copy.
+        spill (acorn.logging.storage.SpillFile): on-disk segments for the
+          entries that were dropped from memory; `None` until the first spill.
+        base (acorn.logging.storage.IndexedFile): lazily-read entries from the
+          database file as it was when the task was opened; `None` if the file
+          didn't exist or had no up-to-date index.
+
+    Args:
+        dbdir (str): directory to store the database in; defaults to the
+          configured database directory.
+        backend (str): name of the storage backend to use; defaults to the
+          `backend` option in the `[database]` section of `acorn.cfg`.
     """
-    def __init__(self, dbdir=None):      
+    def __init__(self, dbdir=None, backend=None):
         self.entities = {}
         self.uuids = {}
+        self._fingerprints = None
+        self._pending = []
+        self._pending_uuids = []
+        self._busy = threading.Lock()
         if dbdir is None:
             dbdir = _dbdir()
 
@@ -343,7 +801,18 @@ class TaskDB(object):
             msg.warn("The project and task are using default values. "
                      "Use :meth:`acorn.set_task` to change them.")
         self.dbpath = path.join(dbdir, "{}.{}.json".format(project, task))
+
+        from acorn.logging.storage import get_store
+        if backend is None:
+            backend = TaskDB.get_option("backend", "json")
+        self.store = get_store(backend, self.dbpath)
         
+        self.savefreq = TaskDB.get_option("savefreq", 2, int)
+        self.maxresident = TaskDB.get_option("max_resident_entries", 0, int)
+        self.strings = {}
+        self.spill = None
+        self.base = None
+        self._order = None
         self.lastsave = None
         self.load()
 
@@ -357,8 +826,38 @@ class TaskDB(object):
         """
         #We only need to try and describe an object once; if it is already in
         #our database, then just move along.
-        if uuid not in self.uuids and uuid in uuids:
-            self.uuids[uuid] = uuids[uuid].describe()
+        if uuid not in self.uuids:
+            #The object may be garbage collected at any time (even while we are
+            #describing it on the writer thread), so we can't check first.
+            instance = uuids.get(uuid)
+            if instance is not None:
+                self.uuids[uuid] = instance.describe()
+                if writeable:
+                    self._pending_uuids.append(uuid)
+                if (self._fingerprints is not None and
+                    instance.fingerprint is not None):
+                    self._fingerprints[instance.fingerprint] = uuid
+        else:
+            #Objects with the same fingerprint share the uuid of the one that
+            #was described first.
+            instance = uuids.get(uuid)
+            if instance is not None and instance.description is None:
+                instance.release(self.uuids[uuid])
+
+    def fingerprint_uuid(self, fprint):
+        """Returns the uuid of the object described in this database with the
+        specified content fingerprint; None if there is no such object.
+
+        Args:
+            fprint (str): content fingerprint; see
+              :func:`acorn.logging.fingerprint.fingerprint`.
+        """
+        if self._fingerprints is None:
+            self._fingerprints = {}
+            for uuid, description in self.uuids.items():
+                if isinstance(description, dict) and "fingerprint" in description:
+                    self._fingerprints[description["fingerprint"]] = uuid
+        return self._fingerprints.get(fprint)
         
     def record(self, ekey, entry, diff=False):
         """Records the specified entry to the key-value store under the specified
@@ -371,69 +870,166 @@ class TaskDB(object):
               against previous entries under the same `ekey` if their method
               (attribute "m") matches.
         """
-        if ekey not in self.entities:
-            self.entities[ekey] = []
+        ekey = self._compact(ekey, entry, diff)
+        #Several threads can record entries at the same time; `setdefault` and
+        #`append` are atomic, so this path doesn't need a lock.
+        elist = self.entities.setdefault(ekey, [])
             
         #See if we need to diff the code to compress it.
-        if diff and len(self.entities[ekey]) > 0:
+        if diff and (len(elist) > 0 or
+                     any(ekey in source.index for source in self._sources())):
             #Compress the code element of the current entry that we are saving.
             from acorn.logging.diff import cascade, compress
-            sequence = [e["c"] for e in self.entities[ekey]
+            sequence = [e["c"] for e in self.history(ekey)
                         if e["m"] == entry["m"]]
             original = cascade(sequence)
             difference = compress(original, entry["c"])
             #Now, overwrite the entry with the compressed version.
             entry["c"] = difference
 
-        self.entities[ekey].append(entry)
+        elist.append(entry)
+        #The pending records are only kept for the next write to disk.
+        if writeable:
+            self._pending.append((ekey, entry))
+        if self._order is not None:
+            self._order.append(ekey)
+            if len(self._order) > self.maxresident:
+                self._spill()
 
         #We also need to make sure we have uuids and origin information stored
-        #for any uuids present in the parameter string.
-        from uuid import UUID
-        uid = None
-        if entry["r"] is not None:
-            uid = entry["r"]
-        elif isinstance(ekey, str):
-            #For many methods we don't duplicate the UUID in the returns part
-            #because it wastes space. In those cases, the ekey is a UUID.
-            try:
-                uid = str(UUID(ekey))
-            except ValueError: # pragma: no cover
-                pass
-
-        if uid is not None and isinstance(uid, str):
+        #for any uuids present in the parameter string. For many methods we
+        #don't duplicate the UUID in the returns part because it wastes space;
+        #in those cases, the ekey is the UUID (or a tuple of them).
+        returned = entry["r"] if entry["r"] is not None else ekey
+        for uid in _uuids_in(returned):
             self.log_uuid(uid)
 
         #For the markdown and function definitions, we don't have any arguments,
-        #so we set that to None to save space.
-        if entry["a"] is None:
-            return
-                    
-        for larg in entry["a"]["_"]:
-            #We use the constructor to determine if the format of the argument
-            #is a valid UUID; if it isn't then we catch the error and keep
-            #going.
-            if not isinstance(larg, str):
-                continue
-            
-            try:
-                uid = str(UUID(larg))
+        #so we set that to None to save space. The summaries of tuples and other
+        #containers nest the uuids of their elements.
+        if entry["a"] is not None:
+            for uid in _uuids_in(entry["a"]):
                 self.log_uuid(uid)
-            except ValueError:
-                #This was obviously not a UUID, we don't need to worry about it,
-                #it has a user-readable string instead.
-                pass
 
-        #We also need to handle the keyword arguments; these are keyed by name.
-        for key, karg in entry["a"].items():
-            if key == "_" or not isinstance(karg, str):
-                #Skip the positional arguments since we already handled them.
-                continue
-            try:
-                uid = str(UUID(karg))
-                self.log_uuid(uid)
-            except ValueError:
-                pass            
+    def _intern(self, value):
+        """Returns the copy of `value` from the interning table of this
+        database if `value` is a string; otherwise returns `value` unchanged.
+        """
+        if isinstance(value, str):
+            return self.strings.setdefault(value, value)
+        return value
+
+    def _compact(self, ekey, entry, diff):
+        """Replaces the strings in `entry` that repeat across entries with the
+        copies in the interning table.
+
+        Returns:
+            str: the interned entity key.
+        """
+        entry["m"] = self._intern(entry["m"])
+        args = entry["a"]
+        if args is not None:
+            for key, value in args.items():
+                if key == "_":
+                    args["_"] = [self._intern(v) for v in value]
+                else:
+                    args[key] = self._intern(value)
+        if not diff and "c" in entry:
+            #The calling code is the same for every call in the same cell;
+            #code that will be diffed is replaced by the diff anyway.
+            entry["c"] = self._intern(entry["c"])
+        return self._intern(ekey)
+
+    def _sources(self):
+        """Returns the list of on-disk sources of entries that are not in
+        :attr:`entities`, oldest first.
+        """
+        return [s for s in (self.base, self.spill) if s is not None]
+
+    def keys(self):
+        """Returns a list of all the entity keys in the database, including
+        those whose entries are only on disk.
+        """
+        sources = self._sources()
+        if len(sources) == 0:
+            return list(self.entities.keys())
+        result = set(self.entities.keys())
+        for source in sources:
+            result.update(source.keys())
+        return list(result)
+
+    def history(self, ekey):
+        """Returns the full list of entries for the specified entity key,
+        reading any entries that are only on disk.
+
+        Args:
+            ekey (str): fqdn/uuid of the method/object to get entries for.
+        """
+        resident = self.entities.get(ekey, [])
+        sources = self._sources()
+        if len(sources) == 0:
+            return resident
+        result = []
+        for source in sources:
+            result.extend(source.history(ekey))
+        return result + resident
+
+    def _spill(self):
+        """Writes the oldest resident entries to a new on-disk segment and drops
+        them from memory, until only half of :attr:`maxresident` entries are
+        left in memory. If another thread is already spilling or saving, this
+        does nothing.
+        """
+        if not self._busy.acquire(False):
+            return
+        try:
+            self._spill_locked()
+        finally:
+            self._busy.release()
+
+    def _spill_locked(self):
+        """Implements :meth:`_spill` while holding the maintenance lock.
+        """
+        from acorn.logging.storage import SpillFile
+        if self.spill is None:
+            self.spill = SpillFile(TaskDB.get_option("spilldir"))
+
+        #The order deque has one ekey for each resident entry; for each ekey,
+        #the oldest entries are at the start of the list.
+        target = self.maxresident // 2
+        counts = {}
+        for i in range(len(self._order) - target):
+            ekey = self._order.popleft()
+            counts[ekey] = counts.get(ekey, 0) + 1
+
+        records = []
+        for ekey, count in counts.items():
+            elist = self.entities[ekey]
+            records.extend((ekey, e) for e in elist[0:count])
+            del elist[0:count]
+            if len(elist) == 0:
+                del self.entities[ekey]
+
+        refs = self.spill.write(records)
+
+        #Entries that haven't been saved yet are now referenced in the segments
+        #instead of in memory; see :meth:`_pending_records`. Other threads may
+        #be appending to the list, so we only replace the part we looked at.
+        spilled = {id(e): ref for (k, e), ref in zip(records, refs)}
+        npending = len(self._pending)
+        self._pending[0:npending] = [(k, spilled.get(id(e), e))
+                                     for k, e in self._pending[0:npending]]
+        msg.std("Spilled {} entries to {}.".format(len(refs),
+                                                    self.spill.folder), 3)
+
+    def _pending_records(self, count):
+        """Generator over the first `count` `(ekey, entry)` records that haven't
+        been saved yet, reading those that were spilled in the mean time.
+        """
+        for ekey, entry in self._pending[0:count]:
+            if isinstance(entry, tuple):
+                entry = self.spill.read([entry])[0]
+            yield (ekey, entry)
 
     @staticmethod
     def get_option(option, default=None, cast=None):
@@ -457,15 +1053,20 @@ class TaskDB(object):
         #We load the database even when it is not configured to be
         #writable. After all, the user may decide part-way through a session to
         #begin writing again, and then we would want a history up to that point
-        #to be valid.
-        from os import path
-        if path.isfile(self.dbpath):
-            import json
-            with open(self.dbpath) as f:
-                jdb = json.load(f)
-                self.entities = jdb["entities"]
-                self.uuids = jdb["uuids"]
-            
+        #to be valid. If the file has an index, the existing entries are only
+        #read from disk when they are needed.
+        self.base, self.entities, self.uuids = self.store.open()
+        self._fingerprints = None
+        if self.maxresident > 0:
+            from collections import deque
+            loaded = sorted(((e.get("s") or 0., i, k)
+                             for k, elist in self.entities.items()
+                             for i, e in enumerate(elist)),
+                            key=lambda l: l[0:2])
+            self._order = deque(k for s, i, k in loaded)
+            if len(self._order) > self.maxresident:
+                self._spill()
+
     def save(self, force=False):
         """Serializes the database file to disk.
 
@@ -473,67 +1074,133 @@ class TaskDB(object):
             force (bool): when True, the elapsed time since last save is ignored
                 and the database is saved anyway (subject to global
                 :data:`writeable` setting).
-        """
-        from time import time
 
+        Returns:
+            bool: True if the database was written to disk.
+        """
+        if len(self._pending) == 0 and len(self._pending_uuids) == 0:
+            #Nothing has changed since the last save.
+            return False
+        
         # Since the DBs can get rather large, we don't want to save them every
         # single time a method is called. Instead, we only save them at the
         # frequency specified in the global settings file.
-        from datetime import datetime
-        savefreq = TaskDB.get_option("savefreq", 2, int)
-        
+        from time import time
+        now = time()
         if self.lastsave is not None:
-            delta = (datetime.fromtimestamp(time()) -
-                     datetime.fromtimestamp(self.lastsave)) 
-            elapsed = int(delta.total_seconds()/60)
+            elapsed = int((now - self.lastsave)/60)
         else:
-            elapsed = savefreq + 1
+            elapsed = self.savefreq + 1
 
-        if elapsed > savefreq or force:
+        if elapsed > self.savefreq or force:
             if not writeable:
                 #We still overwrite the lastsave value so that this message doesn't
                 #keep getting output for every :meth:`record` call.
-                self.lastsave = time()
+                self.lastsave = now
                 msg.std("Skipping database write to disk by setting.", 2)
-                return
+                #Records from before the writes were disabled would otherwise
+                #stay pending for the rest of the session.
+                with self._busy:
+                    del self._pending[:]
+                    del self._pending_uuids[:]
+                return False
 
-            import json
-            try:
-                entities, compkeys = _json_clean(self.entities)
-                jdb = {"entities": entities,
-                       "compkeys": compkeys,
-                       "uuids": self.uuids}
-                with open(self.dbpath, 'w') as f:
-                    json.dump(jdb, f)
-            except: # pragma: no cover
-                from acorn.msg import err
-                import sys
-                raise
-                err("{}: {}".format(*sys.exc_info()[0:2]))
-
-            self.lastsave = time()
+            #Entries recorded by other threads while we are writing are
+            #appended after the ones we flush, so they stay pending.
+            with self._busy:
+                npending = len(self._pending)
+                nuuids = len(self._pending_uuids)
+                if npending == 0 and nuuids == 0:
+                    #Another thread saved them while we were waiting.
+                    return False
+                try:
+                    self.store.flush(self, self._pending_records(npending),
+                                     self._pending_uuids[0:nuuids])
+                except: # pragma: no cover
+                    from acorn.msg import err
+                    import sys
+                    raise
+                    err("{}: {}".format(*sys.exc_info()[0:2]))
+
+                del self._pending[0:npending]
+                del self._pending_uuids[0:nuuids]
+                self.lastsave = time()
+            return True
+
+        return False
+
+    def compact(self):
+        """Rewrites the database on disk in the standard JSON layout, merging
+        any journal that the storage backend has been appending to.
+        """
+        if not writeable:
+            return
+        self.store.compact(self)
     
 class Instance(object):
     """Represents a class instance in the current session which can be
     passed as an argument to method calls, or have unbound methods
     called in it.
 
+    The object is only referenced weakly, so that tracking it doesn't keep it
+    alive for the whole session. However, it is *pinned* by a strong reference
+    until it has been described by :meth:`describe` (which may happen later on
+    the background writer thread). Objects that don't support weak references
+    stay pinned.
+
     Args:
         pid (int): python memory address (returned by :func:`id`).
+        uuid (str): uuid of an earlier object with the same content; a new one
+          is generated when it is None.
+        description (dict): description of that earlier object, if known.
+        fingerprint (str): content fingerprint of the object, see
+          :func:`acorn.logging.fingerprint.fingerprint`.
+        pin (bool): when False, the object is never pinned (another object with
+          the same uuid is).
 
     Attributes:
         uuid (str): :meth:`uuid.uuid4` for the object.
-        obj: original object instance that this represents.
+        description (dict): cached result of :meth:`describe`.
+        fingerprint (str): content fingerprint of the object; None if it
+          wasn't fingerprinted.
     """
-    def __init__(self, pid, obj):
+    def __init__(self, pid, obj, uuid=None, description=None,
+                 fingerprint=None, pin=True):
+        import weakref
         self.pid = pid
-        self.uuid = str(uuid4())
-        self.obj = obj
-        
+        self.uuid = str(uuid4()) if uuid is None else uuid
+        self.description = description
+        self.fingerprint = fingerprint
+        self._obj = obj if description is None and pin else None
+        try:
+            self._ref = weakref.ref(obj)
+        except TypeError:
+            self._ref = None
+            _registry["strong"] += 1
+        else:
+            if hasattr(weakref, "finalize"):
+                weakref.finalize(obj, _retire, pid, self.uuid)
+            else: # pragma: no cover
+                #Python 2 doesn't have `finalize`; the reference callback does
+                #the same job as long as the reference itself is kept alive.
+                self._ref = weakref.ref(obj, lambda r, p=pid, u=self.uuid:
+                                        _retire(p, u))
+
+    @property
+    def obj(self):
+        """Returns the original object instance that this represents, or `None`
+        if it has been garbage collected.
+        """
+        if self._obj is not None or self._ref is None:
+            return self._obj
+        return self._ref()
+
     def describe(self):
         """Returns a dictionary describing the object based on its type.
         """
-        result = {}
+        if self.description is not None:
+            return self.description
+        
         #Because we created an Instance object, we already know that this object
         #is not one of the regular built-in types (except, perhaps, for list,
         #dict and set objects that can have their tracking turned on).
@@ -542,4 +1209,21 @@ class Instance(object):
         #already have a paper trail that shows exactly how it was done; but for
         #these, we have to rely on human-specified descriptions.
         from acorn.logging.descriptors import describe
-        return describe(self.obj)
+        description = describe(self.obj)
+        if self.fingerprint is not None and isinstance(description, dict):
+            #The fingerprint is saved with the description so that later
+            #sessions can match the same content to this uuid.
+            description["fingerprint"] = self.fingerprint
+        self.release(description)
+        return self.description
+
+    def release(self, description):
+        """Sets the description of the object so that it no longer has to be
+        pinned; used directly when an object with the same uuid was already
+        described.
+        """
+        self.description = description
+        if self._ref is not None:
+            #Now that we have a description, we don't need to keep the object
+            #alive any longer.
+            self._obj = None
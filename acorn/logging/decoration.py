@@ -37,24 +37,52 @@ Then, you can auto-decorate the package using:
     import acorn.package
 """
 from acorn import msg
-from acorn.logging.database import tracker, record
+from acorn.logging.database import tracker, record, Entry, summary_limits
 from time import time
-from acorn.logging.analysis import analyze
+try:
+    from time import perf_counter_ns as _clock, process_time_ns as _cpuclock
+    _tick = 1e-9
+except ImportError: # pragma: no cover
+    try:
+        from time import perf_counter as _clock, process_time as _cpuclock
+    except ImportError:
+        from time import time as _clock, clock as _cpuclock
+    _tick = 1.
+from acorn.logging.analysis import analyze, get_analyzer
 import acorn
 import six
 import inspect
+import threading
+from contextlib import contextmanager
 from acorn.base import testmode
+try:
+    from contextvars import ContextVar
+except ImportError: # pragma: no cover
+    class ContextVar(threading.local):
+        """Thread-local stand-in for :class:`contextvars.ContextVar` on
+        python versions that don't have it.
+        """
+        def __init__(self, name, default=None):
+            self.name = name
+            self.value = default
+
+        def get(self):
+            return self.value
+
+        def set(self, value):
+            self.value = value
 
-decorating = False
-"""bool: when True, the script is decorating objects; if any other objects have
-methods that call decorated objects, we don't want the decorations to log
-entries since we are still in the initialization phase.
+_decorating = ContextVar("acorn_decorating", default=False)
+"""ContextVar: when True, the script is decorating objects; if any other objects
+have methods that call decorated objects, we don't want the decorations to log
+entries since we are still in the initialization phase. Like the other logging
+state below, the flag only applies to the current thread (or asyncio task).
 """
-streamlining = False
-"""bool: when True, a method has disabled all logging for subsequent calls. The
-method will reset this variable once it has executed. This is needed to optimize
-packages like `matplotlib` that make thousands of calls for a high-level method
-like plot.
+_streamlining = ContextVar("acorn_streamlining", default=False)
+"""ContextVar: when True, a method has disabled all logging for subsequent calls
+in the same thread (or asyncio task). The method will reset this variable once
+it has executed. This is needed to optimize packages like `matplotlib` that make
+thousands of calls for a high-level method like plot.
 """
 
 def iswhat(o):
@@ -153,6 +181,10 @@ name_filters = {}
 """dict: keys are package names; values are dicts of lists. 1)
 :meth:`~fnmatch.fnmatch` patterns; 2) :meth:`re.match` patterns.
 """
+_filter_cache_size = 4096
+"""int: maximum number of function names whose filter result is memoized for
+each `(package, context)`; the memo is reset when it fills up.
+"""
 _decorated_packs = []
 """list: of package names that have had :func:`decorate` called on them.
 """
@@ -170,8 +202,11 @@ def _get_name_filter(package, context="decorate", reparse=False):
 
     Args:
         package (str): name of the package that this method belongs to.
-        context (str): one of ['decorate', 'time', 'analyze']; specifies which
-          section of the configuration settings to check.
+        context (str): one of ['decorate', 'time', 'analyze', 'memory',
+          'memoize']; specifies which section of the configuration settings to
+          check.
+        reparse (bool): when True, the configuration is read again and the
+          compiled filters and memoized results are discarded.
     """
     global name_filters
     pkey = (package, context)
@@ -186,7 +221,9 @@ def _get_name_filter(package, context="decorate", reparse=False):
     sections = {
         "decorate": ["tracking", "acorn.tracking"],
         "time": ["timing", "acorn.timing"],
-        "analyze": ["analysis", "acorn.analysis"]
+        "analyze": ["analysis", "acorn.analysis"],
+        "memory": ["memory", "acorn.memory"],
+        "memoize": ["memoize", "acorn.memoize"]
         }
 
     filters, rfilters = None, None
@@ -209,18 +246,59 @@ def _get_name_filter(package, context="decorate", reparse=False):
                     ignores.extend(re.split(r"\s*\$\s*", spack.get(section, "ignore")))
                 if "rignore" in options: # pragma: no cover
                     pignores = re.split(r"\s*\$\s*", spack.get(section, "rignore"))
-                    rignores.extend([re.compile(p, re.I) for p in pfilters])
+                    rignores.extend([re.compile(p, re.I) for p in pignores])
 
         name_filters[pkey] = {
             "filters": filters,
             "rfilters": rfilters,
             "ignores": ignores,
-            "rignores": rignores
+            "rignores": rignores,
+            "include": _compile_filters(filters, rfilters),
+            "exclude": _compile_filters(ignores, rignores),
+            "cache": {}
             }
     else:
         name_filters[pkey] = None
     return name_filters[pkey]
 
+def _compile_filters(patterns, regexes):
+    """Combines the specified patterns into a single regular expression.
+
+    Args:
+        patterns (list): of :meth:`~fnmatch.fnmatch` patterns.
+        regexes (list): of compiled, case-insensitive :meth:`re.match`
+          patterns.
+
+    Returns:
+        re.Pattern: that matches a (normcased) name if any of the patterns
+        match; None if there are no patterns.
+    """
+    import re
+    from fnmatch import translate
+    from os.path import normcase
+    parts = [translate(normcase(p)) for p in patterns]
+    parts.extend(["(?i:{})".format(r.pattern) for r in regexes])
+    if len(parts) == 0:
+        return None
+    return re.compile('|'.join(["(?:{})".format(p) for p in parts]))
+
+def _match_filter(packfilter, funcname):
+    """Checks the compiled filters for the specified name.
+
+    Returns:
+        bool: True if the name is explicitly included, False if it is ignored
+        and None if no pattern matches it.
+    """
+    from os.path import normcase
+    name = normcase(funcname)
+    # If something is explicitly included that takes precedence over the ignore
+    # filters.
+    if packfilter["include"] is not None and packfilter["include"].match(name):
+        return True
+    if packfilter["exclude"] is not None and packfilter["exclude"].match(name):
+        return False
+    return None
+
 def filter_name(funcname, package, context="decorate", explicit=False):
     """Returns True if the specified function should be filtered (i.e., included
     or excluded for use in the specified context.)
@@ -228,8 +306,9 @@ def filter_name(funcname, package, context="decorate", explicit=False):
     Args: 
         funcname (str): name of the method/function being called.
         package (str): name of the package that the method belongs to.
-        context (str): one of ['decorate', 'time', 'analyze']; specifies which
-          section of the configuration settings to check.
+        context (str): one of ['decorate', 'time', 'analyze', 'memory',
+          'memoize']; specifies which section of the configuration settings to
+          check.
         explicit (bool): when True, if a name is not explicitly specified for
           inclusion, then the function returns False.
 
@@ -243,49 +322,29 @@ def filter_name(funcname, package, context="decorate", explicit=False):
         # everything.
         return True
 
-    # First we handle the `fnmatch` filters. If something is explicitly included
-    # that takes precedence over the ignore filters.
-    matched = None
-    if packfilter["filters"] is not None:
-        from fnmatch import fnmatch
-        for pattern in packfilter["filters"]:
-            if fnmatch(funcname, pattern):
-                matched = True
-                return matched
-
-    #We don't have any use cases yet for regex filters.
-    if packfilter["rfilters"] is not None: # pragma: no cover
-        for pattern in packfilter["rfilters"]:
-            if pattern.match(funcname):
-                matched = True
-                return matched
-
-    if packfilter["ignores"] is not None:
-        from fnmatch import fnmatch
-        for pattern in packfilter["ignores"]:
-            if fnmatch(funcname, pattern):
-                matched = False
-                return matched
-
-    if packfilter["rignores"] is not None: # pragma: no cover
-        for pattern in packfilter["rignores"]:
-            if pattern.match(funcname):
-                matched = False
-                return matched
+    cache = packfilter["cache"]
+    try:
+        matched = cache[funcname]
+    except KeyError:
+        matched = _match_filter(packfilter, funcname)
+        if len(cache) >= _filter_cache_size:
+            cache.clear()
+        cache[funcname] = matched
 
     if matched is None:
         matched = not explicit
             
     return matched
 
-def _tracker_str(item):
+def _tracker_str(item, limits=None):
     """Returns a string representation of the tracker object for the given item.
     
     Args:
         item: object to get tracker for.
-        fqdn (str): fully-qualified domain name of the object.
+        limits (tuple): limits on summarizing containers; see
+          :func:`~acorn.logging.database.summary_limits`.
     """
-    instance = tracker(item)
+    instance = tracker(item, limits)
     if instance is not None:
         if isinstance(instance, str):
             return instance
@@ -298,15 +357,21 @@ def _tracker_str(item):
         #don't want to convert it to a string.
         return item
     
-def _check_args(*argl, **argd):
+def _check_args(argl, argd, limits=None):
     """Checks the specified argument lists for objects that are trackable.
+
+    Args:
+        argl (tuple): positional arguments of the call.
+        argd (dict): keyword arguments of the call.
+        limits (tuple): limits on summarizing containers; see
+          :func:`~acorn.logging.database.summary_limits`.
     """
     args = {"_": []}
     for item in argl:
-        args["_"].append(_tracker_str(item))
+        args["_"].append(_tracker_str(item, limits))
            
     for key, item in argd.items():
-        args[key] = _tracker_str(item)
+        args[key] = _tracker_str(item, limits)
         
     return args
 
@@ -330,21 +395,108 @@ def _reduced_stack(istart=3, iend=5, ipython=True):
     function calls (i.e., ignores any that are not part of the specified package
     or acorn.
 
+    .. note:: this builds the full :func:`inspect.stack` and is only used for
+      verbose debugging output; the logging decisions use :func:`_stack_depth`.
+
     Args:
         package (str): name of the package that the logged method belongs to.
     """
     import inspect
     return [i[istart:iend] for i in inspect.stack() if _decorated_path(i[1])]
 
-_atdepth_new = False
-"""bool: when True, a higher-level creation method has already determined that
-the stack is as deep is it needs to be; this allows subsequent method calls to
-exit more quickly without examining the stack.
+_code_paths = {}
+"""dict: keys are code objects; values are True if the code was defined in one
+of the :data:`_pack_paths`. Reset whenever a new package is decorated.
+"""
+_anchors = set()
+"""set: of the code objects for the calling and creation wrappers. The frames
+of enclosing wrappers mark where a nested call can stop walking the stack.
+"""
+
+def _decorated_code(code):
+    """Cached version of :func:`_decorated_path` for the specified code object.
+    """
+    try:
+        return _code_paths[code]
+    except KeyError:
+        result = _decorated_path(code.co_filename)
+        _code_paths[code] = result
+        return result
+
+def _enclosing():
+    """Returns the depth markers of the innermost decorated call and
+    constructor that are still executing.
+
+    Returns:
+        dict: keys are `id` of the wrapper frame; values are the markers
+        returned by :func:`_stack_depth`.
+    """
+    stops = {}
+    for cstack in (_cstack_call, _cstack_new):
+        top = cstack.get()
+        if top is not None and top[1] is not None:
+            marker = top[1]
+            stops[id(marker[0])] = marker
+    return stops
+
+def _stack_depth(stackdepth):
+    """Counts the frames in the calling stack that belong to decorated
+    packages (the length of :func:`_reduced_stack`) without building the full
+    stack. The walk stops as soon as the count exceeds `stackdepth`, or when it
+    reaches the wrapper frame of an enclosing decorated call, whose count is
+    already known.
+
+    Args:
+        stackdepth (int): maximum stack depth before entries are ignored.
+
+    Returns:
+        tuple: `(reduced, outer, marker)` where `reduced` is the number of
+        decorated frames (any value larger than `stackdepth` once the limit is
+        exceeded); `outer` is the outermost decorated frame; `marker` is a
+        `(frame, count, outer)` tuple for the wrapper that triggered this walk
+        so that nested calls can re-use the count; it is None if the limit was
+        exceeded.
+    """
+    import sys
+    stops = _enclosing()
+    frame = sys._getframe()
+    reduced, outer = 0, None
+    anchor, below = None, 0
+    while frame is not None:
+        if stops and id(frame) in stops and stops[id(frame)][0] is frame:
+            #The enclosing wrapper already counted everything from its own
+            #frame to the top of the stack.
+            reduced += stops[id(frame)][1]
+            outer = stops[id(frame)][2]
+            break
+
+        code = frame.f_code
+        if anchor is None and code in _anchors:
+            anchor, below = frame, reduced
+        if _decorated_code(code):
+            reduced += 1
+            outer = frame
+            if reduced > stackdepth:
+                return (reduced, None, None)
+        frame = frame.f_back
+
+    if anchor is not None:
+        marker = (anchor, reduced - below, outer)
+    else: # pragma: no cover
+        marker = None
+    return (reduced, outer, marker)
+
+_atdepth_new = ContextVar("acorn_atdepth_new", default=False)
+"""ContextVar: when True, a higher-level creation method has already determined
+that the stack is as deep is it needs to be; this allows subsequent method calls
+to exit more quickly without examining the stack.
 """
-_cstack_new = []
-"""list: as constructors call ever more instance constructors, we place them on
-this list and pop them once they return; that way, we know when to reset the
-global at-depth flag.
+_cstack_new = ContextVar("acorn_cstack_new", default=None)
+"""ContextVar: as constructors call ever more instance constructors, we push
+them on this stack and pop them once they return; that way, we know when to
+reset the at-depth flag. The stack is a chain of immutable `(cls, marker,
+parent)` tuples (see :func:`_stack_depth` for the marker), so that threads and
+asyncio tasks that copy the context never modify each other's stacks.
 """
 
 def _pre_create(cls, atdepth, stackdepth, *argl, **argd):
@@ -352,30 +504,27 @@ def _pre_create(cls, atdepth, stackdepth, *argl, **argd):
     parameters. If it should, an initialized entry is returned.
     """
     from time import time
+    marker = None
     if not atdepth:
-        rstack = _reduced_stack()
-        reduced = len(rstack)
+        reduced, outer, marker = _stack_depth(stackdepth)
         if msg.will_print(3): # pragma: no cover
+            rstack = _reduced_stack()
             sstack = [' | '.join(map(str, r)) for r in rstack]
-            msg.info("{} => stack ({}): {}".format(cls.__fqdn__, len(rstack),
+            msg.info("{} => stack ({}): {}".format(cls.__fqdn__, reduced,
                                                    ', '.join(sstack)), 3)
     else:
         reduced = stackdepth + 10
 
     if reduced <= stackdepth:
-        args = _check_args(*argl, **argd)
-        entry = {
-            "m": "{}.__new__".format(cls.__fqdn__),
-            "a": args,
-            "s": time(),
-            "r": None,
-            "stack": reduced
-            }
+        limits = summary_limits(cls.__fqdn__.split('.')[0])
+        args = _check_args(argl, argd, limits)
+        entry = Entry("{}.__new__".format(cls.__fqdn__), args, time(),
+                      stack=reduced)
     else:
         atdepth = True
         entry = None
 
-    return (entry, atdepth)
+    return (entry, atdepth, marker)
 
 def _post_create(atdepth, entry, result):
     """Finishes the entry logging if applicable.
@@ -405,12 +554,16 @@ def creationlog(base, package, stackdepth=_def_stackdepth):
     """   
     @staticmethod
     def wrapnew(cls, *argl, **argd):
-        global _atdepth_new, _cstack_new, streamlining
         origstream = None
-        if not (decorating or streamlining):
-            entry, _atdepth_new = _pre_create(cls, _atdepth_new,
-                                              stackdepth, *argl, **argd)
-            _cstack_new.append(cls)
+        quiet = _decorating.get() or _paused or _streamlining.get()
+        if not quiet:
+            atdepth = _atdepth_new.get()
+            news = _cstack_new.get()
+            entry, newdepth, marker = _pre_create(cls, atdepth,
+                                                  stackdepth, *argl, **argd)
+            if newdepth != atdepth:
+                _atdepth_new.set(newdepth)
+            _cstack_new.set((cls, marker, news))
 
             #See if we need to enable streamlining for this constructor.
             fqdn = cls.__fqdn__
@@ -418,8 +571,8 @@ def creationlog(base, package, stackdepth=_def_stackdepth):
                 #We only use streamlining for the plotting routines at the
                 #moment, so it doesn't get hit by the unit tests.
                 msg.std("Streamlining {}.".format(fqdn), 2)
-                origstream = streamlining
-                streamlining = True
+                origstream = False
+                _streamlining.set(True)
             
         try:
             if six.PY2:
@@ -462,51 +615,58 @@ def creationlog(base, package, stackdepth=_def_stackdepth):
         if origstream is not None:
             #We avoid another dict lookup by checking whether we set the
             #*local* origstream to something above.
-            streamlining = origstream
+            _streamlining.set(origstream)
             
-        if not (decorating or streamlining):
-            _cstack_new.pop()
-            if len(_cstack_new) == 0:
-                _atdepth_new = False
-            _post_create(_atdepth_new, entry, result)
+        if not quiet:
+            _cstack_new.set(news)
+            if news is None:
+                _atdepth_new.set(False)
+            _post_create(_atdepth_new.get(), entry, result)
                         
         return result
+
+    _anchors.add(wrapnew.__func__.__code__)
     return wrapnew
 
-_atdepth_call = False
-"""bool: when True, a higher-level calling method has already determined that
-the stack is as deep is it needs to be; this allows subsequent method calls to
-exit more quickly without examining the stack.
+_atdepth_call = ContextVar("acorn_atdepth_call", default=False)
+"""ContextVar: when True, a higher-level calling method has already determined
+that the stack is as deep is it needs to be; this allows subsequent method calls
+to exit more quickly without examining the stack.
 """
-_cstack_call = []
-"""list: as methods call ever more instance constructors, we place them on
-this list and pop them once they return; that way, we know when to reset the
-global at-depth flag.
+_cstack_call = ContextVar("acorn_cstack_call", default=None)
+"""ContextVar: as methods call ever more instance constructors, we push them on
+this stack and pop them once they return; that way, we know when to reset the
+at-depth flag. Like :data:`_cstack_new`, it is a chain of immutable `(fqdn,
+marker, parent)` tuples.
 """
 
-def _pre_call(atdepth, parent, fqdn, stackdepth, *argl, **argd):
+def _pre_call(atdepth, parent, policy, stackdepth, *argl, **argd):
     """Checks whether the logging should create an entry based on stackdepth. If
     so, the entry is created.
     """
     from time import time
+    fqdn = policy.fqdn
+    marker = None
     if not atdepth:
-        rstack = _reduced_stack()
-        if "<module>" in rstack[-1]: # pragma: no cover
-            code = rstack[-1][1]
+        reduced, outer, marker = _stack_depth(stackdepth)
+        if outer is not None and outer.f_code.co_name == "<module>": # pragma: no cover
+            import linecache
+            code = [linecache.getline(outer.f_code.co_filename,
+                                      outer.f_lineno)]
         else:
             code = ""
 
-        reduced = len(rstack)
         if msg.will_print(3): # pragma: no cover
+            rstack = _reduced_stack()
             sstack = [' | '.join(map(str, r)) for r in rstack]
-            msg.info("{} => stack ({}): {}".format(fqdn, len(rstack),
+            msg.info("{} => stack ({}): {}".format(fqdn, reduced,
                                              ', '.join(sstack)), 3)
     else:
         reduced = stackdepth + 10
 
     bound = False
     if reduced <= stackdepth:
-        args = _check_args(*argl, **argd)
+        args = _check_args(argl, argd, policy.summary)
         # At this point, we should start the entry. If the method raises an
         # exception, we should keep track of that. If this is an instance
         # method, we should get its UUID, if not, then we can just store the
@@ -538,14 +698,8 @@ def _pre_call(atdepth, parent, fqdn, stackdepth, *argl, **argd):
             ekey = _tracker_str(argl[0])
 
         #Check whether the logging has been overidden by a configuration option.
-        if (fqdn not in _logging or _logging[fqdn]):
-            entry = {
-                "m": fqdn,
-                "a": args,
-                "s": time(),
-                "r": None,
-                "c": code,
-            }
+        if policy.log:
+            entry = Entry(fqdn, args, time(), c=code)
         else:
             entry = None
     else:
@@ -553,28 +707,45 @@ def _pre_call(atdepth, parent, fqdn, stackdepth, *argl, **argd):
         atdepth = True
         ekey = None
 
-    return (entry, atdepth, reduced, bound, ekey)
+    return (entry, atdepth, reduced, bound, ekey, marker)
 
-def _post_call(atdepth, package, fqdn, result, entry, bound, ekey, argl, argd):
+def _post_call(atdepth, policy, result, entry, bound, ekey, argl, argd,
+               stop=None):
     """Finishes constructing the log and records it to the database.
+
+    Args:
+        stop (tuple): `(clock, cpuclock)` counter values taken as soon as the
+          call returned; the CPU time is None if it isn't being recorded.
     """
-    from time import time
     if not atdepth and entry is not None:
         ek = ekey
         if result is not None:
-            retid = _tracker_str(result)
+            retid = _tracker_str(result, policy.summary)
             if result is not None and not bound:
                 ek = retid
                 entry["r"] = None
             else:
                 entry["r"] = retid
             
-        name = fqdn.split('.')[-1]
-        if filter_name(fqdn, package, "time"):
-            entry["e"] = time() - entry["s"]
-        if filter_name(fqdn, package, "analyze"):
-            entry["z"] = analyze(fqdn, result, argl, argd)
+        if stop is not None and "o" in entry:
+            entry["e"] = (stop[0] - entry.t0)*_tick
+            if stop[1] is not None:
+                entry["p"] = (stop[1] - entry.c0)*_tick
+        if getattr(entry, "m0", None) is not None:
+            entry["mem"] = _memory_stop(entry)
+            nbytes = _nbytes(result)
+            if nbytes is not None:
+                entry["mem"]["nbytes"] = nbytes
+        if policy.analyze:
+            if policy.analyzer is not None:
+                entry["z"] = policy.analyzer(policy.fqdn, result, *argl, **argd)
+            else:
+                entry["z"] = None
 
+        if stop is not None and "o" in entry:
+            #The overhead covers the stack walk and argument summaries before
+            #the call and the result tracking and analysis after it.
+            entry["o"] = (entry["o"] + _clock() - stop[0])*_tick
         msg.info("{}: {}".format(ek, entry), 1)
         # Before we return the result, let's first save this call to the
         # database so we have a record of it.
@@ -595,12 +766,22 @@ def post(fqdn, package, result, entry, bound, ekey, *argl, **argd):
         bound (bool): true if the method is bound.
         ekey (str): key under which to store the entry in the database.
     """
-    global _atdepth_call, _cstack_call
-    _cstack_call.pop()
-    if len(_cstack_call) == 0:
-        _atdepth_call = False
-    r = _post_call(_atdepth_call, package, fqdn, result,
-                   entry, bound, ekey, argl, argd)
+    return _post(_get_policy(fqdn, package), result, entry, bound, ekey,
+                 argl, argd)
+
+def _post(policy, result, entry, bound, ekey, argl, argd):
+    """Implements :func:`post` for the specified :class:`CallPolicy`.
+    """
+    stop = None
+    if policy.time and entry is not None:
+        stop = (_clock(), _cpuclock() if policy.cpu else None)
+    top = _cstack_call.get()
+    if top is not None:
+        _cstack_call.set(top[2])
+        if top[2] is None:
+            _atdepth_call.set(False)
+    r = _post_call(_atdepth_call.get(), policy, result,
+                   entry, bound, ekey, argl, argd, stop)
     return r
         
 def pre(fqdn, parent, stackdepth, *argl, **argd):
@@ -614,13 +795,33 @@ def pre(fqdn, parent, stackdepth, *argl, **argd):
         argl (list): positional arguments passed to the function call.
         argd (dict): keyword arguments passed to the function call.
     """
-    global _atdepth_call, _cstack_call
+    #The extra call to :func:`_pre` adds another frame to the stack.
+    return _pre(_get_policy(fqdn, fqdn.split('.')[0]), parent, stackdepth+1,
+                argl, argd)
+
+def _pre(policy, parent, stackdepth, argl, argd):
+    """Implements :func:`pre` for the specified :class:`CallPolicy`.
+    """
+    if policy.time:
+        begin = _clock()
     #We add +1 to stackdepth because this method had to be called in
     #addition to the wrapper method, so we would be off by 1.
-    pcres = _pre_call(_atdepth_call, parent, fqdn, stackdepth+1,
+    atdepth = _atdepth_call.get()
+    pcres = _pre_call(atdepth, parent, policy, stackdepth+1,
                       *argl, **argd)
-    entry, _atdepth_call, reduced, bound, ekey = pcres
-    _cstack_call.append(fqdn)
+    entry, newdepth, reduced, bound, ekey, marker = pcres
+    if newdepth != atdepth:
+        _atdepth_call.set(newdepth)
+    _cstack_call.set((policy.fqdn, marker, _cstack_call.get()))
+    if policy.memory and entry is not None:
+        entry.m0 = _memory_start()
+    if policy.time and entry is not None:
+        #The counters are read last so that the elapsed time only covers the
+        #call itself; see :func:`_post_call`.
+        if policy.cpu:
+            entry.c0 = _cpuclock()
+        entry.t0 = _clock()
+        entry["o"] = entry.t0 - begin
     return (entry, bound, ekey)
 
 class CallingDecorator(object):
@@ -644,7 +845,10 @@ class CallingDecorator(object):
 
     def __call__(self, fqdn, package, parent, stackdepth=_def_stackdepth):
         """Constructs a calling wrapper for the specified reference to
-        :attr:`func`.
+        :attr:`func`. Generator functions, coroutine functions and asynchronous
+        generator functions get wrappers of the same kind so that the entry
+        times the execution of their body instead of the creation of the
+        generator or coroutine object.
 
         Args:
             fqdn (str): fully qualified name of the method being decorated.
@@ -657,17 +861,36 @@ class CallingDecorator(object):
             function: the wrapper that logs before and after the function call
               based on package settings.
         """
+        policy = _get_policy(fqdn, package)
+        wrapper = None
+        if hasattr(inspect, "isasyncgenfunction"):
+            from acorn.logging import asyncwrap
+            if inspect.iscoroutinefunction(self.func):
+                wrapper = asyncwrap.coroutine_wrapper(self.func, policy, parent,
+                                                      stackdepth)
+            elif inspect.isasyncgenfunction(self.func):
+                wrapper = asyncwrap.asyncgen_wrapper(self.func, policy, parent,
+                                                     stackdepth)
+        if wrapper is None and inspect.isgeneratorfunction(self.func):
+            wrapper = _generator_wrapper(self.func, policy, parent, stackdepth)
+        if wrapper is not None:
+            return self._finish(wrapper)
+
         def wrapper(*argl, **argd):
-            global streamlining, _cstack_call
             origstream = None
-            if not (decorating or streamlining):
-                entry, bound, ekey = pre(fqdn, parent, stackdepth, *argl,**argd)
+            decor = _decorating.get()
+            if policy.stale and not decor:
+                policy.refresh()
+            quiet = decor or _paused or _streamlining.get()
+            if not quiet:
+                calls = _cstack_call.get()
+                entry, bound, ekey = _pre(policy, parent, stackdepth, argl, argd)
 
                 #See if we need to enable streamlining for this method call.
-                if fqdn in _streamlines and _streamlines[fqdn]:
+                if policy.streamline:
                     msg.std("Streamlining {}.".format(fqdn), 2)
-                    origstream = streamlining
-                    streamlining = True
+                    origstream = False
+                    _streamlining.set(True)
                     
             #There is a terrible subtlety here. Some packages use the
             #exceptions to figure out what to do next. Scenario: a package
@@ -687,47 +910,236 @@ class CallingDecorator(object):
             #pop the call stack and then raise the exception to bubble it
             #up.
             try:
-                result = self.func(*argl, **argd)
+                if policy.memoize and not decor:
+                    result = _memoized(self.func, policy, entry if not quiet
+                                       else None, argl, argd)
+                else:
+                    result = self.func(*argl, **argd)
             except:
-                if len(_cstack_call) > 0:
-                    _cstack_call.pop()
-                if not testmode and not(decorating or streamlining):
-                    import sys
-                    xt, xm = sys.exc_info()[0:2]
-                    if not hasattr(xm, "__iter__"):
-                        #If the arguments list is scalar, we get an exception
-                        #here, so we change it to be a list.
-                        xm = [xm]
-                        
-                    error = "{}('{}')".format(xt.__name__, ', '.join(xm))
-                    if entry is not None:
-                        entry["!"] = error
+                if origstream is not None:
+                    _streamlining.set(origstream)
+                if not quiet:
+                    _cstack_call.set(calls)
+                    if calls is None:
+                        _atdepth_call.set(False)
+                    _failed(entry)
                 raise    
                 
             #NOTE: it may seem clever to enable the streamlining here as well,
             #however, this ends up causing infinite recursion loops because
             #methods like np.array need to end up being of the sub-classed
             #ndarray type before the decorators will quit.
-            if not decorating:
-                if fqdn in _callwraps:
-                    result = _callwraps[fqdn](result)
+            if not decor:
+                if policy.callwrap is not None:
+                    result = policy.callwrap(result)
 
             #If we don't disable streamlining for the original method that set
             #it, then the post call would never be reached.
             if origstream is not None:
                 #We avoid another dict lookup by checking whether we set the
                 #*local* origstream to something above.
-                streamlining = origstream
+                _streamlining.set(origstream)
                     
-            if not (decorating or streamlining):
-                post(fqdn, package, result, entry, bound, ekey, *argl, **argd)
+            if not quiet:
+                _post(policy, result, entry, bound, ekey, argl, argd)
             return result
 
+        return self._finish(wrapper)
+
+    def _finish(self, wrapper):
+        """Attaches the original function to the specified `wrapper` and
+        registers its code as a stack anchor (see :func:`_stack_depth`).
+        """
         _safe_setattr(wrapper, "__acorn__", self.func)
         setattr(wrapper, "__getattribute__", _safe_getattr(wrapper))
+        _anchors.add(wrapper.__code__)
         
         return wrapper
 
+def _memoized(func, policy, entry, argl, argd):
+    """Calls `func` through the memoization cache (see
+    :mod:`acorn.logging.memoize`); the entry of the call is marked with `h` if
+    the result was cached.
+    """
+    from acorn.logging import memoize
+    ckey = memoize.key(policy.fqdn, func, argl, argd)
+    if ckey is None:
+        return func(*argl, **argd)
+
+    hit, result = memoize.lookup(ckey)
+    if hit:
+        if entry is not None:
+            entry["h"] = True
+        return result
+
+    result = func(*argl, **argd)
+    memoize.store(ckey, result)
+    return result
+
+def _failed(entry):
+    """Marks the specified entry with the exception that is currently being
+    handled.
+    """
+    if entry is not None and getattr(entry, "m0", None) is not None:
+        entry["mem"] = _memory_stop(entry)
+    if testmode or entry is None:
+        return
+    import sys
+    xt, xm = sys.exc_info()[0:2]
+    args = getattr(xm, "args", None)
+    if not isinstance(args, tuple):
+        #If the arguments list is scalar, we change it to be a list.
+        args = (xm,)
+    entry["!"] = "{}('{}')".format(xt.__name__, ', '.join(map(str, args)))
+
+_memory_lock = threading.Lock()
+"""threading.Lock: guards the count of calls that are tracing their memory.
+"""
+_memory_calls = 0
+"""int: number of calls that are currently tracing their memory allocations.
+"""
+_memory_owner = False
+"""bool: True if acorn started :mod:`tracemalloc` (and so has to stop it once
+no calls are tracing their memory anymore).
+"""
+
+def _memory_start():
+    """Starts tracing the python memory allocations for a call configured in
+    the `[memory]` section. Tracing is only enabled while at least one such call
+    is executing, so that other calls don't pay for it.
+
+    Returns:
+        tuple: `(current, peak)` traced memory (in bytes) before the call.
+    """
+    import tracemalloc
+    global _memory_calls, _memory_owner
+    with _memory_lock:
+        if _memory_calls == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memory_owner = True
+        _memory_calls += 1
+        return tracemalloc.get_traced_memory()
+
+def _memory_stop(entry):
+    """Finishes tracing the memory allocations of the call that `entry` logs.
+
+    .. note:: when the tracing was already enabled before the call (by an
+      enclosing call or by the user), the peak is only exact if it was exceeded
+      during the call; otherwise, the net allocation is used as its estimate.
+
+    Returns:
+        dict: with keys `net` (bytes still allocated after the call) and `peak`
+        (largest allocation during the call, in bytes).
+    """
+    import tracemalloc
+    global _memory_calls, _memory_owner
+    with _memory_lock:
+        current, peak = tracemalloc.get_traced_memory()
+        _memory_calls -= 1
+        if _memory_calls == 0 and _memory_owner:
+            tracemalloc.stop()
+            _memory_owner = False
+
+    before = entry.m0
+    entry.m0 = None
+    net = current - before[0]
+    if peak > before[1]:
+        peak -= before[0]
+    else:
+        peak = max(net, 0)
+    return {"net": net, "peak": peak}
+
+def _nbytes(result):
+    """Returns the total `nbytes` of the arrays returned by a call (either
+    directly, or in a tuple); None if the result has no arrays.
+    """
+    items = result if isinstance(result, tuple) else (result,)
+    sizes = [getattr(i, "nbytes", None) for i in items]
+    sizes = [n for n in sizes if isinstance(n, six.integer_types)]
+    return sum(sizes) if len(sizes) > 0 else None
+
+def _context():
+    """Returns the logging state of the current thread (or asyncio task) as a
+    `(call stack, at-depth, streamlining)` tuple.
+    """
+    return (_cstack_call.get(), _atdepth_call.get(), _streamlining.get())
+
+def _switch(state):
+    """Replaces the logging state of the current thread (or asyncio task) with
+    one returned by :func:`_context`.
+
+    Returns:
+        tuple: the state that was replaced.
+    """
+    old = _context()
+    _cstack_call.set(state[0])
+    _atdepth_call.set(state[1])
+    _streamlining.set(state[2])
+    return old
+
+def _generator_wrapper(func, policy, parent, stackdepth):
+    """Constructs the calling wrapper for a generator function. The entry is
+    started when the generator first runs and recorded once it is exhausted (or
+    closed), so that its elapsed time covers the whole iteration. Between
+    items, the caller's call stack is swapped back in; otherwise every call made
+    by the code consuming the generator would look like a nested call.
+
+    Args:
+        func (function): generator function to wrap.
+        policy (CallPolicy): settings for logging calls to `func`.
+        parent: class to which `func` belongs if it exists.
+        stackdepth (int): maximum stack depth before entries are ignored.
+    """
+    def genwrapper(*argl, **argd):
+        gen = func(*argl, **argd)
+        decor = _decorating.get()
+        if policy.stale and not decor:
+            policy.refresh()
+        quiet = decor or _paused or _streamlining.get()
+        outer = _context()
+        if not quiet:
+            entry, bound, ekey = _pre(policy, parent, stackdepth, argl, argd)
+            if policy.streamline:
+                msg.std("Streamlining {}.".format(policy.fqdn), 2)
+                _streamlining.set(True)
+
+        value, error, closing, result = None, None, False, None
+        while True:
+            try:
+                if closing:
+                    gen.close()
+                    break
+                elif error is None:
+                    item = gen.send(value)
+                else:
+                    item = gen.throw(error)
+            except StopIteration as stop:
+                result = getattr(stop, "value", None)
+                break
+            except:
+                _switch(outer)
+                if not quiet:
+                    _failed(entry)
+                raise
+
+            inner = _switch(outer)
+            try:
+                value, error = (yield item), None
+            except GeneratorExit:
+                closing = True
+            except:
+                import sys
+                value, error = None, sys.exc_info()[1]
+            outer = _switch(inner)
+
+        if not quiet:
+            _streamlining.set(outer[2])
+            _post(policy, result, entry, bound, ekey, argl, argd)
+        _switch(outer)
+        return result
+
+    return genwrapper
+
 _extended_objs = {}
 """dict: keys are :func:`id` memory addresses of objects; values are the
 *extended* objects that `acorn` created.
@@ -815,7 +1227,33 @@ _set_failures = []
 cannot be handled in a safe way to have their attributes set without resorting
 to forbidden fruit.
 """
-def _safe_setattr(obj, name, value):
+_missing = object()
+"""object: sentinel for attributes that were not defined in an object's own
+`__dict__` before decoration replaced them.
+"""
+_swaps = []
+"""list: of `(parent, name, original, replacement)` tuples for every attribute
+that decoration replaced; :func:`pause` and :func:`resume` use these to switch
+between the original and the decorated objects.
+"""
+def _raw_getattr(obj, name):
+    """Returns the attribute `name` from the object's own `__dict__`, without
+    looking at base classes or resolving descriptors.
+    """
+    try:
+        return vars(obj).get(name, _missing)
+    except TypeError: # pragma: no cover
+        return _missing
+
+def _remember(obj, name, original):
+    """Records that the attribute `name` of `obj` used to be `original` and has
+    now been replaced by decoration.
+    """
+    replacement = _raw_getattr(obj, name)
+    if replacement is not _missing and replacement is not original:
+        _swaps.append((obj, name, original, replacement))
+
+def _safe_setattr(obj, name, value, undo=False):
     """Safely sets the attribute of the specified object. This includes not
     setting attributes for final objects and setting __func__ for instancemethod
     typed objects.
@@ -824,6 +1262,8 @@ def _safe_setattr(obj, name, value):
         obj: object to set an attribute for.
         name (str): new attribute name.
         value: new attribute value.
+        undo (bool): when True, the original value is remembered so that
+          :func:`pause` can restore it.
 
     Returns:
         bool: True if the set attribute was successful.
@@ -841,7 +1281,10 @@ def _safe_setattr(obj, name, value):
             if isinstance(obj, dict): # pragma: no cover
                 obj[name] = value
             else:
+                original = _raw_getattr(obj, name) if undo else None
                 setattr(obj, name, value)
+                if undo:
+                    _remember(obj, name, original)
             return True
     except (TypeError, AttributeError):# pragma: no cover
         _set_failures.append(okey)
@@ -889,7 +1332,9 @@ def _extend_object(parent, n, o, otype, fqdn):
             #else: we can't handle this kind of object; it just won't be
             #logged...
         try:
+            original = _raw_getattr(parent, n)
             setattr(parent, n, _extended_objs[okey])
+            _remember(parent, n, original)
             return _extended_objs[okey]
         except KeyError: # pragma: no cover
             msg.warn("Object extension failed: {} ({}).".format(o, otype))
@@ -908,6 +1353,164 @@ _split_objects = []
 """list: of objects that have had split called already. This allows us to handle
 objects that would recursively refer to parents that have already been split.
 """
+_plan_format = 1
+"""int: version of the decoration plan layout and of the rules used to build
+them; changing it invalidates all the cached plans.
+"""
+_plans = {}
+"""dict: keys are names of decorated packages; values are dicts with the cache
+`key` (see :func:`_plan_key`), the `plans` loaded from disk and the `new` ones
+recorded in this session, keyed by :func:`_plan_name`.
+"""
+
+def _plan_path(package):
+    """Returns the path to the decoration plan cache of the package; None if the
+    plans shouldn't be persisted. They are stored in the `plans` folder of
+    :func:`acorn.config.config_dir` unless `plans = 0` is set in the
+    `[decoration]` section of `acorn.cfg`. Unit tests never use them.
+    """
+    from acorn import base
+    if base.testmode:
+        return None
+    from os import path
+    from acorn.config import settings, config_dir
+    config = settings("acorn")
+    if (config.has_section("decoration") and
+        config.has_option("decoration", "plans") and
+        config.get("decoration", "plans") != "1"):
+        return None
+    return path.join(config_dir(), "plans", "{}.json".format(package))
+
+def _source_stamp(package):
+    """Returns the number and the latest modification time of the source and
+    extension files of the package, so that editable and development installs
+    (whose version doesn't change with the code) get new plans.
+    """
+    from os import path, walk, stat
+    filename = getattr(package, "__file__", None)
+    if not isinstance(filename, str):
+        return "-"
+    if path.basename(filename).startswith("__init__."):
+        files = []
+        for root, dirs, names in walk(path.dirname(filename)):
+            files.extend(path.join(root, n) for n in names
+                         if n.endswith((".py", ".so", ".pyd")))
+    else:
+        files = [filename]
+
+    latest = 0.
+    for f in files:
+        try:
+            latest = max(latest, stat(f).st_mtime)
+        except OSError: # pragma: no cover
+            pass
+    return "{}@{}".format(len(files), latest)
+
+def _plan_key(package):
+    """Returns the key that the cached decoration plans of the package are only
+    valid for. It combines the package and python versions, the modification
+    times of the package's files (see :func:`_source_stamp`) and hashes of the
+    configuration files that decide what gets decorated.
+
+    Args:
+        package: package object being decorated.
+    """
+    import sys
+    import hashlib
+    from os import path
+    from acorn.config import _package_path
+    parts = [str(_plan_format), sys.version,
+             str(getattr(package, "__version__", None)),
+             _source_stamp(package)]
+    for packname in (package.__name__, "acorn"):
+        cfgpath = _package_path(packname)
+        if path.isfile(cfgpath):
+            with open(cfgpath, 'rb') as f:
+                parts.append(hashlib.sha1(f.read()).hexdigest())
+    return '|'.join(parts)
+
+def _load_plans(package):
+    """Loads the cached decoration plans for the specified package object. Plans
+    created for a different version of the package, python or the
+    configuration are discarded.
+    """
+    npack = package.__name__
+    state = {"key": None, "plans": {}, "new": {}}
+    _plans[npack] = state
+    planpath = _plan_path(npack)
+    if planpath is None:
+        return
+
+    import json
+    from os import path
+    state["key"] = _plan_key(package)
+    if path.isfile(planpath):
+        try:
+            with open(planpath) as f:
+                cached = json.load(f)
+        except: # pragma: no cover
+            msg.warn("Couldn't read the decoration plans for {}.".format(npack))
+            return
+        if cached.get("key") == state["key"]:
+            state["plans"] = cached["plans"]
+            msg.info("Loaded {} decoration plans for {}.".format(
+                len(state["plans"]), npack), 2)
+
+def save_plans():
+    """Writes the decoration plans recorded in this session to disk so that the
+    next import of the packages can replay them.
+    """
+    import json
+    from os import path, makedirs
+    from acorn.logging.storage import atomic_write
+    for npack, state in _plans.items():
+        planpath = _plan_path(npack)
+        if planpath is None or state["key"] is None or len(state["new"]) == 0:
+            continue
+        plans = state["plans"].copy()
+        plans.update((k, v) for k, v in state["new"].items() if v is not None)
+        try:
+            if not path.isdir(path.dirname(planpath)):
+                makedirs(path.dirname(planpath))
+            with atomic_write(planpath) as f:
+                json.dump({"key": state["key"], "plans": plans}, f)
+        except: # pragma: no cover
+            msg.warn("Couldn't save the decoration plans for {}.".format(npack))
+            continue
+        state["plans"] = plans
+        state["new"] = {}
+
+def _plan_name(pobj):
+    """Returns the name that the decoration plan of `pobj` is stored under;
+    None if its plan can't be cached.
+    """
+    import inspect
+    if inspect.ismodule(pobj):
+        return pobj.__name__
+    elif inspect.isclass(pobj):
+        return _fqdn(pobj, False)
+
+def _get_plan(package, name):
+    """Returns the cached plan with the specified name for the package; None if
+    there isn't one.
+    """
+    state = _plans.get(package)
+    if state is None or name is None or name in state["new"]:
+        return None
+    return state["plans"].get(name)
+
+def _record_plan(package, name, steps):
+    """Records the decoration plan of a split object. If two different objects
+    share the same name, neither plan is kept.
+    """
+    state = _plans.get(package)
+    if state is None or state["key"] is None or name is None:
+        return
+    if name in state["new"] and state["new"][name] != steps:
+        state["new"][name] = None
+    else:
+        state["new"][name] = steps
+
 def _split_object(pobj, package, resplit=False, packincl=None, skipext=False):
     """Splits the specified object into its modules, classes, methods and
     functions so that it can be decorated more easily. For extension
@@ -926,6 +1529,10 @@ def _split_object(pobj, package, resplit=False, packincl=None, skipext=False):
           object.
         skipext (bool): when True, the list of split objects is only returned;
           no attempts are made to extend any objects for decoration.
+
+    .. note:: for a regular split, the members that made it into the result
+      are recorded as a plan; if the plan was cached by a previous session (see
+      :func:`_load_plans`), it is replayed instead of examining every member.
     """
     import inspect
     result = {
@@ -941,6 +1548,14 @@ def _split_object(pobj, package, resplit=False, packincl=None, skipext=False):
     global _split_objects
     if pobj in _split_objects and not resplit:
         return result
+
+    planname, steps = None, None
+    if not resplit and packincl is None and not skipext:
+        planname = _plan_name(pobj)
+        steps = []
+        plan = _get_plan(package, planname)
+        if plan is not None:
+            return _replay_plan(pobj, package, plan, result)
     
     tests = {
         "classes": inspect.isclass,
@@ -1022,7 +1637,10 @@ def _split_object(pobj, package, resplit=False, packincl=None, skipext=False):
             return
 
         package = fqdn.split('.')[0]
-        if confok or (filter_name(n, package) and filter_name(fqdn, package)):
+        keep = confok or (filter_name(n, package) and filter_name(fqdn, package))
+        if steps is not None:
+            steps.append((n, t, fqdn, keep))
+        if keep:
             xobj = _extend_object(pobj, n, o, t, fqdn)
             if xobj is not None:
                 result[t].append((n, xobj))
@@ -1057,6 +1675,37 @@ def _split_object(pobj, package, resplit=False, packincl=None, skipext=False):
                 else:
                     oappend(n, o, "unknowns", result, confok)
 
+    _split_objects.append(pobj)
+    if steps is not None:
+        _record_plan(package, planname, steps)
+    return result
+
+def _replay_plan(pobj, package, plan, result):
+    """Splits `pobj` using a plan recorded by :func:`_split_object` in a
+    previous session; only the members in the plan are examined.
+
+    Args:
+        pobj: object being split.
+        package (str): name of the package being decorated.
+        plan (list): of `(name, otype, fqdn, keep)` for the members that
+          belonged to the package; `keep` is False if the filters skipped it.
+        result (dict): empty split result to fill.
+    """
+    for n, t, fqdn, keep in plan:
+        if not keep:
+            opack = fqdn.split('.')[0]
+            if opack in _decor_count:
+                _decor_count[opack][1] += 1
+            continue
+
+        try:
+            o = getattr(pobj, n)
+        except: # pragma: no cover
+            continue
+        xobj = _extend_object(pobj, n, o, t, fqdn)
+        if xobj is not None:
+            result[t].append((n, xobj))
+
     _split_objects.append(pobj)
     return result
 
@@ -1218,7 +1867,7 @@ def decorate_obj(parent, n, o, otype, recurse=True, redecorate=False):
             _update_attrs(clog, o)
             if ((hasattr(o, "im_self") and o.im_self is parent)):
                 clog = staticmethod(clog)
-            setok = _safe_setattr(parent, n, clog)
+            setok = _safe_setattr(parent, n, clog, undo=True)
 
             if setok:
                 decor = cdecor
@@ -1232,7 +1881,8 @@ def decorate_obj(parent, n, o, otype, recurse=True, redecorate=False):
             if hasattr(o, "__new__"):
                 setattr(o, "__old__", staticmethod(o.__new__))
                 crelog = creationlog(o, package, d)
-                setok = _safe_setattr(o, "__new__", creationlog(o, package, d))
+                setok = _safe_setattr(o, "__new__", creationlog(o, package, d),
+                                      undo=True)
                 
                 if setok:
                     decor = crelog
@@ -1248,7 +1898,10 @@ def decorate_obj(parent, n, o, otype, recurse=True, redecorate=False):
         #We don't need to bother recursing for those modules/classes that
         #can't have their attributes set, since their members will have the
         #same restrictions.
-        if setok and otype in ["classes", "modules"]:
+        if setok and otype == "modules" and _make_lazy(o, package):
+            #The members get decorated once they are first accessed.
+            pass
+        elif setok and otype in ["classes", "modules"]:
             #These types can be further decorated; let's traverse their members
             #and try to decorate those as well.
             splits = _split_object(o, package)
@@ -1268,7 +1921,7 @@ def decorate_obj(parent, n, o, otype, recurse=True, redecorate=False):
             _safe_setattr(clog, "__acorn__", o)
             _update_attrs(clog, o)
             
-            setok = _safe_setattr(parent, n, clog)
+            setok = _safe_setattr(parent, n, clog, undo=True)
             msg.okay("Set existing calling logger on {}: {}.".format(n,fqdn), 4)
 
 _explicit_subclasses = {}
@@ -1357,28 +2010,427 @@ def _load_callwraps(packname, package):
         if spack.has_section("callwrap"):
             wrappings = dict(spack.items("callwrap"))
             for fqdn, target in wrappings.items():
+                _lazy_resolve(package, target)
                 caller = _obj_getattr(package, target)
                 _callwraps[fqdn] = caller
 
+class CallPolicy(object):
+    """Settings that decide how calls to a single decorated function are
+    logged. These are read from the configuration once (see :meth:`refresh`)
+    instead of on every call.
+
+    Args:
+        fqdn (str): fully-qualified domain name of the function.
+        package (str): name of the package that the function belongs to.
+
+    Attributes:
+        stale (bool): when True, the settings have to be re-read before the
+          next call.
+        log (bool): when False, the function is tracked but never produces
+          entries; see :data:`_logging`.
+        time (bool): whether the execution time is recorded.
+        cpu (bool): whether the CPU time is recorded as well; see
+          :func:`_cpu_timing`.
+        memory (bool): whether the memory allocations are traced; only
+          functions explicitly included by the `[memory]` section are.
+        analyze (bool): whether the result is analyzed.
+        analyzer: function that analyzes the result; None if the package
+          doesn't configure one for this function.
+        streamline (bool): whether the sub-calls are streamlined; see
+          :data:`_streamlines`.
+        callwrap: function that wraps the result before returning; see
+          :data:`_callwraps`.
+        summary (tuple): limits on summarizing the containers in the arguments
+          and result; see :func:`~acorn.logging.database.summary_limits`.
+        memoize (bool): whether the results are cached; only functions
+          explicitly included by the `[memoize]` section are. See
+          :mod:`acorn.logging.memoize`.
+    """
+    __slots__ = ("fqdn", "package", "stale", "log", "time", "cpu", "memory",
+                 "analyze", "analyzer", "streamline", "callwrap", "summary",
+                 "memoize")
+    def __init__(self, fqdn, package):
+        self.fqdn = fqdn
+        self.package = package
+        self.stale = True
+        self.log = True
+        self.time = False
+        self.cpu = False
+        self.memory = False
+        self.analyze = False
+        self.analyzer = None
+        self.streamline = False
+        self.callwrap = None
+        self.summary = None
+        self.memoize = False
+
+    def refresh(self):
+        """Reads the settings for the function from the package configuration.
+        """
+        fqdn = self.fqdn
+        self.log = _logging.get(fqdn, True)
+        self.streamline = _streamlines.get(fqdn, False)
+        self.callwrap = _callwraps.get(fqdn)
+        self.time = filter_name(fqdn, self.package, "time")
+        self.cpu = self.time and _cpu_timing(self.package)
+        self.memory = (_can_trace and
+                       filter_name(fqdn, self.package, "memory", True))
+        self.analyze = filter_name(fqdn, self.package, "analyze")
+        self.analyzer = get_analyzer(fqdn) if self.analyze else None
+        self.summary = summary_limits(self.package)
+        self.memoize = filter_name(fqdn, self.package, "memoize", True)
+        self.stale = False
+
+try:
+    import tracemalloc
+    _can_trace = True
+except ImportError: # pragma: no cover
+    _can_trace = False
+
+def _cpu_timing(package):
+    """Determines whether the timed calls of the specified package also record
+    their CPU time. This is enabled by `cpu = 1` in the `[timing]` section of
+    the package configuration (or `[acorn.timing]` for all the packages).
+
+    Args:
+        package (str): name of the package that the function belongs to.
+    """
+    from acorn.config import settings
+    spack = settings(package)
+    for section in ("timing", "acorn.timing"):
+        if spack.has_section(section) and spack.has_option(section, "cpu"):
+            return spack.get(section, "cpu") == "1"
+    return False
+
+_policies = {}
+"""dict: keys are function fqdns; values are the :class:`CallPolicy` shared by
+all the wrappers for that function.
+"""
+def _get_policy(fqdn, package):
+    """Returns the :class:`CallPolicy` for the specified function, creating it if
+    necessary. Policies returned for calls that are already happening are
+    refreshed first.
+
+    Args:
+        fqdn (str): fully-qualified domain name of the function.
+        package (str): name of the package that the function belongs to.
+    """
+    try:
+        policy = _policies[fqdn]
+    except KeyError:
+        policy = CallPolicy(fqdn, package)
+        _policies[fqdn] = policy
+
+    if policy.stale and not _decorating.get():
+        policy.refresh()
+    return policy
+
+def reload_settings(packname):
+    """Re-reads the decoration settings after the configuration for the
+    specified package was reloaded; all call policies are refreshed before
+    their next call.
+
+    Args:
+        packname (str): name of the package whose configuration changed. For
+          "acorn", the global settings of every package are affected.
+    """
+    import sys
+    from acorn.logging import analysis, database, memoize
+    for pkey in list(name_filters):
+        if packname == "acorn" or pkey[0] == packname:
+            del name_filters[pkey]
+
+    if packname in _decorated_packs and packname != "acorn":
+        prefix = packname + '.'
+        for target in (_logging, _streamlines, _callwraps):
+            for fqdn in [k for k in target if k.startswith(prefix)]:
+                del target[fqdn]
+
+        package = sys.modules.get(packname)
+        if package is not None:
+            _load_callwraps(packname, package)
+            _load_streamlines(packname, package)
+            _load_logging(packname, package)
+        analysis._methods.pop(packname, None)
+
+    if packname == "acorn":
+        database._limits.clear()
+        database._fingerprinting = None
+        memoize._maxbytes = None
+    else:
+        database._limits.pop(packname, None)
+
+    for policy in _policies.values():
+        policy.stale = True
+
+_paused = False
+"""bool: True while :func:`pause` has put the original objects back.
+"""
+def _restore(obj, name, value):
+    """Sets the attribute `name` of `obj` to `value`, or deletes it if `value`
+    is :data:`_missing`.
+    """
+    if value is _missing:
+        delattr(obj, name)
+    else:
+        setattr(obj, name, value)
+
+def pause():
+    """Puts the original, undecorated objects back on every decorated module
+    and class so that code runs at native speed without any logging. Calls
+    through references to decorated objects that were taken before pausing (and
+    constructors of classes that inherited `__new__`) are not logged either. Use
+    :func:`resume` to switch the logging back on.
+    """
+    global _paused
+    if _paused:
+        return
+
+    for obj, name, original, replacement in reversed(_swaps):
+        if original is _missing and name == "__new__":
+            #Once a class has had `__new__` set, deleting it again doesn't
+            #restore the default constructor slot, and `object.__new__` then
+            #rejects the constructor arguments. The streamlined creation
+            #wrapper just calls the original constructor instead.
+            continue
+        if _raw_getattr(obj, name) is replacement:
+            _restore(obj, name, original)
+    _paused = True
+
+def resume():
+    """Puts the decorated objects back after a call to :func:`pause`.
+    """
+    global _paused
+    if not _paused:
+        return
+
+    for obj, name, original, replacement in _swaps:
+        if _raw_getattr(obj, name) is original:
+            _restore(obj, name, replacement)
+    _paused = False
+
+@contextmanager
+def paused():
+    """Context manager that runs its block with the logging paused; see
+    :func:`pause`.
+
+    Examples:
+        Benchmark a function without any `acorn` overhead.
+
+        >>> import acorn
+        >>> with acorn.paused():
+        ...     timeit.timeit(lambda: np.sum(a), number=1000)
+    """
+    waspaused = _paused
+    pause()
+    try:
+        yield
+    finally:
+        if not waspaused:
+            resume()
+
 def set_decorating(decorating_):
-    """Sets whether the module is operating in decorating mode.
+    """Sets whether the module is operating in decorating mode in the current
+    thread (or asyncio task).
     """
-    global decorating
-    decorating = decorating_
+    _decorating.set(decorating_)
+
+def is_decorating():
+    """Returns True if the current thread (or asyncio task) is decorating
+    objects; see :func:`set_decorating`.
+    """
+    return _decorating.get()
 
 def set_streamlining(streamline):
-    """Sets whether `acorn` logging logic should be disabled temporarily.
+    """Sets whether `acorn` logging logic should be disabled temporarily in the
+    current thread (or asyncio task).
+    """
+    _streamlining.set(streamline)
+
+def is_quiet():
+    """Returns True if decorated calls in the current thread (or asyncio task)
+    are not being logged because objects are being decorated, the logging is
+    paused or the calls are streamlined.
     """
-    global streamlining
-    streamlining = streamline
+    return _decorating.get() or _paused or _streamlining.get()
     
+import types
+_lazy_modules = {}
+"""dict: keys are the modules whose members are decorated lazily; values are
+`[package, pending, getattr, dir]` lists where `pending` is a `dict` of
+`name: (obj, otype)` for the members that haven't been decorated yet and
+`getattr` and `dir` are the module's own `__getattr__` and `__dir__` (or None).
+"""
+_lazy_lock = threading.RLock()
+"""threading.RLock: serializes the lazy decoration of module members.
+"""
+_lazy = None
+"""bool: when True, :func:`decorate` only decorates the members of a module
+once they are first accessed; see :func:`is_lazy`.
+"""
+
+def is_lazy():
+    """Returns True if the packages are decorated lazily. This is configured by
+    the `lazy` option in the `[decoration]` section of `acorn.cfg` (default
+    `1`); python versions before 3.5 always decorate eagerly.
+    """
+    global _lazy
+    if _lazy is None:
+        import sys
+        from acorn.config import settings
+        config = settings("acorn")
+        _lazy = sys.version_info >= (3, 5)
+        if (config.has_section("decoration") and
+            config.has_option("decoration", "lazy")):
+            _lazy = _lazy and config.get("decoration", "lazy") == "1"
+    return _lazy
+
+def _make_lazy(module, package, split=None):
+    """Defers the decoration of the members of the specified module until they
+    are accessed. The members are taken out of the module's `__dict__` and
+    served by a module `__getattr__` (PEP 562), which decorates them on first
+    access and puts them back; decorated members are then plain dictionary
+    lookups.
+
+    Args:
+        module: module object to decorate lazily.
+        package (str): name of the package being decorated.
+        split (dict): result of :func:`_split_object` for `module` if it was
+          already computed.
+
+    Returns:
+        bool: False if the module has to be decorated eagerly instead.
+    """
+    if not is_lazy() or type(module) is not types.ModuleType:
+        return False
+    with _lazy_lock:
+        if module in _lazy_modules:
+            return True
+        if split is None:
+            split = _split_object(module, package)
+
+        members = module.__dict__
+        pending = {}
+        for otype, objs in split.items():
+            for name, obj in objs:
+                if name[0:2] == "__":
+                    #Special members (like the module's own `__getattr__`) have
+                    #to stay in the dictionary.
+                    decorate_obj(module, name, obj, otype)
+                else:
+                    pending[name] = (obj, otype)
+
+        def __getattr__(name):
+            return _lazy_getattr(module, name)
+        def __dir__():
+            return _lazy_dir(module)
+        _lazy_modules[module] = [package, pending, members.get("__getattr__"),
+                                 members.get("__dir__")]
+        for name in pending:
+            members.pop(name, None)
+        members["__getattr__"] = __getattr__
+        members["__dir__"] = __dir__
+        _lazy_finish(module)
+    return True
+
+def _lazy_finish(module):
+    """Restores the module's own `__getattr__` and `__dir__` once all the
+    members of a lazy module have been decorated. Modules with a `__getattr__`
+    can still import new submodules, so they stay lazy.
+    """
+    package, pending, getattr_, dir_ = _lazy_modules[module]
+    if len(pending) > 0 or getattr_ is not None:
+        return
+    del _lazy_modules[module]
+    del module.__dict__["__getattr__"]
+    if dir_ is None:
+        del module.__dict__["__dir__"]
+    else:
+        module.__dict__["__dir__"] = dir_
+
+def _lazy_access(module, name):
+    """Decorates the member `name` of a lazy module (see :func:`_make_lazy`)
+    if it hasn't been already.
+    """
+    origdecor = _decorating.get()
+    _decorating.set(True)
+    try:
+        with _lazy_lock:
+            state = _lazy_modules.get(module)
+            if state is None or name not in state[1]:
+                return
+            obj, otype = state[1].pop(name)
+            #The decoration expects to find the original member on the module.
+            module.__dict__[name] = obj
+            decorate_obj(module, name, obj, otype)
+            _lazy_finish(module)
+    finally:
+        _decorating.set(origdecor)
+
+def _lazy_getattr(module, name):
+    """Module `__getattr__` of the lazy modules (see :func:`_make_lazy`). The
+    original members are returned undecorated while the logging is paused or
+    objects are being decorated. Other names are passed on to the module's own
+    `__getattr__`; submodules that it imports are made lazy as well.
+    """
+    quiet = _paused or _decorating.get()
+    if not quiet:
+        _lazy_access(module, name)
+    with _lazy_lock:
+        if name in module.__dict__:
+            return module.__dict__[name]
+        state = _lazy_modules.get(module)
+        if state is not None and name in state[1]:
+            return state[1][name][0]
+    if state is None or state[2] is None:
+        raise AttributeError("module '{}' has no attribute '{}'".format(
+            module.__name__, name))
+
+    value = state[2](name)
+    package = state[0]
+    if (not quiet and type(value) is types.ModuleType and
+        value.__name__.startswith(package + '.') and
+        id(value) not in _decorated_o.get(package, {})):
+        origdecor = _decorating.get()
+        _decorating.set(True)
+        try:
+            with _lazy_lock:
+                decorate_obj(module, name, value, "modules")
+        finally:
+            _decorating.set(origdecor)
+    return value
+
+def _lazy_dir(module):
+    """Module `__dir__` of the lazy modules (see :func:`_make_lazy`); it
+    includes the members that haven't been decorated yet.
+    """
+    state = _lazy_modules.get(module)
+    if state is None:
+        return sorted(module.__dict__)
+    names = set(state[3]() if state[3] is not None else module.__dict__)
+    return sorted(names | set(state[1]))
+
+def _lazy_resolve(obj, fqdn, start=1):
+    """Decorates the lazy members along the path to `fqdn` (see
+    :func:`~acorn.logging.descriptors._obj_getattr`) so that the object that it
+    returns has already been decorated.
+    """
+    node = obj
+    for chain in fqdn.split('.')[start:]:
+        if type(node) is types.ModuleType and node in _lazy_modules:
+            _lazy_access(node, chain)
+        node = getattr(node, chain, None)
+        if node is None:
+            break
+
 def decorate(package):
     """Decorates all the methods in the specified package to have logging
-    enabled according to the configuration for the package.
+    enabled according to the configuration for the package. When
+    :func:`is_lazy`, the members of the package and of its modules are only
+    decorated once they are first accessed.
     """
     from os import sep
     global _decor_count, _decorated_packs, _decorated_o, _pack_paths
-    global decorating
     if "acorn" not in _decorated_packs:
         _decorated_packs.append("acorn")
         packpath = "acorn{}".format(sep)
@@ -1387,6 +2439,7 @@ def decorate(package):
             #use without decorating. Otherwise those slow *way* down and the
             #notebook becomes unusable.
             _pack_paths.append(packpath)
+            _code_paths.clear()
         
     npack = package.__name__
     #Since scipy includes numpy (for example), we don't want to run the numpy
@@ -1397,23 +2450,29 @@ def decorate(package):
         _decor_count[npack] = [0, 0, 0]
         _decorated_o[npack] = {}
         _load_subclasses(npack)
+        _load_plans(package)
         
         packsplit = _split_object(package, package.__name__)
-        origdecor = decorating
-        decorating = True
-        
-        for ot, ol in packsplit.items():
-            for name, obj in ol:
-                decorate_obj(package, name, obj, ot)
+        origdecor = _decorating.get()
+        _decorating.set(True)
+
+        if not _make_lazy(package, npack, packsplit):
+            for ot, ol in packsplit.items():
+                for name, obj in ol:
+                    decorate_obj(package, name, obj, ot)
+            save_plans()
 
         #Now that we have actually decorated all the objects, we can load the
         #call wraps to point to the new decorated objects.
         _load_callwraps(npack, package)
         _load_streamlines(npack, package)
         _load_logging(npack, package)
-        decorating = origdecor
+        for policy in _policies.values():
+            policy.stale = True
+        _decorating.set(origdecor)
         _decorated_packs.append(npack)
         _pack_paths.append("{}{}".format(npack, sep))
+        _code_paths.clear()
         msg.info("{}: {} (Decor/Skip/NA)".format(npack, _decor_count[npack]))
 
 def postfix(package):
@@ -1443,9 +2502,8 @@ def postfix(package):
     """
     #This time we don't have to go recursively; we can just look at top-level
     #objects in the package.
-    global decorating
-    origdecor = decorating
-    decorating = True
+    origdecor = _decorating.get()
+    _decorating.set(True)
     
     packsplit = _split_object(package, package.__name__,
                               resplit=True, packincl=["numpy"], skipext=True)
@@ -1473,7 +2531,7 @@ def postfix(package):
                     _safe_setattr(clog, "__acornext__", obj)
                     _update_attrs(clog, obj)
 
-                    setattr(package, name, clog)
+                    _safe_setattr(package, name, clog, undo=True)
                     dmsg = "Postfix decorated {} to {}."
                     msg.info(dmsg.format(name, target), 3)
-    decorating = origdecor
+    _decorating.set(origdecor)
@@ -10,18 +10,26 @@ def cascade(sequence, full=False):
     Args:
         sequence (list): of results returned by
           :func:`~acorn.logging.diff.compress`, except that the first entry should
-          be a list of string entries for the very first instance.
+          be a list of string entries for the very first instance. Any later
+          entries that are strings are *keyframes* (see :func:`recompress`).
         full (bool): when True, return all the intermediate entries as well;
           otherwise they are not stored in memory and only the final entry in
           the list is returned.
     """
     if len(sequence) == 1:
         return sequence[0]
+
+    #A keyframe has the full text, so nothing before it is needed.
+    start = 0
+    for i in range(len(sequence)-1, 0, -1):
+        if isinstance(sequence[i], string_types):
+            start = i
+            break
     
-    left = sequence[0]
+    left = sequence[start]
     if full:
         intermed = []
-    for cdiff in sequence[1:]:
+    for cdiff in sequence[start+1:]:
         right = restore(cdiff, left)
         if full:
             intermed.append(right)
@@ -40,6 +48,9 @@ def restore(cdiff, a):
           reference to restore the edited version.
     """
     left = a.splitlines(1) if isinstance(a, string_types) else a
+    #JSON serialization turns the integer line keys into strings, so diffs that
+    #were read back from disk need their keys restored.
+    cdiff = {int(k): v for k, v in cdiff.items()}
     lrest = []
     iline = 0
     
@@ -122,4 +133,34 @@ def compress(a, b):
             iorig += 1
 
     return result
-    
+
+def recompress(sequence, keyframe=20):
+    """Re-runs the compressed diffs of a cascade so that every `keyframe`-th
+    entry is stored with its full text (a *keyframe*) instead of as a diff. This
+    bounds the number of diffs that :func:`cascade` has to apply to restore the
+    latest entry.
+
+    Args:
+        sequence (list): of entries that can be restored with :func:`cascade`.
+        keyframe (int): number of entries between keyframes.
+
+    Returns:
+        list: of the same length as `sequence`, with the keyframes and the
+        diffs between each entry and the one before it.
+    """
+    result = []
+    left = None
+    for i, cdiff in enumerate(sequence):
+        if isinstance(cdiff, string_types):
+            right = cdiff
+        else:
+            right = restore(cdiff, left)
+
+        if left is None or i % keyframe == 0:
+            result.append(right if isinstance(right, string_types)
+                          else ''.join(right))
+        else:
+            result.append(compress(left, right))
+        left = right
+
+    return result
@@ -0,0 +1,127 @@
+"""Content fingerprints for the arrays and data frames that are passed to (or
+returned by) decorated functions. Objects are normally tracked by their
+:func:`id`, so a copy or a reload of the same data gets a new uuid and is
+described again. When fingerprinting is enabled (`fingerprint = 1` in the
+`[database]` section of `acorn.cfg`), objects with the same fingerprint share
+their uuid and description, within and across sessions.
+
+The fingerprint hashes the shape and dtypes of the object together with a fixed
+number of elements, sampled in short runs at evenly spaced positions with
+vectorized indexing. The cost doesn't depend on the size of the data, and only the pages
+of memory-mapped arrays that hold the sampled elements are read.
+
+.. note:: data that only differs in elements that aren't sampled has the same
+  fingerprint. Increase `fingerprint_samples` (4096 by default) in the
+  `[database]` section to sample more elements. With `samples=None`, the
+  whole contents are hashed instead; that is what the memoization in
+  :mod:`acorn.logging.memoize` uses.
+"""
+import sys
+
+_run = 64
+"""int: number of consecutive elements in each sampled run; sampling runs
+instead of single elements keeps the number of memory pages that are read
+small.
+"""
+def _positions(size, samples):
+    """Returns the flat positions of the sampled elements: runs of consecutive
+    elements that start at evenly spaced positions, including both ends.
+    """
+    np = sys.modules["numpy"]
+    if size <= samples:
+        return np.arange(size, dtype=np.intp)
+    #There are at least two runs, so that both ends are sampled.
+    run = min(_run, max(1, samples//2))
+    starts = np.linspace(0, size - run, samples//run).astype(np.intp)
+    return (starts[:, None] + np.arange(run, dtype=np.intp)).ravel()
+
+def _array_fingerprint(a, samples, digest):
+    """Adds the shape, dtype and the sampled elements of the array `a` to the
+    hash `digest`.
+
+    Returns:
+        bool: False if the array's elements can't be hashed by value (object
+        arrays hold references).
+    """
+    np = sys.modules["numpy"]
+    if a.dtype.hasobject:
+        return False
+    digest.update("{}|{}".format(a.shape, a.dtype.str).encode())
+    if a.ndim == 0:
+        digest.update(a.tobytes())
+    elif samples is None:
+        data = np.ascontiguousarray(a).reshape(-1)
+        digest.update(memoryview(data.view(np.uint8)))
+    elif a.size > 0:
+        #Fancy indexing only reads the sampled elements, whatever the strides
+        #of the array; for a memory map, only their pages are faulted in.
+        index = np.unravel_index(_positions(a.size, samples), a.shape)
+        digest.update(np.ascontiguousarray(a[index]).tobytes())
+    return True
+
+def _frame_fingerprint(df, samples, digest):
+    """Adds the shape, columns, dtypes and the hashes of the sampled rows of the
+    `pandas` data frame (or series) `df` to the hash `digest`.
+    """
+    pd = sys.modules["pandas"]
+    digest.update("{}|{}".format(type(df).__name__, df.shape).encode())
+    if isinstance(df, pd.DataFrame):
+        digest.update(repr(list(zip(df.columns, df.dtypes))).encode())
+    else:
+        digest.update(repr((df.name, df.dtype)).encode())
+    if len(df) > 0:
+        if samples is None:
+            rows = df
+        else:
+            rows = df.iloc[_positions(len(df), samples)]
+        hashes = pd.util.hash_pandas_object(rows, index=True)
+        digest.update(hashes.values.tobytes())
+    return True
+
+def _original(cls):
+    """Returns the original class of a class that acorn may have extended
+    (the arrays created by a decorated `numpy` are instances of the original
+    class, not of the extension).
+    """
+    return getattr(cls, "__acornext__", None) or cls
+
+def fingerprint(obj, samples=4096):
+    """Returns the content fingerprint of a `numpy` array or a `pandas` data
+    frame or series.
+
+    Args:
+        obj: object to fingerprint.
+        samples (int): number of elements (or rows) that are hashed; None
+          hashes all of them.
+
+    Returns:
+        str: hex digest of the fingerprint; None if the object isn't an array
+        or data frame, or if its contents can't be hashed.
+    """
+    from hashlib import sha1
+    from acorn.logging.decoration import is_decorating, set_decorating
+    digest = sha1()
+    #Only objects from packages that were already imported can be
+    #fingerprinted, so there is no need to import them here.
+    np = sys.modules.get("numpy")
+    pd = sys.modules.get("pandas")
+    #The sampling calls decorated functions of those packages, which must not
+    #be logged (or track their results in turn).
+    origdecor = is_decorating()
+    set_decorating(True)
+    try:
+        if np is not None and isinstance(obj, _original(np.ndarray)):
+            ok = _array_fingerprint(obj, samples, digest)
+        elif (pd is not None and
+              isinstance(obj, (_original(pd.DataFrame),
+                               _original(pd.Series)))):
+            ok = _frame_fingerprint(obj, samples, digest)
+        else:
+            ok = False
+    except (TypeError, ValueError):
+        #Some of the pandas extension types can't be hashed.
+        ok = False
+    finally:
+        set_decorating(origdecor)
+
+    return digest.hexdigest() if ok else None
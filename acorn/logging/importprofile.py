@@ -0,0 +1,309 @@
+"""Instrumentation for the time that :func:`~acorn.logging.decoration.decorate`
+spends decorating a package. While a package is profiled, the main decoration
+functions are replaced by timing wrappers so that the time can be broken down
+by phase and by (sub)module, together with the decorated/skipped/NA counts of
+:data:`~acorn.logging.decoration._decor_count`. The report points at the
+`[tracking]` `ignore=` entries that would save the most time.
+
+Examples:
+    Profile the decoration of `numpy` from the command line or from python.
+
+    .. code-block:: bash
+
+        acrn.py profile-import numpy -top 15
+
+    >>> from acorn.logging.importprofile import profile_import
+    >>> prof = profile_import("numpy")
+    >>> prof.report(15)
+"""
+from acorn import msg
+
+_phases = ("decorate_obj", "_split_object", "_replay_plan", "_get_members",
+           "_fqdn", "_extend_object", "_create_extension", "_update_attrs",
+           "postfix")
+"""tuple: names of the functions in :mod:`acorn.logging.decoration` that are
+timed as separate phases.
+"""
+
+def _modname(obj):
+    """Returns the name of the module that `obj` is or belongs to; None if it
+    can't be determined.
+    """
+    import inspect
+    if inspect.ismodule(obj):
+        return obj.__name__
+    try:
+        result = getattr(obj, "__module__", None)
+    except: # pragma: no cover
+        return None
+    return result if isinstance(result, str) else None
+
+class _CountList(list):
+    """List of `[decorated, skipped, NA]` counts that also attributes each
+    increment to the module that is currently being decorated.
+    """
+    def __init__(self, profile, values):
+        super(_CountList, self).__init__(values)
+        self.profile = profile
+
+    def __setitem__(self, i, value):
+        self.profile._count(i, value - self[i])
+        super(_CountList, self).__setitem__(i, value)
+
+class _CountDict(dict):
+    """Stand-in for :data:`~acorn.logging.decoration._decor_count` that wraps
+    the count lists in :class:`_CountList`.
+    """
+    def __init__(self, profile, counts):
+        super(_CountDict, self).__init__()
+        self.profile = profile
+        for package, values in counts.items():
+            self[package] = values
+
+    def __setitem__(self, package, values):
+        super(_CountDict, self).__setitem__(package,
+                                            _CountList(self.profile, values))
+
+class ImportProfile(object):
+    """Timings and object counts for the decoration of a single package.
+
+    Args:
+        package (str): name of the package being profiled.
+
+    Attributes:
+        package (str): name of the package being profiled.
+        import_time (float): seconds spent importing the undecorated package.
+        total (float): seconds spent decorating the package.
+        phases (dict): keys are the names in :data:`_phases`; values are
+          `[seconds, calls]` where the time excludes nested phases.
+        modules (dict): keys are module names; values are dicts with the
+          `time` spent on the module's own members (excluding nested phases
+          for other modules) and its `counts` of decorated, skipped and NA
+          objects.
+        subtrees (dict): keys are names of decorated (sub)modules; values are
+          the seconds spent decorating each module, including its submodules.
+        objects (dict): keys are FQDNs of the decorated classes and functions;
+          values are the seconds spent decorating each one (including the
+          methods of classes).
+    """
+    def __init__(self, package):
+        self.package = package
+        self.import_time = 0.
+        self.total = 0.
+        self.phases = {p: [0., 0] for p in _phases}
+        self.modules = {}
+        self.subtrees = {}
+        self.objects = {}
+        self._frames = []
+        self._originals = {}
+
+    def _module(self, name):
+        """Returns the statistics dict for the specified module name.
+        """
+        if name not in self.modules:
+            self.modules[name] = {"time": 0., "counts": [0, 0, 0]}
+        return self.modules[name]
+
+    def _current(self):
+        """Returns the name of the module that is currently being decorated.
+        """
+        return self._frames[-1][1] if self._frames else self.package
+
+    def _count(self, i, delta):
+        """Adds `delta` to count `i` of the current module.
+        """
+        self._module(self._current())["counts"][i] += delta
+
+    def _timed(self, phase, func):
+        """Returns a wrapper for `func` that adds its time to `phase` and to the
+        module that it is working on.
+        """
+        from acorn.logging.decoration import _clock, _tick
+        def timed(*args, **kwargs):
+            module = None
+            if phase in ("decorate_obj", "_split_object") and len(args) > 0:
+                if phase == "decorate_obj" and args[3] == "modules":
+                    module = _modname(args[2])
+                else:
+                    module = _modname(args[0])
+            elif phase == "postfix":
+                module = _modname(args[0])
+            if module is None:
+                module = self._current()
+
+            frame = [0., module]
+            self._frames.append(frame)
+            start = _clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = (_clock() - start)*_tick
+                self._frames.pop()
+                if self._frames:
+                    self._frames[-1][0] += elapsed
+                stats = self.phases[phase]
+                stats[0] += elapsed - frame[0]
+                stats[1] += 1
+                self._module(module)["time"] += elapsed - frame[0]
+                if phase == "decorate_obj":
+                    self._object(args, elapsed)
+        return timed
+
+    def _object(self, args, elapsed):
+        """Records the time spent decorating a single module, class or function
+        from the arguments of :func:`~acorn.logging.decoration.decorate_obj`.
+        """
+        parent, n, o, otype = args[0:4]
+        if otype == "modules":
+            name = _modname(o)
+            if name is not None:
+                self.subtrees[name] = self.subtrees.get(name, 0.) + elapsed
+        else:
+            fqdn = self._originals["_fqdn"](o, False)
+            if fqdn is not None:
+                self.objects[fqdn] = self.objects.get(fqdn, 0.) + elapsed
+
+    def install(self):
+        """Replaces the decoration functions with their timed versions.
+        """
+        from acorn.logging import decoration
+        for phase in _phases:
+            self._originals[phase] = getattr(decoration, phase)
+            setattr(decoration, phase, self._timed(phase, self._originals[phase]))
+        self._originals["_decor_count"] = decoration._decor_count
+        decoration._decor_count = _CountDict(self, decoration._decor_count)
+
+    def uninstall(self):
+        """Puts the original decoration functions back.
+        """
+        from acorn.logging import decoration
+        counts = decoration._decor_count
+        for name, original in self._originals.items():
+            setattr(decoration, name, original)
+        decoration._decor_count.update((k, list(v)) for k, v in counts.items())
+
+    def suggestions(self, top=10):
+        """Returns the `[tracking]` ignore entries that would save the most
+        time, based on the submodules and objects that took the longest to
+        decorate.
+
+        Args:
+            top (int): maximum number of suggestions to return.
+
+        Returns:
+            list: of `(fqdn, seconds)` tuples, sorted by decreasing time.
+        """
+        candidates = [(name, elapsed) for name, elapsed in self.subtrees.items()
+                      if name != self.package]
+        candidates.extend(self.objects.items())
+        candidates.sort(key=lambda c: c[1], reverse=True)
+
+        result = []
+        for name, elapsed in candidates:
+            #There is no point in suggesting to ignore an object whose module
+            #is already being suggested.
+            if any(name.startswith(s + '.') for s, e in result):
+                continue
+            result.append((name, elapsed))
+            if len(result) == top:
+                break
+        return result
+
+    def report(self, top=10):
+        """Prints the profile to the console.
+
+        Args:
+            top (int): number of modules, objects and suggestions to list.
+        """
+        msg.okay("Profile of the decoration of {}:".format(self.package))
+        msg.std("Import: {0:.3f}s; decoration: {1:.3f}s.".format(
+            self.import_time, self.total))
+
+        msg.blank(1, 1)
+        msg.info("Phase                  Time (s)    Calls")
+        for phase, (elapsed, calls) in sorted(self.phases.items(),
+                                              key=lambda p: p[1][0],
+                                              reverse=True):
+            if calls > 0:
+                msg.std("{0:<20} {1:>10.3f} {2:>8d}".format(phase, elapsed,
+                                                            calls))
+
+        msg.blank(1, 1)
+        msg.info("Module (own time)                        Time (s)  "
+                 "Decor/Skip/NA")
+        modules = sorted(self.modules.items(), key=lambda m: m[1]["time"],
+                         reverse=True)
+        for name, stats in modules[0:top]:
+            msg.std("{0:<40} {1:>8.3f}  {2}".format(name, stats["time"],
+                                                    stats["counts"]))
+
+        msg.blank(1, 1)
+        msg.info("Slowest objects                          Time (s)")
+        objects = sorted(self.objects.items(), key=lambda o: o[1],
+                         reverse=True)
+        for fqdn, elapsed in objects[0:top]:
+            msg.std("{0:<40} {1:>8.3f}".format(fqdn, elapsed))
+
+        suggested = self.suggestions(top)
+        if len(suggested) > 0:
+            msg.blank(1, 1)
+            msg.info("Adding these to `ignore=` in the [tracking] section of "
+                     "{}.cfg would save the most time:".format(self.package))
+            for fqdn, elapsed in suggested:
+                msg.std("{0:<40} {1:>8.3f}s".format(fqdn, elapsed))
+            msg.gen("ignore={}".format('$'.join(s for s, e in suggested)))
+
+def profile_import(packname):
+    """Imports and decorates the specified package while timing the
+    decoration. The package is decorated eagerly (see
+    :func:`~acorn.logging.decoration.is_lazy`) and without the cached
+    decoration plans so that the full cost of discovering its members is
+    measured.
+
+    Args:
+        packname (str): name of the package to import.
+
+    Returns:
+        ImportProfile: timings of the decoration; None if the package had
+        already been decorated in this process.
+    """
+    from importlib import import_module
+    from acorn.logging import decoration
+    from acorn.logging.decoration import _clock, _tick
+    if packname in decoration._decorated_packs:
+        msg.warn("{} has already been decorated; start a new process to "
+                 "profile it.".format(packname))
+        return None
+
+    profile = ImportProfile(packname)
+    origdecor = decoration.is_decorating()
+    decoration.set_decorating(True)
+    start = _clock()
+    try:
+        package = import_module(packname)
+    finally:
+        decoration.set_decorating(origdecor)
+    profile.import_time = (_clock() - start)*_tick
+
+    lazy, planpath = decoration._lazy, decoration._plan_path
+    decoration._lazy = False
+    decoration._plan_path = lambda p: None
+    profile.install()
+    start = _clock()
+    try:
+        try:
+            #The packages that acorn supports may have special import logic
+            #(such as `acorn.scipy`); others are decorated directly.
+            import_module("acorn.{}".format(packname))
+        except ImportError:
+            decoration.set_decorating(True)
+            try:
+                decoration.decorate(package)
+            finally:
+                decoration.set_decorating(origdecor)
+    finally:
+        profile.total = (_clock() - start)*_tick
+        profile.uninstall()
+        decoration._lazy, decoration._plan_path = lazy, planpath
+
+    return profile
@@ -0,0 +1,229 @@
+"""Memoization of the decorated functions that are explicitly included by the
+`filter`/`rfilter` options of the `[memoize]` section of the package
+configuration (or `[acorn.memoize]` in `acorn.cfg`, e.g. for the notebook
+functions in `__main__`). Repeated calls with the same arguments return the
+cached result instead of calling the function again; the entry of the call is
+still logged, with `h = True` to show that it was a cache hit.
+
+The cache key combines the FQDN and the code of the function (so that a
+notebook cell that redefines the function doesn't get the results of the old
+definition), its default arguments and the values captured by its closure with
+the arguments of the call: `None`, booleans, numbers, strings and bytes are
+used by value, lists, tuples and dicts of those are used recursively, and
+`numpy` arrays and `pandas` data frames (or series) are used by the fingerprint
+of their full contents (see :func:`~acorn.logging.fingerprint.fingerprint`).
+Calls with any other kind of argument (including bound methods, whose first
+argument is the instance), default or captured value are never cached.
+
+Once the estimated size of the cached results exceeds `maxbytes` (256 MiB by
+default) in the `[acorn.memoize]` section, the least recently used results are
+evicted.
+
+.. warning:: only memoize functions whose result depends on nothing but their
+  arguments. Cached results are returned as the *same* object on every hit, so
+  the caller must not modify them in place.
+"""
+import sys
+import threading
+from collections import OrderedDict
+import six
+
+_def_maxbytes = 256*1024**2
+"""int: default size budget of the cache, in bytes.
+"""
+_maxbytes = None
+"""int: size budget of the cache, read from the configuration on first use.
+"""
+_cache = OrderedDict()
+"""collections.OrderedDict: keys are cache keys; values are `(result, size)`
+tuples, from the least to the most recently used.
+"""
+_lock = threading.Lock()
+"""threading.Lock: guards :data:`_cache` and :data:`_stats`.
+"""
+_stats = {"hits": 0, "misses": 0, "bytes": 0}
+"""dict: number of cache hits and misses and the estimated size (in bytes) of
+the cached results.
+"""
+_values = (type(None), bool, float, complex, bytes) + six.integer_types + \
+          six.string_types
+"""tuple: types of the arguments that are used by value in the cache keys.
+"""
+
+def max_bytes():
+    """Returns the size budget of the cache, configured by the `maxbytes`
+    option of the `[acorn.memoize]` section.
+    """
+    global _maxbytes
+    if _maxbytes is None:
+        from acorn.config import settings
+        config = settings("acorn")
+        if (config.has_section("acorn.memoize") and
+            config.has_option("acorn.memoize", "maxbytes")):
+            _maxbytes = config.getint("acorn.memoize", "maxbytes")
+        else:
+            _maxbytes = _def_maxbytes
+    return _maxbytes
+
+def _key_part(obj):
+    """Returns the part of a cache key for a single argument; None if the
+    argument can't be used in a key.
+    """
+    if isinstance(obj, _values):
+        return (type(obj).__name__, obj)
+    if isinstance(obj, (list, tuple)):
+        parts = tuple(_key_part(o) for o in obj)
+        if any(p is None for p in parts):
+            return None
+        return (type(obj).__name__, parts)
+    if isinstance(obj, dict):
+        return _items_part(obj)
+
+    from acorn.logging.fingerprint import fingerprint
+    fprint = fingerprint(obj, None)
+    if fprint is None:
+        return None
+    return (type(obj).__name__, fprint)
+
+def _items_part(argd):
+    """Returns the part of a cache key for the items of a dict; None if any of
+    the keys or values can't be used in a key.
+    """
+    parts = []
+    for k, v in argd.items():
+        kpart, vpart = _key_part(k), _key_part(v)
+        if kpart is None or vpart is None:
+            return None
+        parts.append((kpart, vpart))
+    #The keys can have mixed types, which aren't always comparable.
+    parts.sort(key=repr)
+    return ("dict", tuple(parts))
+
+def _code_part(func):
+    """Returns the part of a cache key that identifies the code of a python
+    function, together with its default arguments and the values captured by
+    its closure; an empty tuple for functions without python code and None if
+    any of the defaults or captured values can't be used in a key.
+    """
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return ()
+    #Nested code objects are left out of the constants, since their `repr`
+    #changes whenever the function is redefined.
+    consts = tuple(c for c in code.co_consts if isinstance(c, _values))
+
+    cells = []
+    for cell in getattr(func, "__closure__", None) or ():
+        try:
+            cells.append(cell.cell_contents)
+        except ValueError:
+            #The cell is empty, e.g. a variable that isn't assigned yet.
+            cells.append(None)
+    parts = (_key_part(getattr(func, "__defaults__", None)),
+             _key_part(getattr(func, "__kwdefaults__", None)),
+             _key_part(tuple(cells)))
+    if any(p is None for p in parts):
+        return None
+    return (code.co_code, code.co_names, consts) + parts
+
+def key(fqdn, func, argl, argd):
+    """Returns the cache key for a call.
+
+    Args:
+        fqdn (str): fully-qualified domain name of the function being called.
+        func (function): original (undecorated) function being called.
+        argl (tuple): positional arguments of the call.
+        argd (dict): keyword arguments of the call.
+
+    Returns:
+        tuple: hashable key; None if the call can't be memoized.
+    """
+    cpart = _code_part(func)
+    lpart = _key_part(tuple(argl))
+    dpart = _items_part(argd)
+    if cpart is None or lpart is None or dpart is None:
+        return None
+    return (fqdn, cpart, lpart, dpart)
+
+def _size(result):
+    """Estimates the memory used by the result of a call, in bytes.
+    """
+    if isinstance(result, (list, tuple)):
+        return sys.getsizeof(result) + sum(_size(r) for r in result)
+    nbytes = getattr(result, "nbytes", None)
+    if isinstance(nbytes, six.integer_types):
+        return nbytes
+    try:
+        return sys.getsizeof(result)
+    except TypeError: # pragma: no cover
+        return 0
+
+def lookup(ckey):
+    """Looks up the result of a call in the cache.
+
+    Args:
+        ckey (tuple): key returned by :func:`key`.
+
+    Returns:
+        tuple: `(hit, result)`, where `hit` is True if the result was cached.
+    """
+    with _lock:
+        try:
+            value = _cache.pop(ckey)
+        except KeyError:
+            _stats["misses"] += 1
+            return (False, None)
+        #Re-inserting the result makes it the most recently used.
+        _cache[ckey] = value
+        _stats["hits"] += 1
+        return (True, value[0])
+
+def store(ckey, result):
+    """Caches the result of a call, evicting the least recently used results
+    if the cache grows beyond :func:`max_bytes`. Results that are larger than
+    the whole budget are not cached.
+
+    Args:
+        ckey (tuple): key returned by :func:`key`.
+        result: returned by the call.
+    """
+    from acorn.logging.decoration import is_decorating, set_decorating
+    #Sizing a data frame calls decorated functions, which must not be logged.
+    origdecor = is_decorating()
+    set_decorating(True)
+    try:
+        size = _size(result)
+    finally:
+        set_decorating(origdecor)
+
+    maxbytes = max_bytes()
+    if size > maxbytes:
+        return
+    with _lock:
+        if ckey in _cache:
+            _stats["bytes"] -= _cache.pop(ckey)[1]
+        _cache[ckey] = (result, size)
+        _stats["bytes"] += size
+        while _stats["bytes"] > maxbytes:
+            oldkey, (oldresult, oldsize) = _cache.popitem(last=False)
+            _stats["bytes"] -= oldsize
+
+def clear():
+    """Empties the cache and resets its statistics.
+    """
+    with _lock:
+        _cache.clear()
+        _stats.update(hits=0, misses=0, bytes=0)
+
+def stats():
+    """Returns the statistics of the cache.
+
+    Returns:
+        dict: with the number of `entries`, `hits` and `misses`, the estimated
+        `bytes` of the cached results and the `maxbytes` budget.
+    """
+    with _lock:
+        result = dict(_stats)
+        result["entries"] = len(_cache)
+    result["maxbytes"] = max_bytes()
+    return result
@@ -0,0 +1,1512 @@
+"""Storage engines that serialize a :class:`~acorn.logging.database.TaskDB` to
+disk. The engine is selected using the `backend` option in the `[database]`
+section of `acorn.cfg`:
+
+.. code-block:: ini
+
+    [database]
+    backend = journal
+
+- **json**: (default) the whole database is rewritten as a single JSON file
+  every time it is saved.
+- **journal**: only the entries and uuid descriptions recorded since the last
+  save are appended to a JSON Lines journal next to the JSON file. The journal
+  is compacted into the regular JSON layout when the kernel shuts down (or when
+  :meth:`~acorn.logging.database.TaskDB.compact` is called).
+- **sqlite**: entries, uuid descriptions and images are inserted into a local
+  SQLite file with indexed tables. Existing JSON databases can be converted
+  with :func:`convert` (or `acrn.py convert sqlite`).
+- **blocks**: the entries and uuid descriptions recorded since the last save are
+  appended as an independently compressed block (`zlib` or `lzma`, see the
+  `compression` option) to `project.task.jsonz`.
+"""
+from acorn import msg
+
+from contextlib import contextmanager
+from struct import Struct
+
+def _plain(obj):
+    """Returns the JSON-serializable version of the compact
+    :class:`~acorn.logging.database.Entry` records; used as the `default`
+    function when entries are serialized.
+    """
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError("{} is not JSON serializable".format(repr(obj)))
+
+@contextmanager
+def atomic_write(dbpath, mode='w'):
+    """Context manager that returns a file to write the contents of `dbpath`
+    to. The file only replaces `dbpath` once the block finishes without errors,
+    so that a crash part-way through the write can never leave a corrupted file
+    behind.
+
+    Args:
+        dbpath (str): full path to the file to (over)write.
+        mode (str): mode to open the temporary file with.
+    """
+    from os import path, remove, fsync, fdopen
+    from tempfile import mkstemp
+    try:
+        from os import replace
+    except ImportError: # pragma: no cover
+        #Python 2 doesn't have `replace`, but `rename` is atomic on POSIX.
+        from os import rename as replace
+    #The temporary file has to be in the same folder so that the final rename
+    #doesn't cross a file system boundary (and is atomic).
+    handle, tmppath = mkstemp(prefix=".{}.".format(path.basename(dbpath)),
+                              dir=path.dirname(dbpath))
+    try:
+        with fdopen(handle, mode) as f:
+            yield f
+            f.flush()
+            fsync(f.fileno())
+        replace(tmppath, dbpath)
+    except: # pragma: no cover
+        if path.isfile(tmppath):
+            remove(tmppath)
+        raise
+
+@contextmanager
+def file_lock(dbpath):
+    """Context manager that holds an exclusive advisory lock for the database
+    at `dbpath` (on `dbpath.lock`). Processes that write to the same database
+    hold the lock for their read-merge-write steps so that they never overwrite
+    each other's entries. On platforms without :mod:`fcntl`, no lock is taken.
+
+    Args:
+        dbpath (str): full path to the database file to lock.
+    """
+    try:
+        import fcntl
+    except ImportError: # pragma: no cover
+        yield
+        return
+
+    with open(dbpath + ".lock", 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _writer_id():
+    """Returns an identifier for the current process that is unique across the
+    hosts that share a database folder.
+    """
+    import os
+    import socket
+    host = socket.gethostname().replace('.', '_')
+    return "{}-{}".format(host, os.getpid())
+
+def _writer_alive(token):
+    """Returns True if the process with the specified journal token may still
+    be writing to its journal. Processes on other hosts can't be checked, so
+    they are assumed to be alive.
+    """
+    if token == "":
+        #Journals from older versions of acorn are never appended to.
+        return False
+    import os
+    import socket
+    host, pid = token.rsplit('-', 1)
+    if host != socket.gethostname().replace('.', '_'):
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except OSError as err:
+        import errno
+        return err.errno == errno.EPERM
+    return True
+
+def _sort_entries(entities, ekeys):
+    """Sorts the lists of entries for the specified entity keys by start time,
+    so that entries merged from several processes are in a deterministic order.
+    The sort is stable, so entries from the same process stay in the order they
+    were recorded.
+    """
+    for ekey in ekeys:
+        entities[ekey].sort(key=lambda e: e.get("s") or 0.)
+
+class _Snapshot(object):
+    """Minimal stand-in for a :class:`~acorn.logging.database.TaskDB` so that
+    merged dictionaries can be serialized with :func:`dump_taskdb`.
+    """
+    def __init__(self, entities, uuids):
+        self.entities = entities
+        self.uuids = uuids
+
+    def keys(self):
+        return list(self.entities.keys())
+
+    def history(self, ekey):
+        return self.entities[ekey]
+
+def dump_taskdb(f, taskdb, **extra):
+    """Streams the task database to `f` in the standard JSON layout. The
+    entries are written one entity at a time using
+    :meth:`~acorn.logging.database.TaskDB.history`, so entries that were
+    spilled to disk never have to be in memory all at once.
+
+    Args:
+        f (file): open file to write the JSON to.
+        taskdb (TaskDB): database to serialize.
+        extra (dict): additional top-level keys for the JSON dictionary.
+
+    Returns:
+        dict: offset index of the file that was written; see
+        :func:`write_index`.
+    """
+    import json
+    compkeys = {}
+    index = {"entities": [], "extra": extra}
+    #All the JSON is ASCII-encoded, so counting the characters written gives
+    #the byte offsets that the index needs.
+    offset = [0]
+    def write(text):
+        f.write(text)
+        offset[0] += len(text)
+
+    write('{"entities": {')
+    for i, ekey in enumerate(taskdb.keys()):
+        if isinstance(ekey, tuple):
+            #See :func:`acorn.logging.database._json_clean`.
+            skey = "c.{}".format(id(ekey))
+            compkeys[skey] = ekey
+        else:
+            skey = ekey
+        write("{}{}: ".format(", " if i > 0 else "", json.dumps(skey)))
+        start = offset[0]
+        write("[")
+        for j, entry in enumerate(taskdb.history(ekey)):
+            if j > 0:
+                write(", ")
+            write(json.dumps(entry, default=_plain))
+        write("]")
+        index["entities"].append((ekey, int(isinstance(ekey, tuple)), start,
+                                  offset[0] - start))
+        
+    write('}, "compkeys": ')
+    write(json.dumps(compkeys))
+    write(', "uuids": ')
+    uuids = json.dumps(taskdb.uuids)
+    index["uuids"] = (offset[0], len(uuids))
+    write(uuids)
+    for key, value in extra.items():
+        write(', {}: {}'.format(json.dumps(key), json.dumps(value)))
+    write('}')
+    return index
+
+def write_index(dbpath, index):
+    """Writes the offset index for the JSON database at `dbpath` to
+    `project.task.json.idx`. The index maps each entity key to the byte range
+    of its list of entries and keeps the byte range of the uuid table separately,
+    so that a task can be opened without deserializing the whole database (see
+    :class:`IndexedFile`).
+
+    Args:
+        dbpath (str): full path to the JSON file that was just written.
+        index (dict): returned by :func:`dump_taskdb` when the file was written.
+    """
+    import json
+    from os import path
+    #The size and modification time identify the version of the JSON file that
+    #the index is valid for.
+    index["size"] = path.getsize(dbpath)
+    index["mtime"] = path.getmtime(dbpath)
+    with atomic_write(dbpath + ".idx") as f:
+        json.dump(index, f)
+
+def open_index(dbpath):
+    """Returns an :class:`IndexedFile` for the JSON database at `dbpath`, or
+    `None` if it doesn't have an index or the index is out of date.
+    """
+    from os import path
+    ipath = dbpath + ".idx"
+    if not path.isfile(dbpath) or not path.isfile(ipath):
+        return None
+
+    import json
+    try:
+        with open(ipath) as f:
+            index = json.load(f)
+    except ValueError: # pragma: no cover
+        return None
+    if (index.get("size") != path.getsize(dbpath) or
+        index.get("mtime") != path.getmtime(dbpath)):
+        msg.std("Ignoring out of date index {}.".format(ipath), 2)
+        return None
+    return IndexedFile(dbpath, index)
+
+def _load_json(dbpath):
+    """Returns the deserialized JSON database at `dbpath` or `None` if it
+    doesn't exist yet.
+    """
+    from os import path
+    if path.isfile(dbpath):
+        import json
+        with open(dbpath) as f:
+            return json.load(f)
+
+def _as_tuple(ckey):
+    """Recursively converts the lists in a deserialized composite key back to
+    the tuples they were created from.
+    """
+    if isinstance(ckey, list):
+        return tuple(_as_tuple(k) for k in ckey)
+    return ckey
+
+def _tuple_keys(entities, compkeys):
+    """Switches the string keys created by
+    :func:`~acorn.logging.database._json_clean` back to the composite tuple keys
+    they were created from.
+    """
+    for skey, ckey in compkeys.items():
+        if skey in entities:
+            entities[_as_tuple(ckey)] = entities.pop(skey)
+
+def _journal_lines(records, descriptions):
+    """Generator over the JSON lines used to append the specified records and
+    uuid descriptions to a journal or block file.
+
+    Args:
+        records (iterable): of `(ekey, entry)` tuples.
+        descriptions (iterable): of `(uuid, description)` tuples.
+    """
+    for ekey, entry in records:
+        if isinstance(ekey, tuple):
+            yield {"k": ekey, "t": 1, "e": entry}
+        else:
+            yield {"k": ekey, "e": entry}
+    for uuid, description in descriptions:
+        yield {"u": uuid, "d": description}
+
+def _apply_line(entities, uuids, line):
+    """Adds the entry or uuid description in the specified journal line to the
+    database dictionaries.
+    """
+    if "u" in line:
+        uuids[line["u"]] = line["d"]
+    else:
+        ekey = _as_tuple(line["k"]) if line.get("t") else line["k"]
+        if ekey not in entities:
+            entities[ekey] = []
+        entities[ekey].append(line["e"])
+
+class JSONStore(object):
+    """Stores the database as a single JSON file that is rewritten in full on
+    every save.
+
+    Args:
+        dbpath (str): full path to the JSON file for the task database.
+        readonly (bool): when True, the store is only used to read the database
+          and will never modify the files on disk.
+
+    If another process writes to the same JSON file, this store switches to
+    a read-merge-write of the file (under :func:`file_lock`) for all subsequent
+    flushes, so that neither process overwrites the other's entries.
+
+    Attributes:
+        dbpath (str): full path to the JSON file for the task database.
+        readonly (bool): when True, the files on disk are never modified.
+        stamp (tuple): `(size, mtime)` of the JSON file when it was last read or
+          written by this store.
+        shared (bool): True once another process has written to the file.
+    """
+    appends = False
+    """bool: when True, the store only needs the records added since the last
+    flush; otherwise the whole database is written every time.
+    """
+    def __init__(self, dbpath, readonly=False):
+        self.dbpath = dbpath
+        self.readonly = readonly
+        self.stamp = None
+        self.shared = False
+
+    def _stamp(self):
+        """Returns the `(size, mtime)` of the JSON file, or `None` if it doesn't
+        exist.
+        """
+        from os import path
+        if path.isfile(self.dbpath):
+            return (path.getsize(self.dbpath), path.getmtime(self.dbpath))
+
+    def load(self):
+        """Deserializes the database from disk.
+
+        Returns:
+            tuple: `(entities, uuids)` dictionaries; these are empty if the
+            database doesn't exist yet.
+        """
+        jdb = _load_json(self.dbpath)
+        if jdb is None:
+            return ({}, {})
+        _tuple_keys(jdb["entities"], jdb.get("compkeys", {}))
+        return (jdb["entities"], jdb["uuids"])
+
+    def open(self):
+        """Opens the database for a :class:`~acorn.logging.database.TaskDB`.
+        If the JSON file has an up-to-date index, only the index and the uuid
+        table are read; the entries stay on disk until they are needed.
+        Otherwise, the whole database is deserialized using :meth:`load`.
+
+        Returns:
+            tuple: `(base, entities, uuids)` where `base` is the
+            :class:`IndexedFile` for the entries on disk (or `None`) and
+            `entities` has the entries that are not in `base`.
+        """
+        if self.readonly:
+            return self._open()
+        #Other processes rewrite the JSON file and its index (and remove their
+        #journals) under the lock, so the versions that are read must match.
+        with file_lock(self.dbpath):
+            return self._open()
+
+    def _open(self):
+        """Implements :meth:`open` once the database can be read.
+        """
+        self.stamp = self._stamp()
+        base = open_index(self.dbpath)
+        if base is None:
+            return (None,) + self.load()
+        return (base, {}, base.uuids())
+
+    def flush(self, taskdb, records, uuids):
+        """Writes the database to disk.
+
+        Args:
+            taskdb (TaskDB): database to serialize.
+            records (iterable): of `(ekey, entry)` recorded since the last flush.
+            uuids (list): of `uuid` values described since the last flush.
+        """
+        with file_lock(self.dbpath):
+            if not self.shared and self._stamp() != self.stamp:
+                msg.std("{} was changed by another process; merging "
+                        "entries from now on.".format(self.dbpath), 2)
+                self.shared = True
+
+            if self.shared:
+                #The database in memory doesn't have the other processes'
+                #entries, so we add ours to the version on disk instead.
+                entities, duuids = self.load()
+                touched = set()
+                for ekey, entry in records:
+                    if ekey not in entities:
+                        entities[ekey] = []
+                    entities[ekey].append(entry)
+                    touched.add(ekey)
+                for uuid in uuids:
+                    duuids[uuid] = taskdb.uuids[uuid]
+                _sort_entries(entities, touched)
+                self._rewrite(_Snapshot(entities, duuids))
+            else:
+                self._rewrite(taskdb)
+            self.stamp = self._stamp()
+
+    def _rewrite(self, taskdb, **extra):
+        """Atomically rewrites the whole JSON file and its offset index.
+        """
+        with atomic_write(self.dbpath) as f:
+            index = dump_taskdb(f, taskdb, **extra)
+        write_index(self.dbpath, index)
+
+    def compact(self, taskdb):
+        """Makes sure the file on disk has the standard JSON layout. For this
+        store, that is already the case after every flush.
+        """
+        pass
+
+    def save_image(self, uuid, byteio, imgfmt):
+        """Saves the specified image to the project/task specific folder next
+        to the database file.
+
+        Args:
+            uuid (str): identifier of the image in the database entries.
+            byteio (bytes): image bytes to save to disk.
+            imgfmt (str): used as the extension of the saved file.
+        """
+        from os import path, mkdir
+        idir = path.splitext(self.dbpath)[0]
+        if not path.isdir(idir):
+            mkdir(idir)
+            
+        ipath = path.join(idir, "{}.{}".format(uuid, imgfmt))
+        with open(ipath, 'wb') as f:
+            f.write(byteio)
+
+class JournalStore(JSONStore):
+    """Stores the database as a JSON file with the standard layout plus JSON
+    Lines journals of everything recorded since the JSON file was last
+    compacted. Each process appends to its own journal
+    (`project.task.<host>-<pid>.jsonl`), so that any number of processes can
+    log to the same task without contending for a file.
+
+    Each flush appends one *batch* of lines, terminated by a commit line with
+    the sequence number of the batch. A batch whose commit line is missing
+    (because the process died while writing it) is ignored when the journal is
+    replayed. Compaction merges the process's journal into the JSON file on
+    disk under :func:`file_lock`, sorting the merged entries by start time. The
+    sequence number of the last batch that was compacted from each journal is
+    kept in the JSON file so that a crash between compaction and journal removal
+    does not duplicate entries.
+
+    Attributes:
+        token (str): identifier of the process that owns :attr:`jpath`.
+        jpath (str): full path to the journal file of this process.
+        committed (int): byte offset of the end of the last committed batch
+          found when a journal was replayed.
+        seq (int): sequence number of the last batch written to the journal.
+    """
+    appends = True
+
+    def __init__(self, dbpath, readonly=False):
+        super(JournalStore, self).__init__(dbpath, readonly)
+        from os import path
+        self.token = _writer_id()
+        self.jpath = "{}.{}.jsonl".format(path.splitext(dbpath)[0], self.token)
+        self.seq = 0
+        self.committed = 0
+
+    def journals(self):
+        """Returns the journals of all the processes that have written to this
+        database.
+
+        Returns:
+            dict: keys are process tokens; values are full paths to the
+            journals. Journals from older versions (`project.task.jsonl`) have
+            an empty token.
+        """
+        from os import path
+        from glob import glob
+        prefix = path.splitext(self.dbpath)[0] + "."
+        result = {}
+        if path.isfile(self.dbpath + "l"):
+            result[""] = self.dbpath + "l"
+        for jpath in glob(prefix + "*.jsonl"):
+            result[jpath[len(prefix):-len(".jsonl")]] = jpath
+        return result
+
+    @staticmethod
+    def _compacted(jseq):
+        """Returns the sequence numbers of the compacted batches for each
+        journal token from the `jseq` value in the JSON file.
+        """
+        if isinstance(jseq, dict):
+            return jseq
+        #Older versions only had a single journal.
+        return {"": jseq}
+
+    def load(self):
+        jdb = _load_json(self.dbpath)
+        if jdb is None:
+            entities, uuids, compacted = {}, {}, {}
+        else:
+            entities, uuids = jdb["entities"], jdb["uuids"]
+            _tuple_keys(entities, jdb.get("compkeys", {}))
+            compacted = self._compacted(jdb.get("jseq", {}))
+        self._replay(entities, uuids, compacted)
+        return (entities, uuids)
+
+    def _open(self):
+        self.stamp = self._stamp()
+        base = open_index(self.dbpath)
+        if base is None:
+            return (None,) + self.load()
+        entities, uuids = {}, base.uuids()
+        self._replay(entities, uuids,
+                     self._compacted(base.extra.get("jseq", {})))
+        return (base, entities, uuids)
+
+    def _replay(self, entities, uuids, compacted):
+        """Adds the entries and uuid descriptions from the committed batches in
+        all the journals to the specified dictionaries.
+
+        Args:
+            compacted (dict): keys are journal tokens; values are the sequence
+              number of the last batch that is already included in the JSON
+              file.
+        """
+        self.seq = compacted.get(self.token, 0)
+        touched = set()
+        journals = self.journals()
+        for token in sorted(journals):
+            last = self._apply(token, journals[token], entities, uuids,
+                               compacted, touched)
+            if token == self.token:
+                self.seq = max(self.seq, last)
+                committed = self.committed
+
+        if len(journals) > 1:
+            _sort_entries(entities, touched)
+        if not self.readonly and self.token in journals:
+            self.committed = committed
+            self._truncate()
+
+    def _apply(self, token, jpath, entities, uuids, compacted, touched):
+        """Adds the entries and uuid descriptions from the committed batches of
+        the specified journal that haven't been compacted yet.
+
+        Args:
+            token (str): token of the process that wrote the journal.
+            jpath (str): full path to the journal.
+            compacted (dict): see :meth:`_replay`.
+            touched (set): the entity keys that entries are added to are added
+              to this set.
+
+        Returns:
+            int: sequence number of the last committed batch in the journal.
+        """
+        last = 0
+        for seq, lines in self._batches(jpath):
+            last = max(last, seq)
+            if seq <= compacted.get(token, 0):
+                continue
+            for line in lines:
+                _apply_line(entities, uuids, line)
+                if "k" in line:
+                    touched.add(_as_tuple(line["k"]) if line.get("t")
+                                else line["k"])
+        return last
+
+    def _batches(self, jpath):
+        """Generator over the *committed* batches in the specified journal.
+        Once the generator is exhausted, :attr:`committed` holds the byte offset
+        of the end of the last committed batch.
+
+        Returns:
+            tuple: `(seq, lines)` where `lines` is a list of deserialized
+            journal lines.
+        """
+        from os import path
+        self.committed = 0
+        if not path.isfile(jpath):
+            return
+
+        import json
+        lines = []
+        offset = 0
+        with open(jpath, 'rb') as f:
+            for raw in f:
+                offset += len(raw)
+                try:
+                    line = json.loads(raw.decode("utf-8"))
+                except ValueError:
+                    #This can only happen for the last line of a batch that
+                    #was being written when the process died (or is still
+                    #being written by another process).
+                    msg.warn("Ignoring truncated journal line in {}.".format(
+                        jpath), 2)
+                    break
+                if "commit" in line:
+                    self.committed = offset
+                    yield (line["commit"], lines)
+                    lines = []
+                else:
+                    lines.append(line)
+
+    def _truncate(self):
+        """Removes any uncommitted tail from the journal so that new batches
+        are not appended to a partial line.
+        """
+        from os import path
+        if (path.isfile(self.jpath) and
+            path.getsize(self.jpath) > self.committed):
+            msg.warn("Discarding uncommitted journal batch in {}.".format(
+                self.jpath), 2)
+            with open(self.jpath, 'ab') as f:
+                f.truncate(self.committed)
+
+    def flush(self, taskdb, records, uuids):
+        import json
+        from os import fsync
+        #The commit line at the end of the batch means that a batch that was
+        #only partially written is never replayed.
+        with open(self.jpath, 'a') as f:
+            descriptions = [(u, taskdb.uuids[u]) for u in uuids]
+            for line in _journal_lines(records, descriptions):
+                f.write(json.dumps(line, default=_plain) + '\n')
+
+            self.seq += 1
+            f.write(json.dumps({"commit": self.seq}) + '\n')
+            f.flush()
+            fsync(f.fileno())
+
+    def compact(self, taskdb):
+        """Merges the journal of this process (and any journal left by an older
+        version) into the JSON file on disk, and then removes the journal. The
+        journals of other processes are left for them to compact.
+        """
+        from os import path, remove
+        journals = self.journals()
+        mine = [t for t in ("", self.token) if t in journals]
+        if len(mine) == 0:
+            return
+
+        with file_lock(self.dbpath):
+            jdb = _load_json(self.dbpath)
+            if jdb is None:
+                entities, uuids, compacted = {}, {}, {}
+            else:
+                entities, uuids = jdb["entities"], jdb["uuids"]
+                _tuple_keys(entities, jdb.get("compkeys", {}))
+                compacted = self._compacted(jdb.get("jseq", {}))
+
+            touched = set()
+            for token in mine:
+                last = self._apply(token, journals[token], entities, uuids,
+                                   compacted, touched)
+                compacted[token] = max(compacted.get(token, 0), last)
+            _sort_entries(entities, touched)
+
+            #Journals that no longer exist don't need their sequence numbers;
+            #if the same token appears again, its batches are all new.
+            jseq = {t: n for t, n in compacted.items() if t in journals}
+            self._rewrite(_Snapshot(entities, uuids), jseq=jseq)
+            for token in mine:
+                remove(journals[token])
+
+class SQLiteStore(JSONStore):
+    """Stores the database in a local SQLite file (`project.task.sqlite`) with
+    tables for the entries, the uuid descriptions and the images. Entries are
+    indexed by entity key, method FQDN and start time so that a single day or
+    FQDN can be queried without loading the whole history (see :meth:`query`).
+    Each flush inserts the new records in a single transaction.
+
+    Attributes:
+        sqlpath (str): full path to the SQLite database file.
+    """
+    appends = True
+    extension = ".sqlite"
+    """str: extension of the file that the store writes the database to.
+    """
+    schema = [
+        """CREATE TABLE IF NOT EXISTS entries (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               ekey TEXT NOT NULL,
+               composite INTEGER NOT NULL DEFAULT 0,
+               method TEXT,
+               start REAL,
+               entry TEXT NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS entries_ekey ON entries (ekey)",
+        "CREATE INDEX IF NOT EXISTS entries_method ON entries (method)",
+        "CREATE INDEX IF NOT EXISTS entries_start ON entries (start)",
+        """CREATE TABLE IF NOT EXISTS uuids (
+               uuid TEXT PRIMARY KEY,
+               description TEXT NOT NULL)""",
+        """CREATE TABLE IF NOT EXISTS images (
+               uuid TEXT PRIMARY KEY,
+               format TEXT NOT NULL,
+               data BLOB NOT NULL)"""
+    ]
+    """list: of SQL statements that create the tables and indices.
+    """
+    def __init__(self, dbpath, readonly=False):
+        super(SQLiteStore, self).__init__(dbpath, readonly)
+        from os import path
+        self.sqlpath = path.splitext(dbpath)[0] + self.extension
+        self._conn = None
+
+    @property
+    def conn(self):
+        """Returns the (lazily opened) connection to the SQLite file.
+        """
+        if self._conn is None:
+            import sqlite3
+            self._conn = sqlite3.connect(self.sqlpath, check_same_thread=False)
+            if not self.readonly:
+                with self._conn:
+                    for statement in self.schema:
+                        self._conn.execute(statement)
+        return self._conn
+
+    def close(self):
+        """Closes the connection to the SQLite file.
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def _ekey(ekey, composite):
+        """Returns the entity key from its representation in the database.
+        """
+        if composite:
+            import json
+            return _as_tuple(json.loads(ekey))
+        return ekey
+
+    def load(self):
+        from os import path
+        if not path.isfile(self.sqlpath):
+            return ({}, {})
+        import json
+        entities = {}
+        for ekey, composite, entry in self.conn.execute(
+                "SELECT ekey, composite, entry FROM entries ORDER BY id"):
+            key = self._ekey(ekey, composite)
+            if key not in entities:
+                entities[key] = []
+            entities[key].append(json.loads(entry))
+
+        uuids = {u: json.loads(d) for u, d in
+                 self.conn.execute("SELECT uuid, description FROM uuids")}
+        return (entities, uuids)
+
+    def open(self):
+        return (None,) + self.load()
+
+    def query(self, ekey=None, method=None, start=None, end=None):
+        """Returns the entries in the database that match *all* the specified
+        constraints.
+
+        Args:
+            ekey (str): entity key that the entries were recorded under.
+            method (str): FQDN of the method that was called (attribute "m" of
+              the entries).
+            start (float): only entries that started at or after this timestamp
+              are returned.
+            end (float): only entries that started *before* this timestamp are
+              returned.
+
+        Returns:
+            list: of `(ekey, entry)` tuples, sorted in the order that they were
+            recorded.
+        """
+        import json
+        where, params = [], []
+        if ekey is not None:
+            if isinstance(ekey, tuple):
+                where.append("ekey = ? AND composite = 1")
+                params.append(json.dumps(ekey))
+            else:
+                where.append("ekey = ? AND composite = 0")
+                params.append(ekey)
+        if method is not None:
+            where.append("method = ?")
+            params.append(method)
+        if start is not None:
+            where.append("start >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("start < ?")
+            params.append(end)
+
+        sql = "SELECT ekey, composite, entry FROM entries"
+        if len(where) > 0:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id"
+        return [(self._ekey(k, c), json.loads(e))
+                for k, c, e in self.conn.execute(sql, params)]
+
+    def flush(self, taskdb, records, uuids):
+        self.insert(records, [(u, taskdb.uuids[u]) for u in uuids])
+
+    def insert(self, records, descriptions):
+        """Inserts the specified records and uuid descriptions in a single
+        transaction.
+
+        Args:
+            records (list): of `(ekey, entry)` tuples.
+            descriptions (list): of `(uuid, description)` tuples.
+        """
+        import json
+        def rows():
+            for ekey, entry in records:
+                if isinstance(ekey, tuple):
+                    yield (json.dumps(ekey), 1, entry.get("m"),
+                           entry.get("s"), json.dumps(entry, default=_plain))
+                else:
+                    yield (ekey, 0, entry.get("m"), entry.get("s"),
+                           json.dumps(entry, default=_plain))
+        urows = [(u, json.dumps(d)) for u, d in descriptions]
+
+        with self.conn:
+            self.conn.executemany("INSERT INTO entries (ekey, composite, "
+                                  "method, start, entry) VALUES (?, ?, ?, ?, ?)",
+                                  rows())
+            self.conn.executemany("INSERT OR REPLACE INTO uuids (uuid, "
+                                  "description) VALUES (?, ?)", urows)
+
+    def save_image(self, uuid, byteio, imgfmt):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO images (uuid, format, "
+                              "data) VALUES (?, ?, ?)",
+                              (uuid, imgfmt, byteio))
+
+    def image(self, uuid):
+        """Returns the `(format, bytes)` of the image with the specified
+        `uuid`, or `None` if it isn't in the database.
+        """
+        return self.conn.execute("SELECT format, data FROM images WHERE "
+                                 "uuid = ?", (uuid,)).fetchone()
+
+_block = Struct(">4sBIIdd")
+"""struct.Struct: header of each block in a compressed block file: magic bytes,
+codec, compressed size, number of lines, and the smallest and largest start
+times of the entries in the block.
+"""
+_codecs = ["zlib", "lzma"]
+"""list: names of the compression codecs; the position in the list is the codec
+number stored in the block headers.
+"""
+
+def _compress(codec, data):
+    """Compresses `data` using the codec with the specified number.
+    """
+    if _codecs[codec] == "lzma":
+        import lzma
+        return lzma.compress(data)
+    import zlib
+    return zlib.compress(data, 6)
+
+def _decompress(codec, data):
+    """Decompresses `data` using the codec with the specified number.
+    """
+    if _codecs[codec] == "lzma":
+        import lzma
+        return lzma.decompress(data)
+    import zlib
+    return zlib.decompress(data)
+
+class BlockStore(JSONStore):
+    """Stores the database as a sequence of independently compressed blocks in
+    `project.task.jsonz`. Each block holds the JSON lines (in the same format as
+    the :class:`JournalStore`) of at most :attr:`blocksize` entries and uuid
+    descriptions, prefixed by a small header with the compressed size and the
+    range of start times in the block. The headers form the block index: a
+    time range can be read (see :meth:`query`) by skipping over the blocks
+    outside of it, and new records are appended without touching the existing
+    blocks. A block that was only partially written when the process died is
+    ignored.
+
+    Attributes:
+        zpath (str): full path to the compressed block file.
+        codec (int): index in :data:`_codecs` of the compression used for new
+          blocks; from the `compression` option in the `[database]` section.
+        committed (int): byte offset of the end of the last complete block found
+          when the file was scanned.
+    """
+    appends = True
+    extension = ".jsonz"
+    magic = b"ACB1"
+    blocksize = 1000
+    """int: maximum number of lines in each block.
+    """
+    def __init__(self, dbpath, readonly=False):
+        super(BlockStore, self).__init__(dbpath, readonly)
+        from os import path
+        from acorn.logging.database import TaskDB
+        self.zpath = path.splitext(dbpath)[0] + self.extension
+        self.committed = 0
+
+        compression = TaskDB.get_option("compression", "zlib")
+        if compression == "lzma":
+            try:
+                import lzma
+            except ImportError: # pragma: no cover
+                msg.warn("lzma is not available; using zlib compression.")
+                compression = "zlib"
+        elif compression != "zlib": # pragma: no cover
+            msg.warn("Unknown compression '{}'; using zlib.".format(compression))
+            compression = "zlib"
+        self.codec = _codecs.index(compression)
+
+    def blocks(self):
+        """Returns the block index of the file.
+
+        Returns:
+            list: of `(offset, codec, size, count, smin, smax)` tuples, where
+            `offset` is the byte offset of the compressed data in the file.
+        """
+        from os import path
+        self.committed = 0
+        if not path.isfile(self.zpath):
+            return []
+
+        result = []
+        total = path.getsize(self.zpath)
+        with open(self.zpath, 'rb') as f:
+            while True:
+                raw = f.read(_block.size)
+                if len(raw) < _block.size:
+                    break
+                magic, codec, size, count, smin, smax = _block.unpack(raw)
+                offset = f.tell()
+                if magic != self.magic or offset + size > total:
+                    break
+                result.append((offset, codec, size, count, smin, smax))
+                f.seek(size, 1)
+                self.committed = offset + size
+
+        if self.committed < total:
+            msg.warn("Ignoring incomplete block in {}.".format(self.zpath), 2)
+        return result
+
+    def _lines(self, blocks):
+        """Generator over the deserialized JSON lines in the specified blocks.
+
+        Args:
+            blocks (list): of block index tuples returned by :meth:`blocks`.
+        """
+        import json
+        if len(blocks) == 0:
+            return
+        with open(self.zpath, 'rb') as f:
+            for offset, codec, size, count, smin, smax in blocks:
+                f.seek(offset)
+                data = _decompress(codec, f.read(size)).decode("utf-8")
+                for raw in data.splitlines():
+                    yield json.loads(raw)
+
+    def load(self):
+        if self.readonly:
+            return self._load()
+        #Another process may be appending a block while we scan the file; the
+        #truncation must not cut off a block that it has just committed.
+        with file_lock(self.zpath):
+            result = self._load()
+            self._truncate()
+        return result
+
+    def _load(self):
+        """Scans the blocks in the file and applies their JSON lines.
+        """
+        entities, uuids = {}, {}
+        for line in self._lines(self.blocks()):
+            _apply_line(entities, uuids, line)
+        return (entities, uuids)
+
+    def open(self):
+        return (None,) + self.load()
+
+    def _truncate(self):
+        """Removes any incomplete block from the end of the file so that new
+        blocks are not appended after it.
+        """
+        from os import path
+        if (path.isfile(self.zpath) and
+            path.getsize(self.zpath) > self.committed):
+            with open(self.zpath, 'ab') as f:
+                f.truncate(self.committed)
+
+    def query(self, ekey=None, method=None, start=None, end=None):
+        """Returns the entries in the database that match *all* the specified
+        constraints. Only the blocks whose range of start times overlaps with
+        `start` and `end` are decompressed.
+
+        Args:
+            ekey (str): entity key that the entries were recorded under.
+            method (str): FQDN of the method that was called (attribute "m" of
+              the entries).
+            start (float): only entries that started at or after this timestamp
+              are returned.
+            end (float): only entries that started *before* this timestamp are
+              returned.
+
+        Returns:
+            list: of `(ekey, entry)` tuples, sorted in the order that they were
+            recorded.
+        """
+        blocks = [b for b in self.blocks()
+                  if (start is None or b[5] >= start) and
+                  (end is None or b[4] < end)]
+        result = []
+        for line in self._lines(blocks):
+            if "u" in line:
+                continue
+            key = _as_tuple(line["k"]) if line.get("t") else line["k"]
+            entry = line["e"]
+            began = entry.get("s")
+            if ((ekey is None or key == ekey) and
+                (method is None or entry.get("m") == method) and
+                (start is None or (began is not None and began >= start)) and
+                (end is None or (began is not None and began < end))):
+                result.append((key, entry))
+        return result
+
+    def _pack(self, lines):
+        """Returns the header and compressed data for a block with the
+        specified JSON lines.
+        """
+        import json
+        starts = [l["e"]["s"] for l in lines
+                  if "e" in l and isinstance(l["e"].get("s"), (int, float))]
+        if len(starts) > 0:
+            smin, smax = min(starts), max(starts)
+        else:
+            smin, smax = float("inf"), float("-inf")
+        text = '\n'.join(json.dumps(l, default=_plain)
+                          for l in lines)
+        data = _compress(self.codec, text.encode("utf-8"))
+        return _block.pack(self.magic, self.codec, len(data), len(lines),
+                           smin, smax) + data
+
+    def _write(self, f, lines):
+        """Writes the specified lines to `f` in blocks of at most
+        :attr:`blocksize` lines.
+
+        Returns:
+            int: number of blocks written.
+        """
+        nblocks = 0
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) == self.blocksize:
+                f.write(self._pack(chunk))
+                nblocks += 1
+                chunk = []
+        if len(chunk) > 0:
+            f.write(self._pack(chunk))
+            nblocks += 1
+        return nblocks
+
+    def flush(self, taskdb, records, uuids):
+        self.insert(records, [(u, taskdb.uuids[u]) for u in uuids])
+
+    def insert(self, records, descriptions):
+        """Appends the specified records and uuid descriptions to the file.
+
+        Args:
+            records (list): of `(ekey, entry)` tuples.
+            descriptions (list): of `(uuid, description)` tuples.
+        """
+        from os import fsync
+        #Other processes may be appending to the same file.
+        with file_lock(self.zpath):
+            with open(self.zpath, 'ab') as f:
+                self._write(f, _journal_lines(records, descriptions))
+                f.flush()
+                fsync(f.fileno())
+
+    def compact(self, taskdb):
+        """Merges consecutive small blocks (each save appends at least one) into
+        full blocks, which compress much better.
+        """
+        with file_lock(self.zpath):
+            blocks = self.blocks()
+            if sum(1 for b in blocks if b[3] < self.blocksize) < 2:
+                return
+            with atomic_write(self.zpath, 'wb') as f:
+                self._write(f, self._lines(blocks))
+
+def convert(dbpath, backend="sqlite"):
+    """Converts an existing JSON database (including any un-compacted journal)
+    to the specified storage backend.
+
+    Args:
+        dbpath (str): full path to the JSON file for the task database.
+        backend (str): name of the target backend; one of `sqlite` or
+          `blocks`.
+
+    Returns:
+        int: number of entries that were converted.
+    """
+    if backend not in ("sqlite", "blocks"): # pragma: no cover
+        raise ValueError("Cannot convert databases to '{}'.".format(backend))
+
+    from os import path
+    source = JournalStore(dbpath, readonly=True)
+    entities, uuids = source.load()
+    records = [(ekey, entry) for ekey, elist in entities.items()
+               for entry in elist]
+    #The entities are grouped by key in the JSON file; we want the SQLite
+    #table to be in the order that they were recorded.
+    records.sort(key=lambda r: r[1].get("s") or 0.)
+
+    target = _stores[backend](dbpath)
+    tpath = path.splitext(dbpath)[0] + target.extension
+    if path.isfile(tpath):
+        raise ValueError("{} already exists.".format(tpath))
+    target.insert(records, list(uuids.items()))
+    if backend == "blocks":
+        #The images stay in the task folder next to the block file.
+        return len(records)
+
+    #Copy the images from the task folder into the images table as well.
+    from glob import glob
+    idir = path.splitext(dbpath)[0]
+    for ipath in glob(path.join(idir, "*.*")):
+        uuid, imgfmt = path.splitext(path.basename(ipath))
+        with open(ipath, 'rb') as f:
+            target.save_image(uuid, f.read(), imgfmt[1:])
+    target.close()
+    return len(records)
+
+class _Compaction(object):
+    """Stand-in for a :class:`~acorn.logging.database.TaskDB` that streams a
+    task database for :func:`compact_db` one entity at a time. While the
+    entities are being iterated, their diff chains are re-compressed and the
+    uuids that they reference are collected; the :attr:`uuids` are only valid
+    once :meth:`history` has been called for all the :meth:`keys`, which is the
+    order in which :func:`dump_taskdb` uses them.
+
+    Args:
+        base (IndexedFile): lazily-read entries in the JSON file; may be `None`.
+        entities (dict): entries that are not in `base`.
+        uuids (dict): all the uuid descriptions in the database.
+        touched (set): entity keys whose entries were merged from several
+          sources and need to be sorted.
+        keyframe (int): number of entries between keyframes in the diff chains.
+        prune (bool): when False, the uuid descriptions that aren't referenced
+          are kept as well.
+    """
+    def __init__(self, base, entities, uuids, touched, keyframe, prune=True):
+        self.base = base
+        self.entities = entities
+        self.described = uuids
+        self.touched = touched
+        self.keyframe = keyframe
+        self.prune = prune
+        self.referenced = set()
+        self.count = 0
+
+    def keys(self):
+        result = set(self.entities.keys())
+        if self.base is not None:
+            result.update(self.base.keys())
+        return list(result)
+
+    def _reference(self, value):
+        """Adds any of the uuids in `value` (which may be nested in lists or
+        tuples) to the set of referenced uuids.
+        """
+        if isinstance(value, (list, tuple)):
+            for item in value:
+                self._reference(item)
+        elif isinstance(value, dict):
+            for item in value.values():
+                self._reference(item)
+        elif value in self.described:
+            self.referenced.add(value)
+
+    def history(self, ekey):
+        from acorn.logging.diff import recompress
+        elist = self.base.history(ekey) if self.base is not None else []
+        elist.extend(self.entities.get(ekey, []))
+        if ekey in self.touched:
+            _sort_entries({ekey: elist}, [ekey])
+
+        chains = {}
+        self._reference(ekey)
+        for entry in elist:
+            self._reference(entry.get("r"))
+            self._reference(entry.get("a"))
+            if "c" in entry:
+                if entry["m"] not in chains:
+                    chains[entry["m"]] = []
+                chains[entry["m"]].append(entry)
+
+        #Only the entries that were diffed against each other form a chain;
+        #the calling code of regular method calls is always stored in full.
+        for chain in chains.values():
+            codes = [e["c"] for e in chain]
+            if any(isinstance(c, dict) for c in codes):
+                for entry, code in zip(chain, recompress(codes, self.keyframe)):
+                    entry["c"] = code
+
+        self.count += len(elist)
+        return elist
+
+    @property
+    def uuids(self):
+        if not self.prune:
+            return self.described
+        return {u: d for u, d in self.described.items() if u in self.referenced}
+
+def compact_db(dbpath, keyframe=20):
+    """Compacts the task database at `dbpath` in a single pass over its
+    entities:
+
+    - journals of processes that are no longer running are merged into the JSON
+      file and removed;
+    - uuid descriptions that are not referenced by any entry are dropped, unless
+      some journals were skipped (their processes may still reference them);
+    - the diff chains of cell re-definitions are re-compressed with a keyframe
+      every `keyframe` entries;
+    - the offset index is rebuilt.
+
+    Apart from the journals, only a single entity is in memory at a time if the
+    JSON file has an up-to-date index. SQLite files are re-indexed and vacuumed
+    and compressed block files have their small blocks merged.
+
+    Args:
+        dbpath (str): full path to the JSON, SQLite or compressed block file of
+          the task database.
+        keyframe (int): number of entries between keyframes in the diff chains.
+
+    Returns:
+        dict: with the number of `entries` written, journals `merged` and
+        `skipped` (because their process is still running) and `orphans`
+        (uuid descriptions that were dropped).
+    """
+    from os import path, remove
+    stats = {"entries": 0, "merged": 0, "skipped": 0, "orphans": 0}
+    if dbpath.endswith(".sqlite"):
+        store = SQLiteStore(dbpath)
+        store.conn.execute("REINDEX")
+        store.conn.execute("VACUUM")
+        store.close()
+        return stats
+    if dbpath.endswith(".jsonz"):
+        BlockStore(dbpath).compact(None)
+        return stats
+
+    store = JournalStore(dbpath, readonly=True)
+    with file_lock(dbpath):
+        journals = store.journals()
+        merge = [t for t in sorted(journals) if not _writer_alive(t)]
+        stats["skipped"] = len(journals) - len(merge)
+
+        base = open_index(dbpath)
+        if base is not None:
+            entities, uuids = {}, base.uuids()
+            compacted = store._compacted(base.extra.get("jseq", {}))
+        else:
+            jdb = _load_json(dbpath)
+            if jdb is None:
+                if len(merge) == 0:
+                    return stats
+                entities, uuids, compacted = {}, {}, {}
+            else:
+                entities, uuids = jdb["entities"], jdb["uuids"]
+                _tuple_keys(entities, jdb.get("compkeys", {}))
+                compacted = store._compacted(jdb.get("jseq", {}))
+
+        touched = set()
+        for token in merge:
+            last = store._apply(token, journals[token], entities, uuids,
+                                compacted, touched)
+            compacted[token] = max(compacted.get(token, 0), last)
+
+        #The entries in the journals of running processes (and those that they
+        #will still write) can reference any of the described uuids.
+        snapshot = _Compaction(base, entities, uuids, touched, keyframe,
+                               prune=stats["skipped"] == 0)
+        jseq = {t: n for t, n in compacted.items() if t in journals}
+        with atomic_write(dbpath) as f:
+            index = dump_taskdb(f, snapshot, jseq=jseq)
+        write_index(dbpath, index)
+        if base is not None:
+            base.close()
+        for token in merge:
+            remove(journals[token])
+
+    stats["entries"] = snapshot.count
+    stats["merged"] = len(merge)
+    stats["orphans"] = len(uuids) - len(snapshot.uuids)
+    return stats
+
+class SpillFile(object):
+    """Temporary on-disk segments for entries that were dropped from memory
+    because a :class:`~acorn.logging.database.TaskDB` reached its
+    `max_resident_entries` limit. Each spill writes a new JSON Lines segment;
+    the byte range of every entry is kept in an in-memory index by entity key.
+
+    Args:
+        folder (str): parent directory for the temporary segment folder;
+          defaults to the system temporary directory.
+
+    Attributes:
+        index (dict): keys are entity keys; values are lists of
+          `(segment, offset, length)` references to the spilled entries, in the
+          order that they were recorded.
+        count (int): total number of spilled entries.
+    """
+    def __init__(self, folder=None):
+        self.parent = folder
+        self.folder = None
+        self.index = {}
+        self.count = 0
+        self.nsegments = 0
+
+    def _segpath(self, segment):
+        """Returns the full path to the segment file with the specified number.
+        """
+        from os import path
+        return path.join(self.folder, "{0:06d}.jsonl".format(segment))
+
+    def write(self, records):
+        """Writes the specified records to a new segment.
+
+        Args:
+            records (list): of `(ekey, entry)` tuples to spill.
+
+        Returns:
+            list: of `(segment, offset, length)` references, one for each
+            record.
+        """
+        import json
+        if self.folder is None:
+            import atexit
+            from tempfile import mkdtemp
+            self.folder = mkdtemp(prefix="acorn-spill-", dir=self.parent)
+            atexit.register(self.close)
+
+        segment = self.nsegments
+        self.nsegments += 1
+        refs = []
+        offset = 0
+        with open(self._segpath(segment), 'wb') as f:
+            for ekey, entry in records:
+                text = json.dumps(entry, default=_plain) + '\n'
+                data = text.encode("utf-8")
+                f.write(data)
+                ref = (segment, offset, len(data))
+                offset += len(data)
+                if ekey not in self.index:
+                    self.index[ekey] = []
+                self.index[ekey].append(ref)
+                refs.append(ref)
+
+        self.count += len(refs)
+        return refs
+
+    def read(self, refs):
+        """Returns the entries for the specified references.
+
+        Args:
+            refs (list): of `(segment, offset, length)` tuples returned by
+              :meth:`write`.
+        """
+        import json
+        result = []
+        f, current = None, None
+        for segment, offset, length in refs:
+            if segment != current:
+                if f is not None:
+                    f.close()
+                f = open(self._segpath(segment), 'rb')
+                current = segment
+            f.seek(offset)
+            result.append(json.loads(f.read(length).decode("utf-8")))
+        if f is not None:
+            f.close()
+        return result
+
+    def history(self, ekey):
+        """Returns the list of spilled entries for the specified entity key.
+        """
+        if ekey not in self.index:
+            return []
+        return self.read(self.index[ekey])
+
+    def keys(self):
+        """Returns the entity keys that have spilled entries.
+        """
+        return self.index.keys()
+
+    def close(self):
+        """Removes the segment files from disk.
+        """
+        if self.folder is not None:
+            from shutil import rmtree
+            rmtree(self.folder, ignore_errors=True)
+            self.folder = None
+
+class IndexedFile(object):
+    """Read-only view of the entries in a JSON database that has an offset
+    index (see :func:`write_index`). The file is memory-mapped when it is
+    opened, and the list of entries for an entity is only deserialized when
+    :meth:`history` is called.
+
+    The map keeps the version of the file that was opened readable, even after
+    a save has replaced the JSON file on disk.
+
+    Args:
+        dbpath (str): full path to the JSON file for the task database.
+        index (dict): deserialized contents of the index file.
+
+    Attributes:
+        index (dict): keys are entity keys; values are `(offset, length)` byte
+          ranges of the JSON list of entries for that key.
+        extra (dict): additional top-level keys that were written to the JSON
+          file (e.g. `jseq` for the journal).
+    """
+    def __init__(self, dbpath, index):
+        import mmap
+        self.dbpath = dbpath
+        self.index = {}
+        for ekey, composite, offset, length in index["entities"]:
+            key = _as_tuple(ekey) if composite else ekey
+            self.index[key] = (offset, length)
+        self.extra = index.get("extra", {})
+        self._uuids = index["uuids"]
+        self._file = open(dbpath, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _read(self, offset, length):
+        """Deserializes the JSON in the specified byte range of the file.
+        """
+        import json
+        return json.loads(self._map[offset:offset+length].decode("utf-8"))
+
+    def uuids(self):
+        """Returns the uuid table from the file.
+        """
+        return self._read(*self._uuids)
+
+    def history(self, ekey):
+        """Returns the list of entries in the file for the specified entity
+        key.
+        """
+        if ekey not in self.index:
+            return []
+        return self._read(*self.index[ekey])
+
+    def keys(self):
+        """Returns the entity keys that have entries in the file.
+        """
+        return self.index.keys()
+
+    def close(self):
+        """Closes the memory map of the file.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+_stores = {
+    "json": JSONStore,
+    "journal": JournalStore,
+    "sqlite": SQLiteStore,
+    "blocks": BlockStore
+}
+"""dict: keys are the values allowed for the `backend` option in the
+`[database]` section; values are the store classes that implement them.
+"""
+
+def get_store(backend, dbpath):
+    """Returns the storage engine for the specified backend name.
+
+    Args:
+        backend (str): one of the keys in :data:`_stores`.
+        dbpath (str): full path to the JSON file for the task database.
+    """
+    if backend not in _stores: # pragma: no cover
+        msg.warn("Unknown database backend '{}'; using 'json'.".format(backend))
+        backend = "json"
+    return _stores[backend](dbpath)
+
+def load_db(dbpath):
+    """Returns the database at `dbpath` in the standard JSON layout, including
+    any entries that are still in an un-compacted journal. This is what external
+    readers of the database (like the notebook server) should use.
+
+    Args:
+        dbpath (str): full path to the JSON, SQLite or compressed block file
+          for the task database.
+    """
+    from acorn.logging.database import _json_clean
+    if dbpath.endswith(".sqlite"):
+        store = SQLiteStore(dbpath, readonly=True)
+    elif dbpath.endswith(".jsonz"):
+        store = BlockStore(dbpath, readonly=True)
+    else:
+        store = JournalStore(dbpath, readonly=True)
+    entities, uuids = store.load()
+    entities, compkeys = _json_clean(entities)
+    return {"entities": entities,
+            "compkeys": compkeys,
+            "uuids": uuids}
@@ -0,0 +1,359 @@
+"""Tuning of the tracking filters from a profiling run. A representative script
+is run with the decorated packages while every call that passes through the
+decorators is counted, together with the decorated calls nested beneath it
+(its fan-out) and the time that acorn spends in the wrappers. From those
+numbers, each package gets a recommended configuration:
+
+- `ignore` rules in `[tracking]` for hot functions that are almost only called
+  by other decorated functions;
+- `[streamline]` entries for the functions that user code calls and that fan
+  out into many decorated calls;
+- `[logging.depth]` values for the functions that user code called, but whose
+  calls were too deep in the stack to be logged.
+
+The recommendations are written to `<package>.tuned.cfg` files next to the
+custom configuration (`~/.acorn`) for review; rename a file to
+`<package>.cfg` to use it.
+
+Examples:
+    Tune the configuration with a representative script.
+
+    .. code-block:: bash
+
+        acrn.py tune analysis.py
+
+    >>> from acorn.logging.tuning import profile_calls
+    >>> prof = profile_calls("analysis.py")
+    >>> prof.report()
+    >>> prof.write_configs()
+"""
+from acorn import msg
+
+def _new_stats():
+    """Returns the statistics dict for a function that hasn't been called yet.
+    The keys are described in :class:`CallProfile`.
+    """
+    return {"calls": 0, "nested": 0, "children": 0, "descendants": 0,
+            "depth": 0, "logged": 0, "missed": 0, "needed": 0,
+            "overhead": 0.}
+
+class CallProfile(object):
+    """Call counts and fan-out of the decorated functions during a profiling
+    run.
+
+    Attributes:
+        stats (dict): keys are function (or class) FQDNs; values are dicts with
+          the number of `calls`, how many of them were `nested` inside another
+          decorated call, the number of decorated calls made directly beneath
+          them (`children`) and at any level (`descendants`), the deepest
+          nesting of decorated calls beneath them (`depth`), the number of
+          database entries `logged`, the number of calls from user code that
+          were `missed` because they were too deep in the stack, the
+          `[logging.depth]` value `needed` to log them and the seconds of
+          acorn `overhead` in the wrappers.
+        elapsed (float): seconds that the script took to run.
+    """
+    def __init__(self):
+        self.stats = {}
+        self.elapsed = 0.
+        self._originals = {}
+        self._runner = None
+        self._offset = None
+
+    def _stats(self, fqdn):
+        """Returns the statistics dict for the specified FQDN.
+        """
+        try:
+            return self.stats[fqdn]
+        except KeyError:
+            result = _new_stats()
+            self.stats[fqdn] = result
+            return result
+
+    def _pre(self, pre):
+        """Returns a version of :func:`~acorn.logging.decoration._pre` that
+        also counts the call and attributes it to the enclosing calls.
+        """
+        from acorn.logging.decoration import (_clock, _tick, _cstack_call,
+                                              _stack_depth)
+        def tpre(policy, parent, stackdepth, argl, argd):
+            start = _clock()
+            if self._offset is None:
+                self._offset = self._runner_depth()
+            #Streamlining would hide the sub-calls that we want to count; the
+            #policies are refreshed once the run is over.
+            policy.streamline = False
+            #This frame and the acorn frames that run the script count towards
+            #the stack depth, so the limit is raised by as much.
+            result = pre(policy, parent, stackdepth + self._offset + 1, argl,
+                         argd)
+
+            stats = self._stats(policy.fqdn)
+            stats["calls"] += 1
+            caller = _cstack_call.get()[2]
+            if caller is None:
+                if result[0] is None and policy.log:
+                    #The call came from user code but was too deep to be logged.
+                    #Without this frame and the acorn frames that run the
+                    #script, `_pre` and `_pre_call` count two more frames and
+                    #the limit is `stackdepth+1`.
+                    reduced = _stack_depth(1 << 16)[0] - self._offset
+                    stats["missed"] += 1
+                    stats["needed"] = max(stats["needed"], reduced)
+            else:
+                stats["nested"] += 1
+                self._stats(caller[0])["children"] += 1
+                level = 1
+                while caller is not None:
+                    ancestor = self._stats(caller[0])
+                    ancestor["descendants"] += 1
+                    ancestor["depth"] = max(ancestor["depth"], level)
+                    caller = caller[2]
+                    level += 1
+            stats["overhead"] += (_clock() - start)*_tick
+            return result
+        return tpre
+
+    def _post(self, post):
+        """Returns a version of :func:`~acorn.logging.decoration._post` that
+        adds its time to the overhead of the function.
+        """
+        from acorn.logging.decoration import _clock, _tick
+        def tpost(policy, result, entry, bound, ekey, argl, argd):
+            start = _clock()
+            try:
+                return post(policy, result, entry, bound, ekey, argl, argd)
+            finally:
+                self._stats(policy.fqdn)["overhead"] += (_clock() - start)*_tick
+        return tpost
+
+    def _record(self, ekey, entry):
+        """Counts the entries instead of recording them to the database, so
+        that the profiling run doesn't show up in the notebook.
+        """
+        self._stats(entry["m"])["logged"] += 1
+
+    def _runner_depth(self):
+        """Returns the number of frames, from the one that called
+        :meth:`install` to the top of the stack, that count towards the stack
+        depth of the calls. acorn's own frames only count once a package has
+        been decorated, so this is evaluated at the first call.
+        """
+        from acorn.logging.decoration import _decorated_code
+        result = 0
+        frame = self._runner
+        while frame is not None:
+            if _decorated_code(frame.f_code):
+                result += 1
+            frame = frame.f_back
+        return result
+
+    def install(self):
+        """Replaces the functions that the calling wrappers use to start and
+        finish their entries.
+        """
+        import sys
+        from acorn.logging import decoration
+        self._runner = sys._getframe(1)
+        self._offset = None
+        hooks = {"_pre": self._pre, "_post": self._post,
+                 "record": lambda f: self._record}
+        #The asynchronous wrappers imported `_pre` and `_post` directly.
+        modules = [decoration, sys.modules.get("acorn.logging.asyncwrap")]
+        for module in modules:
+            if module is None:
+                continue
+            for name, hook in hooks.items():
+                if hasattr(module, name):
+                    original = getattr(module, name)
+                    self._originals[(module, name)] = original
+                    setattr(module, name, hook(original))
+
+    def uninstall(self):
+        """Puts the original functions back and makes the call policies read
+        their settings again.
+        """
+        from acorn.logging import decoration
+        for (module, name), original in self._originals.items():
+            setattr(module, name, original)
+        self._originals = {}
+        self._runner = None
+        for policy in decoration._policies.values():
+            policy.stale = True
+
+    def recommend(self, mincalls=100, internal=0.9, fanout=20):
+        """Returns the recommended configuration for each package.
+
+        Args:
+            mincalls (int): minimum number of calls before a function that is
+              called by other decorated functions is ignored.
+            internal (float): minimum fraction of the calls that are nested
+              inside another decorated call for the function to be ignored.
+            fanout (float): minimum average number of decorated calls beneath
+              each call from user code for the function to be streamlined.
+
+        Returns:
+            dict: keys are package names; values are dicts with the `ignore`
+            and `streamline` lists of FQDNs and a `logging.depth` dict of
+            FQDNs and depths.
+        """
+        result = {}
+        def package(fqdn):
+            pack = fqdn.split('.')[0]
+            if pack not in result:
+                result[pack] = {"ignore": [], "streamline": [],
+                                "logging.depth": {}}
+            return result[pack]
+
+        byoverhead = sorted(self.stats.items(), key=lambda s: s[1]["overhead"],
+                            reverse=True)
+        for fqdn, stats in byoverhead:
+            if fqdn.split('.')[0] == "__main__":
+                continue
+            calls, nested = stats["calls"], stats["nested"]
+            if calls == 0:
+                continue
+            if calls >= mincalls and float(nested)/calls >= internal:
+                package(fqdn)["ignore"].append(fqdn)
+                continue
+            if calls > nested and float(stats["descendants"])/calls >= fanout:
+                package(fqdn)["streamline"].append(fqdn)
+            if stats["missed"] > 0:
+                package(fqdn)["logging.depth"][fqdn] = stats["needed"]
+        return result
+
+    def report(self, top=10, **kwargs):
+        """Prints the profile and the recommendations to the console.
+
+        Args:
+            top (int): number of functions to list.
+            kwargs (dict): thresholds passed to :meth:`recommend`.
+        """
+        overhead = sum(s["overhead"] for s in self.stats.values())
+        calls = sum(s["calls"] for s in self.stats.values())
+        msg.okay("Profiled {0:d} decorated calls in {1:.3f}s; acorn overhead: "
+                 "{2:.3f}s.".format(calls, self.elapsed, overhead))
+
+        msg.blank(1, 1)
+        msg.info("Function                                    Calls  Nested  "
+                 "Fan-out  Overhead (s)")
+        byoverhead = sorted(self.stats.items(), key=lambda s: s[1]["overhead"],
+                            reverse=True)
+        for fqdn, stats in byoverhead[0:top]:
+            msg.std("{0:<40} {1:>8d} {2:>7d} {3:>8d} {4:>13.3f}".format(
+                fqdn, stats["calls"], stats["nested"], stats["descendants"],
+                stats["overhead"]))
+
+        for pack, config in sorted(self.recommend(**kwargs).items()):
+            msg.blank(1, 1)
+            msg.info("Recommended for {}:".format(pack))
+            if len(config["ignore"]) > 0:
+                msg.std("[tracking] ignore: {}".format(
+                    '$'.join(config["ignore"])))
+            for fqdn in config["streamline"]:
+                msg.std("[streamline] {}=1".format(fqdn))
+            for fqdn, depth in sorted(config["logging.depth"].items()):
+                msg.std("[logging.depth] {}={}".format(fqdn, depth))
+
+    def write_configs(self, folder=None, **kwargs):
+        """Writes the current configuration of each package, merged with the
+        recommendations, to `<package>.tuned.cfg` files for review.
+
+        Args:
+            folder (str): directory to write the files to; defaults to the
+              custom configuration directory, `~/.acorn`.
+            kwargs (dict): thresholds passed to :meth:`recommend`.
+
+        Returns:
+            list: of the paths to the files that were written.
+        """
+        from os import path
+        from acorn.config import (config_dir, CaseConfigParser, _read_single,
+                                  _package_path)
+        if folder is None: # pragma: no cover
+            folder = config_dir(True)
+
+        result = []
+        for pack, config in sorted(self.recommend(**kwargs).items()):
+            parser = CaseConfigParser()
+            _read_single(parser, _package_path(pack))
+            if len(config["ignore"]) > 0:
+                if not parser.has_section("tracking"):
+                    parser.add_section("tracking")
+                patterns = []
+                if parser.has_option("tracking", "ignore"):
+                    patterns = parser.get("tracking", "ignore").split('$')
+                patterns.extend(config["ignore"])
+                parser.set("tracking", "ignore", '$'.join(patterns))
+
+            options = [("streamline", [(f, "1") for f in config["streamline"]]),
+                       ("logging.depth", [(f, str(d)) for f, d in
+                                          config["logging.depth"].items()])]
+            for section, values in options:
+                for fqdn, value in values:
+                    if not parser.has_section(section):
+                        parser.add_section(section)
+                    parser.set(section, fqdn, value)
+
+            target = path.join(folder, "{}.tuned.cfg".format(pack))
+            with open(target, 'w') as f:
+                f.write("# Recommended by `acrn.py tune`; review it and rename "
+                        "it to {}.cfg to use it.\n".format(pack))
+                parser.write(f)
+            result.append(target)
+        return result
+
+def _decorate_pending():
+    """Decorates the members of the lazily decorated modules (see
+    :func:`~acorn.logging.decoration.is_lazy`) that haven't been accessed yet,
+    so that the calls between them go through the decorators.
+    """
+    from acorn.logging import decoration
+    while True:
+        modules = [m for m, state in list(decoration._lazy_modules.items())
+                   if len(state[1]) > 0]
+        if len(modules) == 0:
+            break
+        for module in modules:
+            state = decoration._lazy_modules.get(module)
+            if state is not None:
+                for name in list(state[1]):
+                    decoration._lazy_access(module, name)
+
+def profile_calls(script, argv=None):
+    """Runs the specified script while profiling the calls to decorated
+    functions. The script should import the packages through acorn (for
+    example, `import acorn.numpy`), as it would in a notebook.
+
+    Args:
+        script (str): path to the python script to run.
+        argv (list): command-line arguments passed to the script.
+
+    Returns:
+        CallProfile: counts and fan-out of the calls made by the script.
+    """
+    import sys
+    import runpy
+    from acorn.logging import decoration
+    from acorn.logging.decoration import _clock, _tick
+    #The calls between the members of a package only go through the decorators
+    #once the members are decorated, so the run decorates eagerly.
+    _decorate_pending()
+    lazy = decoration.is_lazy()
+    decoration._lazy = False
+
+    profile = CallProfile()
+    origargv = sys.argv
+    sys.argv = [script] + list(argv or [])
+    profile.install()
+    start = _clock()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit: # pragma: no cover
+        pass
+    finally:
+        profile.elapsed = (_clock() - start)*_tick
+        profile.uninstall()
+        sys.argv = origargv
+        decoration._lazy = lazy
+    return profile
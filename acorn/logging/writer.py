@@ -0,0 +1,134 @@
+"""Background writer thread for the task databases. When `background = 1` is
+set in the `[database]` section of `acorn.cfg`, :func:`acorn.logging.database.record`
+only places the entry on a queue; the writer thread then owns the diffing,
+uuid descriptions, time-based saving and the final flush during
+:func:`~acorn.logging.database.cleanup`. This keeps disk I/O off the thread
+that is calling the decorated methods.
+"""
+import threading
+from six.moves import queue
+from acorn import msg
+
+_stop = object()
+"""object: sentinel placed on the queue to stop the writer thread.
+"""
+
+class FlushThread(threading.Thread):
+    """Daemon thread that processes queued database operations and saves the
+    open task databases periodically, even if no new calls are arriving.
+
+    Args:
+        interval (float): how often (in seconds) the thread wakes up to check
+          whether any of the databases are due to be saved.
+
+    Attributes:
+        queue (queue.Queue): of `(function, args)` tuples to execute on the
+          writer thread.
+        counters (dict): statistics about the writer; see :meth:`stats`.
+    """
+    def __init__(self, interval=5.):
+        super(FlushThread, self).__init__(name="acorn-writer")
+        self.daemon = True
+        self.interval = interval
+        self.queue = queue.Queue()
+        self.counters = {
+            "queued": 0,
+            "processed": 0,
+            "errors": 0,
+            "max_depth": 0,
+            "flushes": 0,
+            "flush_time": 0.,
+            "last_flush": 0.,
+            "max_flush": 0.
+            }
+
+    def put(self, func, *args):
+        """Queues the specified function call for execution on the writer
+        thread.
+        """
+        self.queue.put((func, args))
+        self.counters["queued"] += 1
+        depth = self.queue.qsize()
+        if depth > self.counters["max_depth"]:
+            self.counters["max_depth"] = depth
+
+    def sync(self):
+        """Blocks until all the operations queued so far have been processed.
+        """
+        self.queue.join()
+
+    def stop(self, timeout=None):
+        """Processes everything that is still on the queue, saves all the
+        databases and stops the thread.
+        """
+        if self.is_alive():
+            self.queue.put(_stop)
+            self.join(timeout)
+
+    def stats(self):
+        """Returns the writer statistics.
+
+        Returns:
+            dict: with keys `depth` (current queue depth), `max_depth`,
+            `queued` and `processed` (operation counts), `errors`, `flushes`
+            (number of times a database was written), and `flush_time`,
+            `last_flush` and `max_flush` (seconds spent writing to disk).
+        """
+        result = self.counters.copy()
+        result["depth"] = self.queue.qsize()
+        return result
+
+    def _flush(self, force=False):
+        """Saves the open databases that are due (or all of them if `force`).
+        """
+        from time import time
+        from acorn.logging.database import dbs
+        for db in list(dbs.values()):
+            start = time()
+            try:
+                saved = db.save(force)
+            except: # pragma: no cover
+                import sys
+                self.counters["errors"] += 1
+                msg.err("Writer save failed: {}: {}".format(
+                    *sys.exc_info()[0:2]))
+                continue
+
+            if saved:
+                elapsed = time() - start
+                self.counters["flushes"] += 1
+                self.counters["flush_time"] += elapsed
+                self.counters["last_flush"] = elapsed
+                if elapsed > self.counters["max_flush"]:
+                    self.counters["max_flush"] = elapsed
+
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.interval)
+            except queue.Empty:
+                item = None
+
+            if item is _stop:
+                self._flush(True)
+                self.queue.task_done()
+                break
+
+            if item is not None:
+                func, args = item
+                try:
+                    func(*args)
+                except: # pragma: no cover
+                    import sys
+                    self.counters["errors"] += 1
+                    msg.err("Writer operation failed: {}: {}".format(
+                        *sys.exc_info()[0:2]))
+                self.counters["processed"] += 1
+                self.queue.task_done()
+
+                #While calls are arriving quickly, we don't want to check the
+                #clocks on every single entry.
+                if not self.queue.empty():
+                    continue
+
+            self._flush()
@@ -1,18 +1,20 @@
 # We import the decoration logic from acorn and then overwrite the sys.module
 # for this package with the decorated, original scipy package. Scipy is strange
 # because it doesn't import any of its subpackages by default. They have to be
-# explicitly asked for before they are loaded into the package namespace. So we
-# do that here.
+# explicitly asked for before they are loaded into the package namespace. When
+# the decoration is lazy, the subpackages are decorated whenever they get
+# imported and accessed; otherwise, we import the common ones here.
 
 #Because scipy uses so much of numpy, we need to set the global decorating
 #variable *before* we even try and import anything from it.
-from acorn.logging.decoration import decorating, set_decorating
-origdecor = decorating
+from acorn.logging.decoration import is_decorating, set_decorating, is_lazy
+origdecor = is_decorating()
 set_decorating(True)
 
 import scipy as asp
-from scipy import optimize, spatial, stats, signal, odr, io, constants
-from scipy import cluster 
+if not is_lazy():
+    from scipy import optimize, spatial, stats, signal, odr, io, constants
+    from scipy import cluster 
 from acorn.logging.decoration import decorate
 decorate(asp)
 
@@ -1,10 +1,10 @@
 # We import the decoration logic from acorn and then overwrite the sys.module
 # for this package with the decorated, original sklearn package.
 
-from acorn.logging.decoration import set_decorating, decorating
+from acorn.logging.decoration import set_decorating, is_decorating
 #Before we do any imports, we need to set that we are decorating so that
 #everything works as if `acorn` wasn't even here.
-origdecor = decorating
+origdecor = is_decorating()
 set_decorating(True)
 
 from sklearn import *
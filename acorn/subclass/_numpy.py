@@ -5,7 +5,7 @@ http://docs.scipy.org/doc/numpy/user/basics.subclassing.html.
 """
 import numpy as np
 import six
-from acorn.logging.decoration import decorating, streamlining
+from acorn.logging.decoration import is_decorating, is_quiet
 def _get_acorn(self, method, *items):
     """Gets either a slice or an item from an array. Used for the __getitem__
     and __getslice__ special methods of the sub-classed array.
@@ -26,7 +26,7 @@ def _get_acorn(self, method, *items):
     else:
         r = np.ndarray.__acornext__.__getitem__(self, *items)
         
-    if not (decorating or streamlining):
+    if not is_quiet():
         from acorn.logging.decoration import (pre, post, _fqdn)
         if method == "slice":
             fqdn = "numpy.ndarray.__getslice__"
@@ -46,8 +46,8 @@ class ndarray(np.ndarray):
     """
     def __new__(cls, input_array):
         from acorn.logging.decoration import set_decorating
-        odecor = decorating
-        if not decorating:
+        odecor = is_decorating()
+        if not odecor:
             set_decorating(True)
             
         #Call the original, undecorated version of asarray.
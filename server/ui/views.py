@@ -77,9 +77,12 @@ def _make_projcet_list(path):
     
     proj = []
     projects = OrderedDict()
-    file_list = os.listdir(path)
+    #Journals (*.jsonl) and image folders share the project.task prefix, so we
+    #only look at the database files themselves.
+    file_list = [f for f in os.listdir(path)
+                 if f.endswith((".json", ".sqlite", ".jsonz"))]
     for files in file_list:
-        if files.split(".")[0] not in proj and 'json' in files and "#" not in files and "~" not in files:
+        if files.split(".")[0] not in proj and "#" not in files and "~" not in files:
             proj.append(files.split(".")[0])
 
     # get the background color for each project.
@@ -88,15 +91,15 @@ def _make_projcet_list(path):
 
     for p in proj:
         tasks = OrderedDict()
-        temp = [x.split(".")[1] for x in file_list if p in x and "#" not in x and "~" not in x]
+        temp = [x for x in file_list if p in x and "#" not in x and "~" not in x]
         cmspace = linspace(0.95, 0.25, len(temp))
         cm = LinearSegmentedColormap.from_list("acorn.{}".format(p),
                                                ['#ffffff', colors[p_c]],
                                                N=max((len(temp), 25)))
         hues = [r2h(cm(cmi)) for cmi in cmspace]
         h_c = 0
-        for t in temp:
-            tasks[t] = [hues[h_c],p+"."+t+".json"]
+        for x in temp:
+            tasks[x.split(".")[1]] = [hues[h_c],x]
             h_c += 1
         tasks["hex_color"] = colors[p_c]
         projects[p] = tasks
@@ -166,9 +169,10 @@ def view_proj(request):
         proj_path = str(key)
         
     path = ""
-    f = open(db_dir+proj_path,"r")
-    data = json.load(f)
-    f.close()
+    #The database may still have an un-compacted journal if the kernel that
+    #writes it is running, so we use acorn's loader to merge it in.
+    from acorn.logging.storage import load_db
+    data = load_db(db_dir+proj_path)
     context_dict = {'json_data':data}
 
     if request.is_ajax():
@@ -23,7 +23,9 @@ def db_entries(package):
         package (str): package (task) name configured via
           :func:`acorn.set_task`.
     """
-    from acorn.logging.database import dbs
+    from acorn.logging.database import dbs, sync
+    #Make sure the background writer (if enabled) has recorded everything.
+    sync()
     tdb = dbs[("acorn", package)]
 
     entries = []
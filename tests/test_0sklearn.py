@@ -27,6 +27,8 @@ def test_decorate():
     """
     import acorn.sklearn as skl
     from db import decorate_check
+    #The members are only decorated once they are first accessed.
+    skl.svm.SVC
     decorate_check("sklearn")
 
     from acorn.analyze.sklearn import set_auto_print, set_auto_predict
@@ -31,3 +31,175 @@ def test_config():
     args = get_sargs(argv)    
     assert run(args) is None
     
+
+def test_convert(tmpdir):
+    """Tests conversion of the JSON databases to SQLite from the script.
+    """
+    from shutil import copy
+    from acorn.utility import abspath
+    copy(abspath("./tests/dbs/haul.bcs.json"), str(tmpdir))
+    from acorn.acrn import run
+    argv = ["py.test", "convert", "sqlite", str(tmpdir)]
+    args = get_sargs(argv)
+    assert run(args) is None
+    assert tmpdir.join("haul.bcs.sqlite").check()
+
+    #A second conversion should skip the database since it already exists.
+    assert run(args) is None
+
+def test_compact(tmpdir):
+    """Tests compaction of the task databases from the script, including the
+    merging of journals left by processes that are no longer running.
+    """
+    import json
+    import socket
+    from os import path, getpid
+    from shutil import copy
+    from acorn.utility import abspath
+    from acorn.logging.storage import JournalStore, load_db
+    for name in ("haul.bcs.json", "default.default.json"):
+        copy(abspath("./tests/dbs/{}".format(name)), str(tmpdir))
+    jpath = str(tmpdir.join("haul.bcs.json"))
+    with open(jpath) as f:
+        jdb = json.load(f)
+    jdb["uuids"]["orphan"] = {"fqdn": "numpy.ndarray"}
+    with open(jpath, 'w') as f:
+        json.dump(jdb, f)
+
+    #Leave a journal behind for a process that has already exited.
+    store = JournalStore(jpath)
+    store.token = "{}-{}".format(socket.gethostname().replace('.', '_'), 2**22+1)
+    store.jpath = str(tmpdir.join("haul.bcs.{}.jsonl".format(store.token)))
+    entry = {"m": "numpy.sum", "a": {"_": []}, "s": 1., "r": None}
+    store.flush(None, [("numpy.sum", entry)], [])
+
+    from acorn.acrn import run, _run_compact
+    argv = ["py.test", "compact", str(tmpdir), "-processes", "2"]
+    args = get_sargs(argv)
+    assert run(args) is None
+    assert not path.isfile(store.jpath)
+    assert tmpdir.join("haul.bcs.json.idx").check()
+
+    compacted = load_db(jpath)
+    assert "orphan" not in compacted["uuids"]
+    assert len(compacted["uuids"]) == len(jdb["uuids"]) - 1
+    assert compacted["entities"]["numpy.sum"][0] == entry
+    
+    #A second pass over a single task has nothing left to merge.
+    args = get_sargs(["py.test", "compact", jpath])
+    (dbpath, stats, error), = _run_compact(args)
+    assert stats["merged"] == 0 and stats["orphans"] == 0
+
+    #The journal of a running process is skipped, and since its entries may
+    #reference any of the descriptions, nothing is pruned.
+    jdb = load_db(jpath)
+    jdb["uuids"]["orphan"] = {"fqdn": "numpy.ndarray"}
+    with open(jpath, 'w') as f:
+        json.dump(jdb, f)
+    store.token = "{}-{}".format(socket.gethostname().replace('.', '_'),
+                                 getpid())
+    store.jpath = str(tmpdir.join("haul.bcs.{}.jsonl".format(store.token)))
+    store.flush(None, [("numpy.sum", entry)], [])
+    (dbpath, stats, error), = _run_compact(args)
+    assert stats["skipped"] == 1 and stats["orphans"] == 0
+    assert path.isfile(store.jpath)
+    assert "orphan" in load_db(jpath)["uuids"]
+
+def test_profile_import(tmpdir):
+    """Tests the profile of the decoration of a small package from the script.
+    """
+    import sys
+    pkg = tmpdir.mkdir("acornprof")
+    pkg.join("__init__.py").write('\n'.join([
+        "from acornprof import sub",
+        "def twice(x):",
+        "    return 2*x",
+        "class Counter(object):",
+        "    def add(self, x):",
+        "        return x + 1"]))
+    pkg.join("sub.py").write('\n'.join([
+        "def half(x):",
+        "    return x/2."]))
+
+    from acorn.acrn import run, _run_profile
+    argv = ["py.test", "profile-import", "acornprof", "-top", "5"]
+    args = get_sargs(argv)
+    sys.path.insert(0, str(tmpdir))
+    try:
+        profile = _run_profile(args)
+    finally:
+        sys.path.remove(str(tmpdir))
+
+    assert profile.total > 0
+    assert profile.phases["decorate_obj"][1] >= 3
+    assert profile.phases["_split_object"][1] >= 2
+    assert profile.modules["acornprof.sub"]["counts"][0] == 1
+    assert "acornprof.twice" in profile.objects
+    assert "acornprof.Counter" in profile.objects
+    assert "acornprof.sub" in profile.subtrees
+    suggested = [s for s, e in profile.suggestions()]
+    assert "acornprof.sub" in suggested
+    assert "acornprof" not in suggested
+
+    #A package can only be profiled the first time that it is decorated.
+    assert run(args) is None
+    from acorn.logging.decoration import _decor_count
+    assert type(_decor_count["acornprof"]) is list
+
+def test_tune(tmpdir, monkeypatch):
+    """Tests the recommended configuration from profiling the calls that a
+    script makes to a small package.
+    """
+    import sys
+    from acorn.logging import decoration as d
+    monkeypatch.setattr(d, "record", lambda k, e: None)
+    pkg = tmpdir.mkdir("acorntune")
+    pkg.join("__init__.py").write('\n'.join([
+        "def inner(x):",
+        "    return x + 1",
+        "def outer(n):",
+        "    return sum(inner(i) for i in range(n))",
+        "def half(x):",
+        "    return x/2.",
+        "def _nest(f, x, n):",
+        "    return f(x) if n == 0 else _nest(f, x, n-1)"]))
+    script = tmpdir.join("script.py")
+    script.write('\n'.join([
+        "import acorntune",
+        "for i in range(3):",
+        "    acorntune.outer(50)",
+        "acorntune.half(2)",
+        "acorntune._nest(acorntune.half, 3, 7)"]))
+    sys.path.insert(0, str(tmpdir))
+    try:
+        import acorntune
+    finally:
+        sys.path.remove(str(tmpdir))
+    d.decorate(acorntune)
+
+    from acorn.acrn import run, _run_tune
+    output = tmpdir.mkdir("tuned")
+    argv = ["py.test", "tune", str(script), str(output)]
+    args = get_sargs(argv)
+    profile = _run_tune(args)
+
+    stats = profile.stats
+    assert stats["acorntune.inner"]["calls"] == 150
+    assert stats["acorntune.inner"]["nested"] == 150
+    assert stats["acorntune.outer"]["descendants"] == 150
+    assert stats["acorntune.half"]["missed"] == 1
+    recommended = profile.recommend()["acorntune"]
+    assert recommended["ignore"] == ["acorntune.inner"]
+    assert recommended["streamline"] == ["acorntune.outer"]
+    assert recommended["logging.depth"] == {"acorntune.half": 11}
+
+    from acorn.config import CaseConfigParser
+    parser = CaseConfigParser()
+    parser.read(str(output.join("acorntune.tuned.cfg")))
+    assert parser.get("tracking", "ignore") == "acorntune.inner"
+    assert parser.get("streamline", "acorntune.outer") == "1"
+    assert parser.get("logging.depth", "acorntune.half") == "11"
+
+    #The profiling run doesn't leave the hooks or the streamlining behind.
+    assert d._pre is not None and d._pre.__name__ == "_pre"
+    assert acorntune.inner(1) == 2
@@ -2,6 +2,7 @@
 in day-to-day use.
 """
 import six
+import pytest
 def test_tracker():
     """Tests the tracker on some outlier cases.
     """
@@ -43,3 +44,519 @@ def test_listproj():
     from acorn.utility import abspath
     tasks = list_tasks(abspath("./tests/dbs"))
     assert tasks == {'default': ['default'], 'haul': ['bcs'], 'acorn': ['x']}
+
+def _entry(method, code=None, start=0.):
+    """Returns a minimal database entry for the specified method.
+    """
+    return {"m": method, "a": {"_": []}, "s": start, "r": None, "c": code}
+
+def test_journal(tmpdir):
+    """Tests the append-only journal backend, including recovery from a
+    truncated batch and compaction into the standard JSON layout.
+    """
+    import json
+    from os import path
+    from acorn.logging.database import TaskDB
+    db = TaskDB(str(tmpdir), backend="journal")
+    db.record("numpy.sum", _entry("numpy.sum", start=1.))
+    db.record(("a", "b"), _entry("numpy.cos", start=2.))
+    db.save(True)
+    assert path.isfile(db.store.jpath)
+    assert not path.isfile(db.dbpath)
+
+    #The second save should only append the new entry.
+    db.record("numpy.sum", _entry("numpy.sum", start=3.))
+    db.save(True)
+    with open(db.store.jpath) as f:
+        lines = f.readlines()
+    assert len(lines) == 5
+
+    #Simulate a crash part-way through writing a batch.
+    with open(db.store.jpath, 'a') as f:
+        f.write('{"k": "numpy.sum", "e": {"m": "num')
+
+    reopened = TaskDB(str(tmpdir), backend="journal")
+    assert len(reopened.entities["numpy.sum"]) == 2
+    assert reopened.entities[("a", "b")][0]["m"] == "numpy.cos"
+    reopened.record("numpy.sum", _entry("numpy.sum", start=4.))
+    reopened.save(True)
+
+    reopened.compact()
+    assert not path.isfile(db.store.jpath)
+    with open(db.dbpath) as f:
+        jdb = json.load(f)
+    assert len(jdb["entities"]["numpy.sum"]) == 3
+    assert list(jdb["compkeys"].values()) == [["a", "b"]]
+
+    final = TaskDB(str(tmpdir), backend="journal")
+    assert len(final.history("numpy.sum")) == 3
+    assert ("a", "b") in final.keys()
+
+def test_sqlite(tmpdir, monkeypatch):
+    """Tests the SQLite backend, including queries by FQDN and time and the
+    conversion of existing JSON databases.
+    """
+    from acorn.logging import database
+    from acorn.logging.database import TaskDB, list_tasks
+    from acorn.logging.storage import SQLiteStore, convert, load_db
+    #Other tests may have set a different task for the session.
+    monkeypatch.setattr(database, "task", "default")
+    db = TaskDB(str(tmpdir), backend="sqlite")
+    db.record("numpy.sum", _entry("numpy.sum", start=1.))
+    db.record(("a", "b"), _entry("numpy.cos", start=2.))
+    db.record("numpy.sum", _entry("numpy.sum", start=3.))
+    db.save(True)
+    db.store.save_image("img", b"\x89PNG", "png")
+
+    reopened = TaskDB(str(tmpdir), backend="sqlite")
+    assert len(reopened.entities["numpy.sum"]) == 2
+    assert ("a", "b") in reopened.entities
+    assert reopened.store.image("img") == ("png", b"\x89PNG")
+
+    store = reopened.store
+    assert len(store.query(method="numpy.sum")) == 2
+    assert len(store.query(start=2., end=3.)) == 1
+    assert store.query(ekey=("a", "b"))[0][1]["m"] == "numpy.cos"
+    assert list(list_tasks(str(tmpdir)).values()) == [["default"]]
+    assert len(load_db(store.sqlpath)["compkeys"]) == 1
+
+    #Now convert one of the example JSON databases and compare.
+    from shutil import copy
+    from acorn.utility import abspath
+    copy(abspath("./tests/dbs/haul.bcs.json"), str(tmpdir))
+    jpath = str(tmpdir.join("haul.bcs.json"))
+    count = convert(jpath)
+    original = load_db(jpath)
+    assert count == sum(map(len, original["entities"].values()))
+    converted = SQLiteStore(jpath).load()
+    assert converted[1] == original["uuids"]
+    assert len(converted[0]) == len(original["entities"])
+
+def test_unwriteable(tmpdir, monkeypatch):
+    """Tests that the entries recorded while the database isn't writeable are
+    only kept in memory, and not buffered for a write that never happens.
+    """
+    from os import path
+    from acorn.logging import database
+    from acorn.logging.database import TaskDB
+    db = TaskDB(str(tmpdir))
+    db.record("numpy.sum", _entry("numpy.sum", start=1.))
+    monkeypatch.setattr(database, "writeable", False)
+    for i in range(5):
+        db.record("numpy.sum", _entry("numpy.sum", start=2. + i))
+    assert len(db.entities["numpy.sum"]) == 6
+    assert len(db._pending) == 1
+    assert db.save(True) == False
+    assert len(db._pending) == 0
+    assert not path.isfile(db.store.dbpath)
+
+def test_writer(tmpdir):
+    """Tests the background writer thread, including the time-based flushing
+    when no new calls are arriving.
+    """
+    from os import path
+    from time import sleep
+    from acorn.logging.database import TaskDB
+    from acorn.logging.writer import FlushThread
+    db = TaskDB(str(tmpdir), backend="journal")
+    db.savefreq = -1
+    
+    from acorn.logging import database
+    odbs = database.dbs
+    database.dbs = {("acorn", "writer"): db}
+    writer = FlushThread(interval=0.05)
+    writer.start()
+    try:
+        for i in range(10):
+            writer.put(db.record, "numpy.sum", _entry("numpy.sum", start=i))
+        writer.sync()
+        assert len(db.entities["numpy.sum"]) == 10
+
+        #The periodic flush should write the journal without further calls.
+        sleep(0.2)
+        assert tmpdir.join(path.basename(db.store.jpath)).check()
+        stats = writer.stats()
+        assert stats["processed"] == 10
+        assert stats["flushes"] >= 1
+        assert stats["depth"] == 0
+
+        writer.put(db.record, "numpy.sum", _entry("numpy.sum", start=11))
+        writer.stop()
+        assert not writer.is_alive()
+        assert len(db._pending) == 0
+    finally:
+        database.dbs = odbs
+
+def test_bounded(tmpdir):
+    """Tests the spilling of entries to disk when the number of resident
+    entries is capped.
+    """
+    import json
+    from acorn.config import settings
+    from acorn.logging.database import TaskDB
+    from acorn.logging.diff import cascade
+    config = settings("acorn")
+    config.set("database", "max_resident_entries", "10")
+    try:
+        db = TaskDB(str(tmpdir))
+        for i in range(25):
+            db.record("numpy.sum", _entry("numpy.sum", start=i))
+            code = "def f():\n    return {}\n".format(i)
+            db.record("__main__.f", _entry("def", code, start=i+0.5), diff=True)
+
+        resident = sum(map(len, db.entities.values()))
+        assert resident <= 10
+        assert db.spill.count == 50 - resident
+        assert len(db.history("numpy.sum")) == 25
+        assert set(db.keys()) == set(["numpy.sum", "__main__.f"])
+
+        #The diffs must have been computed against the spilled entries.
+        sequence = [e["c"] for e in db.history("__main__.f")]
+        assert ''.join(cascade(sequence)) == "def f():\n    return 24\n"
+
+        db.save(True)
+        with open(db.dbpath) as f:
+            jdb = json.load(f)
+        assert len(jdb["entities"]["numpy.sum"]) == 25
+
+        reopened = TaskDB(str(tmpdir))
+        assert sum(map(len, reopened.entities.values())) <= 10
+        assert len(reopened.history("__main__.f")) == 25
+        db.spill.close()
+    finally:
+        config.remove_option("database", "max_resident_entries")
+
+def test_indexed(tmpdir):
+    """Tests the lazy loading of task databases using the offset index written
+    next to the JSON file.
+    """
+    from os import path
+    from acorn.logging.database import TaskDB
+    from acorn.logging.diff import cascade
+    db = TaskDB(str(tmpdir))
+    assert db.base is None
+    db.record("numpy.sum", _entry("numpy.sum", start=1.))
+    db.record(("a", "b"), _entry("numpy.cos", start=2.))
+    db.record("__main__.f", _entry("def", "def f():\n    pass\n", 3.))
+    db.uuids["u"] = {"m": "numpy.ndarray"}
+    db.save(True)
+    assert path.isfile(db.dbpath + ".idx")
+
+    #Nothing but the uuids should be deserialized when the task is opened.
+    reopened = TaskDB(str(tmpdir))
+    assert reopened.base is not None
+    assert reopened.entities == {}
+    assert reopened.uuids == {"u": {"m": "numpy.ndarray"}}
+    assert set(reopened.keys()) == set(["numpy.sum", ("a", "b"), "__main__.f"])
+    assert reopened.history(("a", "b"))[0]["m"] == "numpy.cos"
+
+    #New code has to be diffed against the entries in the file.
+    code = "def f():\n    return 1\n"
+    reopened.record("__main__.f", _entry("def", code, 4.), diff=True)
+    sequence = [e["c"] for e in reopened.history("__main__.f")]
+    assert ''.join(cascade(sequence)) == code
+    reopened.save(True)
+
+    final = TaskDB(str(tmpdir))
+    assert len(final.history("__main__.f")) == 2
+    assert len(final.history("numpy.sum")) == 1
+
+    #An index that doesn't match the file anymore is ignored.
+    with open(db.dbpath, 'a') as f:
+        f.write(" ")
+    stale = TaskDB(str(tmpdir))
+    assert stale.base is None
+    assert len(stale.entities["__main__.f"]) == 2
+    for opened in (reopened, final):
+        opened.base.close()
+
+def test_blocks(tmpdir, monkeypatch):
+    """Tests the compressed block backend, including time range queries,
+    recovery from an incomplete block and compaction of small blocks.
+    """
+    from os import path
+    from acorn.logging import database
+    from acorn.logging.database import TaskDB, list_tasks
+    from acorn.logging.storage import BlockStore, convert, load_db
+    #Other tests may have set a different task for the session.
+    monkeypatch.setattr(database, "task", "default")
+    db = TaskDB(str(tmpdir), backend="blocks")
+    db.record("numpy.sum", _entry("numpy.sum", start=1.))
+    db.record(("a", "b"), _entry("numpy.cos", start=2.))
+    db.uuids["u"] = {"m": "numpy.ndarray"}
+    db._pending_uuids.append("u")
+    db.save(True)
+    db.record("numpy.sum", _entry("numpy.sum", start=3.))
+    db.save(True)
+    store = db.store
+    assert len(store.blocks()) == 2
+    assert list(list_tasks(str(tmpdir)).values()) == [["default"]]
+
+    #Only the second block overlaps with this time range.
+    assert [e["s"] for k, e in store.query(start=2.5)] == [3.]
+    assert store.query(ekey=("a", "b"))[0][1]["m"] == "numpy.cos"
+    assert len(store.query(method="numpy.sum", end=3.)) == 1
+
+    #Simulate a crash part-way through writing a block.
+    with open(store.zpath, 'ab') as f:
+        f.write(BlockStore.magic + b"\x00\x01")
+    reopened = TaskDB(str(tmpdir), backend="blocks")
+    assert len(reopened.entities["numpy.sum"]) == 2
+    assert reopened.uuids == {"u": {"m": "numpy.ndarray"}}
+    reopened.record("numpy.sum", _entry("numpy.sum", start=4.))
+    reopened.save(True)
+    reopened.compact()
+    assert len(reopened.store.blocks()) == 1
+    data = load_db(reopened.store.zpath)
+    assert len(data["entities"]["numpy.sum"]) == 3
+    assert len(data["compkeys"]) == 1
+
+    #The compressed file should be much smaller than the JSON database.
+    from shutil import copy
+    from acorn.utility import abspath
+    copy(abspath("./tests/dbs/haul.bcs.json"), str(tmpdir))
+    jpath = str(tmpdir.join("haul.bcs.json"))
+    count = convert(jpath, "blocks")
+    original = load_db(jpath)
+    assert count == sum(map(len, original["entities"].values()))
+    converted = BlockStore(jpath).load()
+    assert converted[1] == original["uuids"]
+    assert path.getsize(BlockStore(jpath).zpath) < path.getsize(jpath)/3
+
+def test_entry(tmpdir):
+    """Tests the compact entry records and the interning of repeated strings
+    in the task database.
+    """
+    import json
+    from acorn.logging.database import TaskDB, Entry
+    entry = Entry("numpy.sum", {"_": ["xxx"]}, 1., c="y = sum(x)")
+    assert "c" in entry and "e" not in entry
+    entry["!"] = "ValueError"
+    assert entry.get("z") is None
+    assert entry == {"m": "numpy.sum", "a": {"_": ["xxx"]}, "s": 1., "r": None,
+                     "c": "y = sum(x)", "!": "ValueError"}
+    with pytest.raises(KeyError):
+        entry["get"]
+
+    db = TaskDB(str(tmpdir))
+    #Build new copies of the strings the way the decorators would.
+    fqdn = '.'.join(["numpy", "sum"])
+    other = Entry(fqdn, {"_": [''.join(["x"] * 3)]}, 2.)
+    assert other["m"] is not entry["m"]
+    db.record("numpy.sum", entry)
+    db.record(fqdn, other)
+    assert other["m"] is entry["m"]
+    assert other["a"]["_"][0] is entry["a"]["_"][0]
+    assert len(db.entities) == 1
+
+    db.save(True)
+    with open(db.dbpath) as f:
+        jdb = json.load(f)
+    assert jdb["entities"]["numpy.sum"][0] == entry
+    assert "c" not in jdb["entities"]["numpy.sum"][1]
+
+def test_registry(tmpdir):
+    """Tests that the objects tracked by :func:`tracker` are only referenced
+    weakly once they have been described.
+    """
+    import gc
+    from acorn.logging.database import tracker, tracker_stats, uuids
+    class Tracked(object):
+        pass
+
+    before = tracker_stats()
+    obj = Tracked()
+    instance = tracker(obj)
+    assert tracker(obj) is instance
+    assert tracker_stats()["live"] == before["live"] + 1
+
+    #Until it is described, the object has to stay alive.
+    del obj
+    gc.collect()
+    assert instance.obj is not None
+    description = instance.describe()
+    assert instance.describe() is description
+    gc.collect()
+    assert instance.obj is None
+    assert instance.uuid not in uuids
+    after = tracker_stats()
+    assert after["live"] == before["live"]
+    assert after["retired"] == before["retired"] + 1
+
+    #The uuids nested in the summaries of tuples are described (and unpinned)
+    #when the entry is recorded too.
+    from acorn.logging.database import TaskDB
+    first, second, third = Tracked(), Tracked(), Tracked()
+    pair = (tracker(first).uuid, tracker(second).uuid)
+    db = TaskDB(str(tmpdir))
+    db.record("numpy.concatenate", {"m": "numpy.concatenate", "s": 1.,
+                                    "a": {"_": [pair], "out": [pair[0]]},
+                                    "r": (tracker(third).uuid,), "c": None})
+    for o in (first, second, third):
+        assert tracker(o).uuid in db.uuids
+        assert tracker(o)._obj is None
+
+    #Objects without weak reference support are kept alive instead.
+    strong = tracker(object())
+    assert strong.obj is not None
+    assert tracker_stats()["strong"] == before["strong"] + 1
+
+def test_summary(monkeypatch):
+    """Tests that the summaries of large containers have a bounded cost and
+    that one-shot iterators are left alone.
+    """
+    from acorn.logging import database
+    from acorn.logging.database import tracker, summary_limits
+    assert tracker([3, 1, 2]) == "<class 'list'> len=3 min=1 max=3"
+    assert tracker(range(10, 0, -3)) == "<class 'range'> len=4 min=1 max=10"
+    assert tracker({"b": 1, "a": 2}) == "<class 'dict'> len=2 min=a max=b"
+    #Mixed types can't be compared, but still get a summary.
+    assert tracker([1, "a"]) == "<class 'list'> len=2"
+
+    #Longer containers only have a sample of their types checked, and their
+    #minimum and maximum are skipped.
+    big = list(range(5000))
+    assert tracker(big) == "<class 'list'> len=5000"
+    assert tracker(big, (20, 10000, 5)) == "<class 'list'> len=5000 min=0 max=4999"
+
+    class Tracked(object):
+        pass
+    mixed = [Tracked() for i in range(3)] + [1.]
+    summary = tracker(set(mixed), (2, 10, 2))
+    assert len(summary) == 3 and summary[2] == "... (4 items)"
+
+    squares = map(lambda x: x*x, [1, 2, 3])
+    assert tracker(squares) == "<class 'map'>"
+    assert list(squares) == [1, 4, 9]
+
+    monkeypatch.setitem(database._limits, "acorn.test", (4, 8, 2))
+    assert summary_limits("acorn.test") == (4, 8, 2)
+    assert summary_limits("numpy") == database._def_limits
+
+def test_fingerprint(tmpdir, monkeypatch):
+    """Tests that arrays and data frames with the same content share their uuid
+    and description when fingerprinting is enabled. `numpy` is decorated first,
+    since the arrays passed to its decorated functions are the ones that get
+    fingerprinted.
+    """
+    import numpy as np
+    import pandas as pd
+    import acorn.numpy
+    from acorn.logging import database, decoration
+    from acorn.logging.fingerprint import fingerprint
+    monkeypatch.setattr(decoration, "record", lambda k, e: None)
+    a = np.arange(1000.).reshape(100, 10)
+    assert fingerprint(a, 16) == fingerprint(a.copy(), 16)
+    assert fingerprint(a, 16) != fingerprint(a.T, 16)
+    assert fingerprint(a[::3, ::2], 16) == fingerprint(a[::3, ::2].copy(), 16)
+    b = a.copy()
+    b[-1, -1] = -1.
+    assert fingerprint(a, 16) != fingerprint(b, 16)
+    assert fingerprint(np.array([None, 1]), 16) is None
+    assert fingerprint([1, 2], 16) is None
+    assert fingerprint(np.arange(3.), 16) is not None
+
+    #Memory-mapped arrays only have their sampled elements read.
+    mpath = str(tmpdir.join("a.dat"))
+    mapped = np.memmap(mpath, dtype=a.dtype, mode="w+", shape=a.shape)
+    mapped[:] = a
+    assert fingerprint(mapped, 16) == fingerprint(a, 16)
+
+    #The extended `numpy.ndarray` breaks the array checks inside `pandas`, so
+    #the frames are built and hashed with the original objects put back.
+    with acorn.paused():
+        df = pd.DataFrame({"x": np.arange(50), "y": ["s{}".format(i) for i in
+                                                     range(50)]})
+        assert fingerprint(df, 8) == fingerprint(df.copy(), 8)
+        assert fingerprint(df, 8) != fingerprint(df["x"], 8)
+        changed = df.copy()
+        changed.loc[0, "y"] = "t"
+        assert fingerprint(df, 8) != fingerprint(changed, 8)
+
+    db = database.TaskDB(str(tmpdir))
+    monkeypatch.setattr(database, "active_db", lambda: db)
+    monkeypatch.setattr(database, "_fingerprinting", 64)
+    monkeypatch.setattr(database, "_fingerprints", {})
+    first = database.tracker(a)
+    second = database.tracker(a.copy())
+    assert second is not first and second.uuid == first.uuid
+    db.log_uuid(first.uuid)
+    assert db.uuids[first.uuid]["fingerprint"] == first.fingerprint
+    #The first object is described; the copy is never pinned.
+    assert first._obj is None and second._obj is None
+    assert database.tracker(b).uuid != first.uuid
+
+    #A later session finds the uuid and description in the database.
+    monkeypatch.setattr(database, "_fingerprints", {})
+    third = database.tracker(a.copy())
+    assert third.uuid == first.uuid
+    assert third.description is db.uuids[first.uuid]
+
+def _worker(dbdir, backend, index, inherited):
+    """Records a few entries to the database in `dbdir` from a worker process.
+    """
+    from acorn.logging import database
+    inherited.put(len(database.dbs))
+    db = database.TaskDB(dbdir, backend=backend)
+    for i in range(5):
+        db.record("numpy.sum", _entry("numpy.sum", start=index + i/10.))
+        db.save(True)
+    db.compact()
+
+@pytest.mark.parametrize("backend", ["json", "journal"])
+def test_processes(tmpdir, backend):
+    """Tests that several processes can write to the same task database
+    without losing each other's entries.
+    """
+    import multiprocessing
+    from acorn.logging import database
+    context = multiprocessing.get_context("fork")
+    inherited = context.Queue()
+    database.dbs[("acorn", "parent")] = None
+    try:
+        workers = [context.Process(target=_worker,
+                                   args=(str(tmpdir), backend, i, inherited))
+                   for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        del database.dbs[("acorn", "parent")]
+
+    exitcodes = [w.exitcode for w in workers]
+    assert exitcodes == [0, 0, 0, 0], "worker exit codes: {}".format(exitcodes)
+    assert [inherited.get() for w in workers] == [0, 0, 0, 0]
+    merged = database.TaskDB(str(tmpdir), backend=backend)
+    starts = [e["s"] for e in merged.history("numpy.sum")]
+    assert len(starts) == 20
+    assert starts == sorted(starts)
+
+@pytest.mark.parametrize("backend", ["json", "journal"])
+def test_threads(tmpdir, backend):
+    """Tests that several threads can record to (and save) the same task
+    database without losing entries.
+    """
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    from acorn.logging.database import TaskDB
+    db = TaskDB(str(tmpdir), backend=backend)
+    def work(index):
+        for i in range(100):
+            db.record("numpy.sum", _entry("numpy.sum", start=index + i/1000.))
+            if i % 10 == 0:
+                db.save(True)
+
+    #Switching threads as often as possible makes the races likely.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(work, range(8)))
+    finally:
+        sys.setswitchinterval(interval)
+    db.save(True)
+    assert len(db.history("numpy.sum")) == 800
+
+    reopened = TaskDB(str(tmpdir), backend=backend)
+    assert len(reopened.history("numpy.sum")) == 800
@@ -2,6 +2,10 @@
 use.
 """
 import six
+_scaled = []
+"""list: factors used by the memoized test function; it is a global so that it
+isn't part of the cache keys of the closures.
+"""
 def test_iswhat():
     """Tests the iswhat tester for an object.
     """
@@ -30,3 +34,513 @@ def test_namefilters():
     from acorn.logging.decoration import _get_name_filter, filter_name
     assert _get_name_filter("sklearn", "bogus") is None
     assert filter_name("unnecessary", "sklearn", "bogus") == True
+
+def test_compiledfilters():
+    """Tests that the combined filter regexes keep the include/ignore precedence
+    of the individual patterns and that the memoized results are reset when the
+    filters are re-parsed.
+    """
+    from acorn.logging import decoration as d
+    from fnmatch import fnmatch
+    pf = d._get_name_filter("numpy", "decorate")
+    names = ["numpy.sum", "_private", "numpy.testing.assert_equal",
+             "numpy.float64", "numpy.linalg.norm", "set_printoptions"]
+    for name in names:
+        if any(fnmatch(name, p) for p in pf["filters"]):
+            expected = True
+        elif any(fnmatch(name, p) for p in pf["ignores"]):
+            expected = False
+        else:
+            expected = None
+        assert d._match_filter(pf, name) is expected
+        assert d.filter_name(name, "numpy") == (expected is not False)
+        assert d.filter_name(name, "numpy", explicit=True) == (expected is True)
+        assert name in pf["cache"]
+
+    assert d.filter_name("_private", "numpy") == False
+    assert d._get_name_filter("numpy", "decorate", True)["cache"] == {}
+
+def test_stackdepth():
+    """Tests that the frame walk used for the logging decisions agrees with
+    the full, reduced stack for nested decorated calls.
+    """
+    from acorn.logging import decoration as d
+    from acorn.logging.decoration import CallingDecorator as CD
+    probes = []
+    def probe():
+        probes.append((d._stack_depth(100)[0], len(d._reduced_stack())))
+
+    def inner():
+        probe()
+    def outer():
+        probe()
+        winner()
+        probe()
+
+    d._logging["tests.inner"] = False
+    d._logging["tests.outer"] = False
+    winner = CD(inner)("tests.inner", "tests", None, 100)
+    wouter = CD(outer)("tests.outer", "tests", None, 100)
+    d._pack_paths.append("test_decoration")
+    d._code_paths.clear()
+    try:
+        wouter()
+        assert d._cstack_call.get() is None
+        #Once the limit is exceeded, the walk stops early.
+        assert d._stack_depth(0) == (1, None, None)
+    finally:
+        d._pack_paths.remove("test_decoration")
+        d._code_paths.clear()
+        del d._logging["tests.inner"]
+        del d._logging["tests.outer"]
+
+    assert len(probes) == 3
+    assert all(walk == full for walk, full in probes)
+    assert probes[1][0] > probes[0][0]
+
+def test_policy():
+    """Tests that the call policies cache the configuration settings of the
+    decorated functions until the configuration is reloaded.
+    """
+    from acorn.logging import decoration as d
+    from acorn.logging.decoration import CallingDecorator as CD
+    from acorn.config import settings
+    d._logging["tests.double"] = False
+    wrapped = CD(lambda x: x + 1)("tests.double", "tests", None)
+    policy = d._policies["tests.double"]
+    assert policy.stale == False
+    assert policy.log == False
+    assert policy.callwrap is None
+    try:
+        d._callwraps["tests.double"] = lambda r: 2*r
+        assert wrapped(1) == 2
+
+        settings("tests", True)
+        assert policy.stale == True
+        assert wrapped(1) == 4
+        assert policy.callwrap is d._callwraps["tests.double"]
+    finally:
+        del d._callwraps["tests.double"]
+        del d._logging["tests.double"]
+        settings("tests", True)
+    assert d._get_policy("tests.double", "tests").callwrap is None
+
+def test_pause(tmpdir):
+    """Tests that pausing puts the original objects back on a decorated
+    package and that resuming restores the decorators.
+    """
+    import sys
+    import acorn
+    from acorn.logging.decoration import decorate
+    tmpdir.join("acornpause.py").write('\n'.join([
+        "def twice(x):",
+        "    return 2*x",
+        "class Box(object):",
+        "    def __init__(self, v):",
+        "        self.v = v",
+        "    def get(self):",
+        "        return self.v"]))
+    sys.path.insert(0, str(tmpdir))
+    try:
+        import acornpause
+    finally:
+        sys.path.remove(str(tmpdir))
+
+    twice, get = acornpause.twice, acornpause.Box.get
+    decorate(acornpause)
+    wtwice, wget = acornpause.twice, acornpause.Box.get
+    assert wtwice.__acorn__ is twice
+    assert wget is not get
+
+    acorn.pause()
+    assert acornpause.twice is twice
+    assert acornpause.Box.get is get
+    acorn.resume()
+    assert acornpause.twice is wtwice
+    assert acornpause.Box.get is wget
+
+    with acorn.paused():
+        assert acornpause.twice is twice
+        assert acornpause.twice(2) == 4
+        assert acornpause.Box(3).get() == 3
+        #Calls through the decorated references are streamlined.
+        assert wtwice(3) == 6
+    assert acornpause.twice is wtwice
+
+def test_threadstate():
+    """Tests that streamlining and the call stacks of the decorators are kept
+    separately for each thread.
+    """
+    import threading
+    from acorn.logging import decoration as d
+    from acorn.logging.decoration import CallingDecorator as CD
+    seen = {}
+    def probe():
+        node = d._cstack_call.get()
+        seen["B"] = (node[0], node[2], d.is_quiet())
+
+    d._logging["tests.probe"] = False
+    wprobe = CD(probe)("tests.probe", "tests", None)
+    streamed, called = threading.Event(), threading.Event()
+    def first():
+        d.set_streamlining(True)
+        streamed.set()
+        called.wait(5)
+        seen["A"] = d.is_quiet()
+        d.set_streamlining(False)
+    def second():
+        streamed.wait(5)
+        wprobe()
+        called.set()
+
+    try:
+        threads = [threading.Thread(target=t) for t in (first, second)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        del d._logging["tests.probe"]
+
+    assert seen == {"A": True, "B": ("tests.probe", None, False)}
+    assert d.is_quiet() == False
+    assert d._cstack_call.get() is None
+
+def test_generators(monkeypatch):
+    """Tests that the entries for generator functions, coroutine functions and
+    asynchronous generator functions time their execution and that the caller's
+    call stack is restored between items.
+    """
+    import asyncio
+    import inspect
+    from time import sleep
+    from acorn.logging import decoration as d
+    from acorn.logging.decoration import CallingDecorator as CD
+    records = []
+    monkeypatch.setattr(d, "record", lambda k, e: records.append(e))
+    def count(n):
+        for i in range(n):
+            sleep(0.01)
+            yield i
+    async def wait(x):
+        await asyncio.sleep(0.02)
+        return x
+    async def acount(n):
+        for i in range(n):
+            await asyncio.sleep(0.01)
+            yield i
+
+    wcount = CD(count)("tests.count", "tests", None)
+    wwait = CD(wait)("tests.wait", "tests", None)
+    wacount = CD(acount)("tests.acount", "tests", None)
+    assert inspect.isgeneratorfunction(wcount)
+    assert inspect.iscoroutinefunction(wwait)
+    assert inspect.isasyncgenfunction(wacount)
+    for fqdn in ("tests.count", "tests.wait", "tests.acount"):
+        d._policies[fqdn].time = True
+
+    items = []
+    for i in wcount(3):
+        items.append((i, d._cstack_call.get()))
+    assert items == [(0, None), (1, None), (2, None)]
+    assert len(records) == 1
+    assert records[0]["e"] >= 0.03
+
+    gen = wcount(3)
+    assert next(gen) == 0
+    gen.close()
+    assert len(records) == 2
+    assert d._cstack_call.get() is None
+
+    #The value returned by the generator must reach `yield from` and
+    #`StopIteration.value`.
+    def answer():
+        yield 1
+        return 42
+    wanswer = CD(answer)("tests.answer", "tests", None)
+    def outer():
+        result = yield from wanswer()
+        yield result
+    assert list(outer()) == [1, 42]
+    gen = wanswer()
+    assert next(gen) == 1
+    try:
+        next(gen)
+    except StopIteration as stop:
+        assert stop.value == 42
+    else: # pragma: no cover
+        assert False
+    del records[2:]
+
+    async def main():
+        result = await wwait(5)
+        aitems = [i async for i in wacount(2)]
+        return result, aitems
+    assert asyncio.run(main()) == (5, [0, 1])
+    assert len(records) == 4
+    assert records[2]["e"] >= 0.02
+    assert records[3]["e"] >= 0.02
+
+def test_timing(monkeypatch):
+    """Tests that timed calls record the elapsed time of the call itself, the
+    CPU time and the acorn overhead separately.
+    """
+    from time import sleep
+    from acorn.logging import decoration as d
+    from acorn.logging.decoration import CallingDecorator as CD
+    records = []
+    monkeypatch.setattr(d, "record", lambda k, e: records.append(e))
+    wsleep = CD(sleep)("tests.sleep", "tests", None)
+    policy = d._policies["tests.sleep"]
+    assert policy.cpu == False
+    policy.time, policy.cpu = True, True
+
+    wsleep(0.02)
+    entry = records[0].to_dict()
+    assert set(["e", "p", "o"]) <= set(entry)
+    assert entry["e"] >= 0.02
+    assert entry["p"] < entry["e"]
+    assert 0 < entry["o"] < entry["e"]
+
+    policy.cpu = False
+    wsleep(0.)
+    assert "p" not in records[1]
+    assert "o" in records[1]
+
+def test_memory(monkeypatch):
+    """Tests that the calls included by the `[memory]` section record their
+    memory allocations and that tracing is switched off between them.
+    """
+    import tracemalloc
+    import numpy as np
+    from acorn.logging import decoration as d
+    from acorn.logging.decoration import CallingDecorator as CD
+    records = []
+    #Once `numpy` is decorated, the `numpy.zeros` calls get entries too.
+    monkeypatch.setattr(d, "record", lambda k, e: records.append(e)
+                        if e["m"] == "tests.grow" else None)
+    def grow(n):
+        scratch = bytearray(n)
+        return np.zeros(n//8)
+
+    wgrow = CD(grow)("tests.grow", "tests", None)
+    policy = d._policies["tests.grow"]
+    assert policy.memory == False
+    wgrow(1000)
+    assert "mem" not in records[0]
+
+    policy.memory = True
+    wgrow(10**6)
+    mem = records[1]["mem"]
+    assert mem["nbytes"] == 10**6
+    assert mem["net"] >= 10**6
+    assert mem["peak"] >= 2*10**6
+    assert not tracemalloc.is_tracing()
+    assert d._memory_calls == 0
+
+def test_memoize(monkeypatch):
+    """Tests that the calls included by the `[memoize]` section return the
+    cached results for repeated arguments and that the cache hits are logged,
+    including for the arrays created by a decorated `numpy`.
+    """
+    import numpy as np
+    import acorn.numpy
+    from acorn.logging import decoration as d, memoize
+    from acorn.logging.decoration import CallingDecorator as CD
+    records, calls = [], _scaled
+    del calls[:]
+    #The entries of the decorated `numpy` calls are left out.
+    monkeypatch.setattr(d, "record", lambda k, e: records.append(e)
+                        if e["m"] == "tests.scale" else None)
+    monkeypatch.setattr(memoize, "_maxbytes", 2000)
+    memoize.clear()
+    def scale(a, factor=2.):
+        _scaled.append(factor)
+        return a*factor
+
+    wscale = CD(scale)("tests.scale", "tests", None)
+    policy = d._policies["tests.scale"]
+    assert policy.memoize == False
+    a = np.arange(100.)
+    wscale(a)
+    wscale(a)
+    assert len(calls) == 2
+
+    policy.memoize = True
+    first = wscale(a, factor=3.)
+    second = wscale(a.copy(), factor=3.)
+    assert second is first and len(calls) == 3
+    assert "h" not in records[2] and records[3]["h"] == True
+    wscale(a, factor=4.)
+    b = a.copy()
+    b[-1] = 0.
+    wscale(b, factor=3.)
+    assert len(calls) == 5
+
+    #Each result takes 800 bytes, so only the two most recent ones are kept.
+    stats = memoize.stats()
+    assert stats["entries"] == 2 and stats["bytes"] == 1600
+    assert stats["hits"] == 1 and stats["misses"] == 3
+    wscale(a, factor=3.)
+    assert len(calls) == 6
+
+    #Arguments that can't be used in a key are never cached.
+    class Unit(object):
+        def __rmul__(self, other):
+            return other
+    wscale(a, factor=Unit())
+    wscale(a, factor=[Unit()])
+    assert len(calls) == 8 and memoize.stats()["entries"] == 2
+
+    #Redefining the function with another default (or capturing another
+    #value in its closure) must not return the results of the old definition.
+    def scale(a, factor=5.):
+        _scaled.append(factor)
+        return a*factor
+    assert CD(scale)("tests.scale", "tests", None)(a)[1] == 5.
+    assert len(calls) == 9
+    def scaler(factor):
+        def scale(a):
+            _scaled.append(factor)
+            return a*factor
+        return CD(scale)("tests.scale", "tests", None)
+    d._policies["tests.scale"].memoize = True
+    assert scaler(6.)(2.) == 12. and scaler(7.)(2.) == 14.
+    assert scaler(6.)(2.) == 12. and len(calls) == 11
+    scaler(Unit())(2.)
+    scaler(Unit())(2.)
+    assert len(calls) == 13
+    memoize.clear()
+
+def test_lazy(tmpdir, monkeypatch):
+    """Tests that the members of a lazily decorated package are only decorated
+    once they are first accessed, including its submodules.
+    """
+    import sys
+    from acorn.logging import decoration as d
+    monkeypatch.setattr(d, "record", lambda k, e: None)
+    pkg = tmpdir.mkdir("acornlazy")
+    pkg.join("__init__.py").write('\n'.join([
+        "from acornlazy import sub",
+        "def twice(x):",
+        "    return 2*x",
+        "def thrice(x):",
+        "    return 3*x"]))
+    pkg.join("sub.py").write('\n'.join([
+        "def half(x):",
+        "    return x/2."]))
+    sys.path.insert(0, str(tmpdir))
+    try:
+        import acornlazy
+    finally:
+        sys.path.remove(str(tmpdir))
+
+    assert d.is_lazy()
+    d.decorate(acornlazy)
+    #The undecorated members are served by the module `__getattr__`; once
+    #decorated, they are plain dictionary entries.
+    raw = acornlazy.__dict__
+    assert "twice" not in raw and "thrice" not in raw
+    assert "twice" in dir(acornlazy)
+    assert hasattr(acornlazy.twice, "__acorn__")
+    assert raw["twice"] is acornlazy.twice
+    assert "thrice" not in raw
+    assert acornlazy.twice(2) == 4
+    assert not hasattr(acornlazy, "missing")
+
+    #Submodules are only split once they are first accessed.
+    sub = sys.modules["acornlazy.sub"]
+    assert not hasattr(sub.__dict__["half"], "__acorn__")
+    assert acornlazy.sub is sub and "half" not in sub.__dict__
+    assert hasattr(acornlazy.sub.half, "__acorn__")
+    assert acornlazy.sub.half(3) == 1.5
+
+    from acornlazy import thrice
+    assert thrice(1) == 3
+    assert hasattr(raw["thrice"], "__acorn__")
+    #Once all the members are decorated, the module hooks are removed again.
+    assert "__getattr__" not in raw and "__dir__" not in raw
+    assert "__getattr__" not in sub.__dict__
+
+    #The package's own `__getattr__` is still used for the other names, and
+    #the submodules that it imports are decorated lazily too.
+    pkg = tmpdir.mkdir("acornlazier")
+    pkg.join("__init__.py").write('\n'.join([
+        "def twice(x):",
+        "    return 2*x",
+        "def __getattr__(name):",
+        "    if name == 'later':",
+        "        from importlib import import_module",
+        "        return import_module('acornlazier.later')",
+        "    raise AttributeError(name)"]))
+    pkg.join("later.py").write('\n'.join([
+        "def half(x):",
+        "    return x/2."]))
+    sys.path.insert(0, str(tmpdir))
+    try:
+        import acornlazier
+        d.decorate(acornlazier)
+        assert acornlazier.twice(2) == 4
+        assert hasattr(acornlazier.later.half, "__acorn__")
+    finally:
+        sys.path.remove(str(tmpdir))
+    assert not hasattr(acornlazier, "missing")
+
+def test_plans(tmpdir, monkeypatch):
+    """Tests that the decoration plans of a split module are cached and replayed
+    until the package version or its source files change.
+    """
+    import sys
+    from acorn.logging import decoration as d
+    tmpdir.join("acornplan.py").write('\n'.join([
+        "__version__ = '1.0'",
+        "def twice(x):",
+        "    return 2*x",
+        "def _hidden(x):",
+        "    return x"]))
+    sys.path.insert(0, str(tmpdir))
+    try:
+        import acornplan
+    finally:
+        sys.path.remove(str(tmpdir))
+
+    planpath = tmpdir.join("plans", "acornplan.json")
+    monkeypatch.setattr(d, "_plan_path", lambda p: str(planpath))
+    monkeypatch.setitem(d._decor_count, "acornplan", [0, 0, 0])
+    def split():
+        if acornplan in d._split_objects:
+            d._split_objects.remove(acornplan)
+        d._load_plans(acornplan)
+        return d._split_object(acornplan, "acornplan", skipext=False)
+
+    first = split()
+    assert [n for n, o in first["functions"]] == ["twice"]
+    d.save_plans()
+    assert planpath.check()
+
+    #The cached plan is replayed without examining the members.
+    def nomembers(o):
+        raise AssertionError("members examined")
+    with monkeypatch.context() as m:
+        m.setattr(d, "_get_members", nomembers)
+        second = split()
+    assert second["functions"] == first["functions"]
+
+    import pytest
+    acornplan.__version__ = "1.1"
+    with monkeypatch.context() as m:
+        m.setattr(d, "_get_members", nomembers)
+        with pytest.raises(AssertionError):
+            split()
+
+    #Editing the code without changing the version also discards the plan.
+    import os
+    acornplan.__version__ = "1.0"
+    source = str(tmpdir.join("acornplan.py"))
+    mtime = os.path.getmtime(source)
+    os.utime(source, (mtime + 10, mtime + 10))
+    with monkeypatch.context() as m:
+        m.setattr(d, "_get_members", nomembers)
+        with pytest.raises(AssertionError):
+            split()
+    del d._plans["acornplan"]
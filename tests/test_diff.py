@@ -53,3 +53,18 @@ def test_diff_restore():
 
     from difflib import ndiff
     assert all([l[0] == ' ' for l in list(ndiff(b.splitlines(1), restb))])
+
+def test_keyframes():
+    """Tests the re-compression of diff chains with keyframes.
+    """
+    from acorn.logging.diff import cascade, compress, recompress
+    versions = ["def f():\n    return {}\n".format(i) for i in range(7)]
+    sequence = [versions[0]]
+    for i in range(1, len(versions)):
+        sequence.append(compress(cascade(sequence), versions[i]))
+
+    rekeyed = recompress(sequence, 3)
+    assert [isinstance(c, str) for c in rekeyed] == [True, False, False,
+                                                      True, False, False, True]
+    for i in range(len(versions)):
+        assert ''.join(cascade(rekeyed[0:i+1])) == versions[i]
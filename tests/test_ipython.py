@@ -85,3 +85,25 @@ record(ekey, entry, diff=True)
             print(False)
 """
     assert not findloop(ast.parse(classcode))
+
+def test_markdown(tmpdir, monkeypatch):
+    """Tests that a new markdown cell is matched to the entity of the most
+    similar markdown cell in the database.
+    """
+    from acorn import ipython
+    from acorn.logging import database
+    from acorn.logging.database import TaskDB
+    db = TaskDB(str(tmpdir))
+    db.record("nb-1", {"m": "md", "a": None, "s": 1., "r": None,
+                       "c": "Fitting the model to the data."})
+    db.record("nb-2", {"m": "md", "a": None, "s": 2., "r": None,
+                       "c": "zzzz qqqq"})
+    records = []
+    monkeypatch.setattr(database, "active_db", lambda: db)
+    monkeypatch.setattr(database, "sync", lambda: None)
+    monkeypatch.setattr(database, "record",
+                        lambda k, e, diff=False: records.append(k))
+    monkeypatch.setattr(ipython, "_cellid_map", {})
+    #The best match isn't the last candidate that is compared.
+    ipython.record_markdown("Fitting the model to the new data.", 7)
+    assert records == ["nb-1"]